@@ -1,73 +1,131 @@
 import math
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QProgressBar, QLabel, QPushButton
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QProgressBar, QLabel, QPushButton, QComboBox
 from PyQt5.QtCore import Qt, QTimer
 import random  # Для тестового обновления значений
-import torch
-import torch.nn.functional as F
-from transformers import AutoConfig, Wav2Vec2Processor, AutoModelForAudioClassification
-import sounddevice as sd
 import threading
+import time
 import numpy as np
 
-# Устройство (GPU если доступно)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+from audio_sources import AudioSource, MultiSourceAudio
+from event_bus import bus
+from smoothing import get_smoother
 
-# Модель и конфиг для эмоций
+# Окно анализа и шаг между окнами, секунд
+WINDOW_SECONDS = 3.0
+HOP_SECONDS = 0.5
+
+# Во время тишины эмоции держатся SILENCE_HOLD секунд, затем плавно уходят к нейтральной
+SILENCE_HOLD = 2.0
+SILENCE_HALF_LIFE = 3.0
+
+# torch, transformers и sounddevice импортируются при первом использовании,
+# чтобы главное окно не ждало загрузки модели
 model_name_or_path = "soundmodel"
-config = AutoConfig.from_pretrained(model_name_or_path)
-processor = Wav2Vec2Processor.from_pretrained(model_name_or_path)
-sampling_rate = processor.feature_extractor.sampling_rate
-model = AutoModelForAudioClassification.from_pretrained(model_name_or_path, trust_remote_code=True).to(device)
+# Как запускать модель: eager, int8 (динамическое INT8-квантование Linear),
+# onnx или onnx_int8 (нужен экспорт: python audio_runtime.py)
+AUDIO_RUNTIME = "eager"
+device = None
+config = None
+processor = None
+sampling_rate = 16000
+model = None  # Модель transformers, загружается только для eager и int8
+model_runtime = None
+_model_lock = threading.Lock()
+
+def load_model():
+    """Загрузить модель и конфиг для эмоций, повторные вызовы ничего не делают"""
+    global device, config, processor, sampling_rate, model, model_runtime
+    with _model_lock:
+        if model_runtime is not None:
+            return
+        import torch
+        from transformers import AutoConfig, Wav2Vec2Processor, AutoModelForAudioClassification
+        from audio_runtime import TORCH_RUNTIMES, create_runtime
+
+        # Устройство (GPU если доступно), INT8 и ONNX работают только на CPU
+        use_gpu = torch.cuda.is_available() and AUDIO_RUNTIME == "eager"
+        device = torch.device("cuda" if use_gpu else "cpu")
+        config = AutoConfig.from_pretrained(model_name_or_path)
+        processor = Wav2Vec2Processor.from_pretrained(model_name_or_path)
+        sampling_rate = processor.feature_extractor.sampling_rate
+        if AUDIO_RUNTIME in TORCH_RUNTIMES:
+            model = AutoModelForAudioClassification.from_pretrained(model_name_or_path, trust_remote_code=True).to(device)
+            model.eval()
+        # Для ONNX нужны только конфиг и процессор, веса fp32 в память не загружаются
+        model_runtime = create_runtime(AUDIO_RUNTIME, model, device, model_name_or_path)
 
 # Функция для записи аудио
 def record_audio(duration=2, sampling_rate=16000):
+    import sounddevice as sd
     print(f"Запись звука в течение {duration} секунд...")
     audio = sd.rec(int(duration * sampling_rate), samplerate=sampling_rate, channels=1, dtype='float32')
     sd.wait()
     print("Запись завершена.")
     return audio.flatten()
 
-# Функция предсказания эмоции с использованием модели
-def predict_emotion(audio):
-    # Преобразуем аудио в нужный формат
-    features = processor(audio, sampling_rate=sampling_rate, return_tensors="pt", padding=True)
+# Вероятности меток для нескольких окон одним вызовом модели
+def predict_scores(windows, runtime=None):
+    import torch.nn.functional as F
+    load_model()
+    if runtime is None:
+        runtime = model_runtime
 
-    # Переносим на устройство
-    input_values = features.input_values.to(device)
-    attention_mask = features.attention_mask.to(device)
+    # Окна разной длины дополняются нулями, attention_mask отмечает настоящие отсчёты
+    features = processor(list(windows), sampling_rate=sampling_rate, return_tensors="pt", padding=True)
 
-    with torch.no_grad():
-        # Получаем логиты от модели
-        logits = model(input_values, attention_mask=attention_mask).logits
+    # Получаем логиты от модели, runtime сам переносит данные на своё устройство
+    logits = runtime(features.input_values, features.attention_mask)
 
     # Применяем softmax для получения вероятностей
-    scores = F.softmax(logits*0.3, dim=1).detach().cpu().numpy()[0]
+    return F.softmax(logits*0.3, dim=1).detach().cpu().numpy()
+
+# Функция предсказания эмоции с использованием модели
+def predict_emotion(audio):
+    scores = predict_scores([audio])[0]
 
     # Создаем список с метками и вероятностями, сортируем по убыванию вероятности
     emotion_probabilities = [{"label": config.id2label[i], "score": round(score, 5)} for i, score in enumerate(scores)]
 
     return emotion_probabilities
-emotions = np.array([0 for i in range(5)],dtype=np.float32)
-outemotions=np.zeros((5,),dtype=np.float32)
-# Главный цикл для реального времени
+
+# Метки модели в порядке столбцов окна: sad neutral angry happy other
+DISPLAY_ORDER = [2, 0, 3, 1, 4]
+NEUTRAL_EMOTIONS = np.array([0, 1, 0, 0, 0], dtype=np.float32)
+
+def predict_display(windows):
+    return predict_scores(windows)[:, DISPLAY_ORDER]
+
+# Источники звука: (название, устройство sounddevice, канал).
+# Все источники обслуживает одна модель, окна с речью объединяются в батч
+AUDIO_SOURCES = [
+    ('Микрофон', None, 0),
+]
+sources = [AudioSource(name, device, channel) for name, device, channel in AUDIO_SOURCES]
+audio_hub = None
+
+# Сглаживание по времени окон, постоянная времени в секундах
+SMOOTHING_TAU = 0.8
+smoother = get_smoother('audio', len(DISPLAY_ORDER), tau=SMOOTHING_TAU)
+
+# Непрерывный захват: звук пишется без пропусков, пока модель анализирует окна
 def real_time_emotion_recognition():
-    print("Начало анализа эмоций. Нажмите Ctrl+C для выхода.")
-    try:
-        while True:
-            audio = record_audio(duration=3)  # Запись 5 секунд аудио
-            emotion_probabilities = predict_emotion(audio)
-            print("Эмоции с вероятностями (от большей к меньшей):")
-            emotions[4]=emotion_probabilities[4]['score']
-            emotions[0] = emotion_probabilities[2]['score']
-            emotions[1] = emotion_probabilities[0]['score']
-            emotions[3] = emotion_probabilities[1]['score']
-            emotions[2] = emotion_probabilities[3]['score']
-            for emotion in emotion_probabilities:
-                print(f"{emotion['label']}: {emotion['score']}")
-    except KeyboardInterrupt:
-        print("Анализ завершен.")
-threading.Thread(target=real_time_emotion_recognition, daemon=True).start()
+    global audio_hub
+    load_model()
+    print("Начало анализа эмоций.")
+    audio_hub = MultiSourceAudio(sources, predict_display, NEUTRAL_EMOTIONS, sampling_rate,
+                                 WINDOW_SECONDS, HOP_SECONDS, silence_hold=SILENCE_HOLD,
+                                 silence_half_life=SILENCE_HALF_LIFE, smoother=smoother, bus=bus)
+    audio_hub.start()
+
+_recognition_thread = None
+
+def start_recognition():
+    """Запустить запись и анализ при первом открытии окна"""
+    global _recognition_thread
+    if _recognition_thread is None:
+        _recognition_thread = threading.Thread(target=real_time_emotion_recognition, daemon=True)
+        _recognition_thread.start()
 #sad neutral angry happy other
 class Windows(QMainWindow):
     def __init__(self):
@@ -76,6 +134,7 @@ class Windows(QMainWindow):
         self.setStyleSheet('background-color: #333333;')
         self.setMinimumSize(1200, 800)
         self.progress_bars = []  # Список для хранения прогресс-баров
+        start_recognition()
         
         # Инициализация таймера для обновления каждый кадр
         self.update_timer = QTimer()
@@ -131,10 +190,33 @@ class Windows(QMainWindow):
         nav_widget.setLayout(nav_layout)
         main_layout.addWidget(nav_widget)
 
-        # Основная область контента (пустая для будущего использования)
+        # Основная область контента: выбор источника звука
         content_widget = QWidget()
         content_layout = QVBoxLayout(content_widget)
-        content_layout.setContentsMargins(0, 0, 0, 0)
+        content_layout.setContentsMargins(50, 20, 50, 0)
+
+        source_layout = QHBoxLayout()
+        source_label = QLabel("Источник:")
+        source_label.setStyleSheet("color: white; font-size: 14px;")
+        self.source_selector = QComboBox()
+        self.source_selector.addItems([source.name for source in sources])
+        self.source_selector.setStyleSheet("""
+            QComboBox {
+                background-color: #424242;
+                color: white;
+                border: 1px solid #505050;
+                border-radius: 5px;
+                padding: 5px 10px;
+                font-size: 14px;
+            }
+        """)
+        self.source_status = QLabel()
+        self.source_status.setStyleSheet("color: #BBBBBB; font-size: 12px;")
+        source_layout.addWidget(source_label)
+        source_layout.addWidget(self.source_selector)
+        source_layout.addWidget(self.source_status)
+        source_layout.addStretch()
+        content_layout.addLayout(source_layout)
 
         # Добавляем основной контент
         main_layout.addWidget(content_widget)
@@ -218,12 +300,11 @@ class Windows(QMainWindow):
             self.progress_bars[i].setValue(value)
 
     def update_frame(self):
-        global outemotions
         """
         Функция вызывается каждый кадр (60 раз в секунду)
-        Здесь можно получать данные и обновлять прогресс-бары
+        Показывает сглаженные значения выбранного источника на текущий момент
         """
-        outemotions=outemotions*0.98+emotions*0.02
-        # Пример: генерация случайных значений для тестирования
-        # В реальном приложении здесь будет логика получения актуальных данных
-        self.update_progress_bars(outemotions*100)
+        source = sources[max(0, self.source_selector.currentIndex())]
+        values = smoother.read([source.name], time.monotonic())[0]
+        self.update_progress_bars(values*100)
+        self.source_status.setText(f"Окон без речи пропущено: {source.vad.skipped_fraction:.0%}")
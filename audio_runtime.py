@@ -0,0 +1,134 @@
+import argparse
+import copy
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+AUDIO_MODEL_DIR = 'soundmodel'
+RUNTIMES = ('eager', 'int8', 'onnx', 'onnx_int8')
+# Runtimes built from the loaded transformers model, the others only need the exported graph
+TORCH_RUNTIMES = ('eager', 'int8')
+
+# Exported graphs inside the model directory
+ONNX_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model_int8.onnx'
+
+# Example input used for export: one 3 s window at 16 kHz
+EXPORT_SAMPLES = 3 * 16000
+
+
+class LogitsOnly(nn.Module):
+    """Wrap a HF audio classifier so it returns a plain logits tensor"""
+
+    def __init__(self, model):
+        super(LogitsOnly, self).__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask):
+        return self.model(input_values, attention_mask=attention_mask).logits
+
+
+class EagerRuntime:
+    """Run the transformers model as loaded"""
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, input_values, attention_mask):
+        with torch.no_grad():
+            return self.model(input_values.to(self.device), attention_mask=attention_mask.to(self.device)).logits
+
+
+class Int8Runtime(EagerRuntime):
+    """Dynamic INT8 quantization of every Linear layer, CPU only.
+
+    Weights are quantized once at load, activations per call, so no
+    calibration data is needed. Convolutional feature encoder stays fp32.
+    """
+
+    def __init__(self, model):
+        # The eager model may still be in use on its own device
+        model = copy.deepcopy(model).to('cpu').eval()
+        quantized = torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        super(Int8Runtime, self).__init__(quantized, torch.device('cpu'))
+
+
+class OnnxRuntime:
+    """Run the exported graph with ONNX Runtime on CPU"""
+
+    def __init__(self, path, num_threads=0):
+        import onnxruntime as ort
+
+        self.device = torch.device('cpu')
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, input_values, attention_mask):
+        logits, = self.session.run(['logits'], {
+            'input_values': input_values.cpu().numpy().astype(np.float32),
+            'attention_mask': attention_mask.cpu().numpy().astype(np.int64),
+        })
+        return torch.from_numpy(logits)
+
+
+def create_runtime(name, model, device, model_dir=AUDIO_MODEL_DIR):
+    """Runtime for `name`; `model` is the loaded eager model, None is fine for ONNX runtimes"""
+    if name == 'eager':
+        return EagerRuntime(model, device)
+    if name == 'int8':
+        return Int8Runtime(model)
+    if name == 'onnx':
+        return OnnxRuntime(os.path.join(model_dir, ONNX_FILE))
+    if name == 'onnx_int8':
+        return OnnxRuntime(os.path.join(model_dir, ONNX_INT8_FILE))
+    raise ValueError(f"Unknown audio runtime '{name}', expected one of {RUNTIMES}")
+
+
+def export_onnx(model, model_dir=AUDIO_MODEL_DIR, opset=14):
+    """Export the classifier with dynamic batch and time axes"""
+    path = os.path.join(model_dir, ONNX_FILE)
+    wrapper = LogitsOnly(model.to('cpu').eval())
+    input_values = torch.randn(1, EXPORT_SAMPLES)
+    attention_mask = torch.ones(1, EXPORT_SAMPLES, dtype=torch.int64)
+    with torch.no_grad():
+        torch.onnx.export(wrapper, (input_values, attention_mask), path, opset_version=opset,
+                          input_names=['input_values', 'attention_mask'], output_names=['logits'],
+                          dynamic_axes={'input_values': {0: 'batch', 1: 'samples'},
+                                        'attention_mask': {0: 'batch', 1: 'samples'},
+                                        'logits': {0: 'batch'}})
+    print(f'Saved {path}')
+    return path
+
+
+def quantize_onnx(model_dir=AUDIO_MODEL_DIR):
+    """Dynamic INT8 weights for the exported ONNX graph"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    source = os.path.join(model_dir, ONNX_FILE)
+    target = os.path.join(model_dir, ONNX_INT8_FILE)
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    print(f'Saved {target}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the wav2vec audio classifier for ONNX Runtime')
+    parser.add_argument('--model-dir', default=AUDIO_MODEL_DIR)
+    parser.add_argument('--opset', type=int, default=14)
+    parser.add_argument('--no-int8', action='store_true', help='Skip the dynamic INT8 ONNX graph')
+    args = parser.parse_args()
+
+    from transformers import AutoModelForAudioClassification
+    model = AutoModelForAudioClassification.from_pretrained(args.model_dir, trust_remote_code=True)
+    export_onnx(model, args.model_dir, args.opset)
+    if not args.no_int8:
+        quantize_onnx(args.model_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+from audio_stream import AudioStream
+from vad import EnergyVAD, hold_or_decay
+
+
+class AudioSource:
+    """Один микрофон (или канал многоканального устройства) со своим состоянием"""
+
+    def __init__(self, name, device=None, channel=0, labels=5):
+        self.name = name
+        self.device = device
+        self.channel = channel
+        self.vad = EnergyVAD()
+        self.emotions = np.zeros(labels, dtype=np.float32)  # Последний результат модели
+        self.last_voiced = None
+        self.last_update = None
+        self.published = None  # Время окна последнего опубликованного значения
+        self.pending = None  # (окно, время) ждёт следующего батча
+
+        # Статистика
+        self.analysed = 0
+        self.dropped = 0
+        self.stale = 0  # Результаты модели, которые пришли позже более нового значения
+
+
+class MultiSourceAudio:
+    """Звук с нескольких устройств и каналов, одна модель на все источники.
+
+    На каждое устройство открывается один AudioStream, его окна делятся по
+    каналам между источниками. Каждый источник сам решает (VAD), нужна ли
+    модель; окна с речью ждут в ячейке источника (новое окно заменяет
+    необработанное), а отдельный поток собирает их в батч не больше
+    max_batch окон и вызывает predict_batch(windows) -> массив (окна, метки)
+    один раз на батч. Батч уходит, как только окно ждёт max_latency секунд
+    или окна есть у всех источников. Если задан smoother (EmotionSmoother),
+    каждое новое значение источника передаётся в него со временем окна.
+    Если задана шина событий bus (EventBus), значения публикуются в каналы
+    'audio/<имя источника>'. Значение источника меняют поток окон (затухание
+    в тишине) и поток батчей, поэтому обновление идёт под общей блокировкой,
+    а результат модели для окна старше опубликованного значения отбрасывается.
+    """
+
+    def __init__(self, sources, predict_batch, neutral, samplerate=16000, window=3.0, hop=0.5,
+                 max_batch=8, max_latency=0.1, silence_hold=2.0, silence_half_life=3.0, smoother=None, bus=None):
+        self.sources = list(sources)
+        self.smoother = smoother
+        self.events = {}
+        if bus is not None:
+            for source in self.sources:
+                self.events[source.name] = bus.channel('audio/' + source.name,
+                                                       [('emotions', np.float32, len(source.emotions))])
+        # Значения источника пишут два потока, а у сглаживателя и канала шины порядок один
+        self._publish_lock = threading.Lock()
+        self.predict_batch = predict_batch
+        self.neutral = np.asarray(neutral, dtype=np.float32)
+        self.samplerate = samplerate
+        self.window = window
+        self.hop = hop
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.silence_hold = silence_hold
+        self.silence_half_life = silence_half_life
+
+        self.streams = []
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # Статистика
+        self.batches = 0
+        self.batched_windows = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        devices = collections.OrderedDict()
+        for source in self.sources:
+            source.vad.samplerate = self.samplerate
+            devices.setdefault(source.device, []).append(source)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='audio-batcher', daemon=True)
+        self._thread.start()
+        for device, sources in devices.items():
+            channels = max(source.channel for source in sources) + 1
+            stream = AudioStream(lambda samples, timestamp, sources=sources: self._on_window(sources, samples, timestamp),
+                                 device=device, samplerate=self.samplerate, channels=channels,
+                                 window=self.window, hop=self.hop)
+            stream.start()
+            self.streams.append(stream)
+
+    def stop(self):
+        for stream in self.streams:
+            stream.stop()
+        self.streams = []
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _on_window(self, sources, samples, timestamp):
+        # Поток окон устройства: VAD для каждого канала, окна с речью - в батч
+        for source in sources:
+            mono = samples if samples.ndim == 1 else samples[:, source.channel]
+            dt = 0.0 if source.last_update is None else timestamp - source.last_update
+            source.last_update = timestamp
+            if not source.vad.is_speech(mono):
+                if source.last_voiced is not None:
+                    with self._publish_lock:
+                        source.emotions = hold_or_decay(source.emotions, self.neutral, timestamp - source.last_voiced,
+                                                        self.silence_hold, self.silence_half_life, dt)
+                        self._publish([source], source.emotions[None], [timestamp])
+                continue
+            source.last_voiced = timestamp
+
+            with self._condition:
+                if source.pending is not None:
+                    source.dropped += 1
+                # Окно AudioStream переиспользуется, в батч уходит копия
+                source.pending = (np.array(mono, dtype=np.float32), timestamp, time.monotonic())
+                self._condition.notify()
+
+    def _next_batch(self):
+        with self._condition:
+            while True:
+                if not self._running:
+                    return []
+                pending = [source for source in self.sources if source.pending is not None]
+                if not pending:
+                    self._condition.wait()
+                    continue
+                remaining = min(source.pending[2] for source in pending) + self.max_latency - time.monotonic()
+                if len(pending) >= min(self.max_batch, len(self.sources)) or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            # Сначала самые старые окна
+            pending.sort(key=lambda source: source.pending[2])
+            batch = []
+            for source in pending[:self.max_batch]:
+                batch.append((source, source.pending[0], source.pending[1]))
+                source.pending = None
+            return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                scores = np.asarray(self.predict_batch([window for _, window, _ in batch]), dtype=np.float32)
+            except Exception as e:
+                print('Ошибка анализа звука:', e)
+                continue
+            self.batches += 1
+            self.batched_windows += len(batch)
+            self._apply_batch(batch, scores)
+
+    def _apply_batch(self, batch, scores):
+        with self._publish_lock:
+            fresh = []
+            for (source, _, timestamp), source_scores in zip(batch, scores):
+                source.analysed += 1
+                if source.published is not None and timestamp < source.published:
+                    # Пока окно ждало модель, поток окон уже опубликовал более новое значение
+                    source.stale += 1
+                    continue
+                source.emotions = source_scores
+                fresh.append((source, source_scores, timestamp))
+            if fresh:
+                sources, fresh_scores, timestamps = zip(*fresh)
+                self._publish(sources, np.asarray(fresh_scores), timestamps)
+
+    def _publish(self, sources, scores, timestamps):
+        # Вызывается под _publish_lock
+        for source, timestamp in zip(sources, timestamps):
+            source.published = timestamp
+        if self.smoother is not None:
+            # Один векторный шаг сглаживания на весь батч
+            self.smoother.update([source.name for source in sources], scores, list(timestamps))
+        for source, source_scores, timestamp in zip(sources, scores, timestamps):
+            if source.name in self.events:
+                self.events[source.name].publish((source_scores,), timestamp)
+
+    def stats(self):
+        average = self.batched_windows / self.batches if self.batches else 0.0
+        sources = {source.name: {'analysed': source.analysed, 'dropped': source.dropped, 'stale': source.stale,
+                                 'skipped_fraction': source.vad.skipped_fraction}
+                   for source in self.sources}
+        return {'sources': sources, 'batches': self.batches, 'average_batch': average}
@@ -0,0 +1,156 @@
+import threading
+import time
+
+import numpy as np
+
+
+class RingBuffer:
+    """Кольцевой буфер отсчётов для одного писателя и одного читателя без блокировок.
+
+    Писатель (callback звуковой карты) копирует отсчёты и только потом
+    увеличивает счётчик written, поэтому читатель видит лишь записанные
+    данные. Если за время чтения писатель успел перезаписать окно,
+    read() возвращает None.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        self.capacity = capacity
+        self.channels = channels
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+        self.written = 0  # Всего записано отсчётов, только растёт
+        self.overruns = 0
+
+    def write(self, samples):
+        samples = samples.reshape(len(samples), self.channels)
+        n = count = len(samples)
+        if count > self.capacity:
+            # Остаются только последние capacity отсчётов, но счёт идёт по всем
+            samples = samples[-self.capacity:]
+            count = self.capacity
+        start = (self.written + n - count) % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:count - first] = samples[first:]
+        self.written += n
+
+    def read(self, end, length, out=None):
+        """Копия отсчётов [end - length, end) или None, если они уже перезаписаны"""
+        begin = end - length
+        if begin < self.written - self.capacity or end > self.written:
+            self.overruns += 1
+            return None
+        if out is None:
+            out = np.empty((length, self.channels), dtype=self._data.dtype)
+        start = begin % self.capacity
+        first = min(length, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        out[first:] = self._data[:length - first]
+        # Писатель мог обогнать нас во время копирования
+        if begin < self.written - self.capacity:
+            self.overruns += 1
+            return None
+        return out
+
+
+class AudioStream:
+    """Непрерывный захват звука через sounddevice.InputStream с анализом
+    перекрывающихся окон.
+
+    Callback звуковой карты только копирует отсчёты в RingBuffer.
+    Отдельный поток берёт окна длиной window секунд с шагом hop и вызывает
+    on_window(samples, timestamp), где samples - массив (отсчёты,) для
+    одного канала или (отсчёты, каналы), timestamp - время конца окна
+    (time.monotonic). Массив samples переиспользуется, on_window не должен
+    его сохранять. Если анализ не успевает, поток переходит к самому
+    свежему окну, пропущенные шаги учитываются в skipped.
+    """
+
+    def __init__(self, on_window, device=None, samplerate=16000, channels=1, window=3.0, hop=0.5,
+                 blocksize=0, buffer_seconds=None):
+        self.on_window = on_window
+        self.device = device
+        self.samplerate = samplerate
+        self.channels = channels
+        self.window_samples = int(window * samplerate)
+        self.hop_samples = max(1, int(hop * samplerate))
+        self.blocksize = blocksize
+        buffer_seconds = buffer_seconds or max(2 * window, window + 4 * hop)
+        self.ring = RingBuffer(int(buffer_seconds * samplerate), channels)
+
+        self._stream = None
+        self._thread = None
+        self._running = False
+        self._data_ready = threading.Event()
+        self._clock = (0, 0.0)  # (written, time.monotonic) последнего блока
+
+        # Статистика
+        self.windows = 0
+        self.skipped = 0
+        self.status_errors = 0
+        self.analysis_ms = 0.0
+
+    def start(self):
+        import sounddevice as sd
+        if self._thread is not None:
+            return
+        self._running = True
+        self._stream = sd.InputStream(device=self.device, samplerate=self.samplerate, channels=self.channels,
+                                      dtype='float32', blocksize=self.blocksize, callback=self._callback)
+        self._stream.start()
+        self._thread = threading.Thread(target=self._run, name='audio-windows', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._data_ready.set()
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _callback(self, indata, frames, time_info, status):
+        # Поток звуковой карты: ничего, кроме копирования
+        if status:
+            self.status_errors += 1
+        self.ring.write(indata)
+        self._clock = (self.ring.written, time.monotonic())
+        self._data_ready.set()
+
+    def sample_time(self, position):
+        """Время (time.monotonic), когда был записан отсчёт с номером position"""
+        written, timestamp = self._clock
+        return timestamp - (written - position) / self.samplerate
+
+    def _run(self):
+        end = self.window_samples
+        buffer = np.empty((self.window_samples, self.channels), dtype=np.float32)
+        while self._running:
+            if self.ring.written < end:
+                self._data_ready.wait(0.5)
+                self._data_ready.clear()
+                continue
+
+            # Отстали больше чем на шаг - берём самое свежее окно
+            behind = (self.ring.written - end) // self.hop_samples
+            if behind > 0:
+                self.skipped += behind
+                end += behind * self.hop_samples
+
+            samples = self.ring.read(end, self.window_samples, buffer)
+            if samples is not None:
+                started = time.perf_counter()
+                try:
+                    self.on_window(samples[:, 0] if self.channels == 1 else samples, self.sample_time(end))
+                except Exception as e:
+                    print('Ошибка анализа окна:', e)
+                elapsed = (time.perf_counter() - started) * 1000
+                self.analysis_ms = elapsed if not self.windows else self.analysis_ms * 0.9 + elapsed * 0.1
+                self.windows += 1
+            end += self.hop_samples
+
+    def stats(self):
+        return {'windows': self.windows, 'skipped': self.skipped, 'overruns': self.ring.overruns,
+                'status_errors': self.status_errors, 'analysis_ms': self.analysis_ms}
@@ -0,0 +1,190 @@
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+# Emotic must be visible in __main__ to unpickle model_emotic1.pth
+from emotion_detection import Emotic, EmotionDetector
+from inference_backend import BACKENDS
+
+STAGES = ('capture', 'detect_person', 'preprocess_context', 'preprocess_body',
+          'context_model', 'body_model', 'emotic_head', 'draw_results')
+
+
+class FrameSource:
+    """Frames from a local video file (looped) or synthetic noise frames"""
+
+    def __init__(self, video=None, seed=0):
+        self.video = video
+        self.cap = cv2.VideoCapture(video) if video else None
+        if self.cap is not None and not self.cap.isOpened():
+            raise IOError(f'Cannot open video {video}')
+        self.random = np.random.RandomState(seed)
+        self.synthetic = {}
+
+    def read(self, width, height):
+        if self.cap is None:
+            # A small pool of prepared frames so generating noise is not timed
+            pool = self.synthetic.get((width, height))
+            if pool is None:
+                pool = [self.random.randint(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+                self.synthetic[(width, height)] = pool
+            return pool[self.random.randint(len(pool))].copy()
+
+        ret, frame = self.cap.read()
+        if not ret:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+            if not ret:
+                raise IOError(f'Cannot read frames from video {self.video}')
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height))
+        return frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+def person_boxes(width, height, count):
+    """Fixed grid of person boxes so later stages always see `count` people"""
+    cols = int(np.ceil(np.sqrt(count)))
+    rows = int(np.ceil(count / cols))
+    w, h = width // cols, height // rows
+    return [((i % cols) * w, (i // cols) * h, w, h) for i in range(count)]
+
+
+def summarize(samples):
+    """Latency percentiles in ms and throughput for one stage"""
+    samples = np.asarray(samples) * 1000.0
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+        'fps': float(1000.0 / samples.mean()) if samples.mean() > 0 else 0.0,
+        'samples': int(len(samples)),
+    }
+
+
+def run(detector, source, resolutions, batch_sizes, frames, warmup):
+    """Time every pipeline stage for each resolution and batch size"""
+    results = {}
+    for width, height in resolutions:
+        for batch_size in batch_sizes:
+            timings = {stage: [] for stage in STAGES}
+            boxes = person_boxes(width, height, batch_size)
+            detector.person_detector.reset()
+
+            with torch.no_grad():
+                for i in range(warmup + frames):
+                    stamps = [time.perf_counter()]
+                    frame = source.read(width, height)
+                    stamps.append(time.perf_counter())
+                    detector.detect_person(frame)
+                    stamps.append(time.perf_counter())
+                    context_tensor = detector.preprocessor.context_batch([frame])
+                    stamps.append(time.perf_counter())
+                    body_tensor = detector.preprocessor.body_batch(frame, boxes)
+                    stamps.append(time.perf_counter())
+                    context_features = detector.backend.context(context_tensor)
+                    stamps.append(time.perf_counter())
+                    body_features = detector.backend.body(body_tensor)
+                    stamps.append(time.perf_counter())
+                    context_features = context_features.expand(len(boxes), *context_features.shape[1:])
+                    cat_out, cont_out = detector.backend.head(context_features, body_features)
+                    cat_probs = torch.sigmoid(cat_out).cpu().numpy()
+                    cont_vals = cont_out.cpu().numpy()
+                    stamps.append(time.perf_counter())
+                    for j, bbox in enumerate(boxes):
+                        detector.draw_results(frame, bbox, detector.top_emotions(cat_probs[j]), cont_vals[j])
+                    stamps.append(time.perf_counter())
+
+                    if i >= warmup:
+                        for stage, start, end in zip(STAGES, stamps, stamps[1:]):
+                            timings[stage].append(end - start)
+
+            for stage in STAGES:
+                key = f'{stage}@{width}x{height}/b{batch_size}'
+                results[key] = summarize(timings[stage])
+                print(f'{key:<42} p50 {results[key]["p50_ms"]:8.2f} ms  p95 {results[key]["p95_ms"]:8.2f} ms  '
+                      f'p99 {results[key]["p99_ms"]:8.2f} ms  {results[key]["fps"]:9.1f} fps')
+    return results
+
+
+def compare(results, baseline, threshold, metric='p95_ms'):
+    """Stages whose metric got slower than baseline by more than threshold"""
+    regressions = []
+    for key, stats in results.items():
+        if key not in baseline:
+            continue
+        old, new = baseline[key][metric], stats[metric]
+        if old > 0 and new > old * (1.0 + threshold):
+            regressions.append((key, old, new))
+    return regressions
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage latency benchmark of the emotion_detection pipeline')
+    parser.add_argument('--video', help='local video file, synthetic frames are used if omitted')
+    parser.add_argument('--backend', choices=BACKENDS, default='auto',
+                        help="Same default as the app: 'auto' is INT8 on CPU when the quantized files exist")
+    parser.add_argument('--resolutions', default='640x480,1280x720,1920x1080')
+    parser.add_argument('--batch-sizes', default='1,4,8')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=0, help='torch threads, 0 keeps the default')
+    parser.add_argument('--output', default='bench_results.json', help='where to save this run')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    parser.add_argument('--metric', default='p95_ms', choices=('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'))
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    resolutions = [parse_resolution(r) for r in args.resolutions.split(',')]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+
+    detector = EmotionDetector(backend=args.backend, max_people=max(batch_sizes))
+    source = FrameSource(args.video)
+    try:
+        results = run(detector, source, resolutions, batch_sizes, args.frames, args.warmup)
+    finally:
+        source.release()
+
+    report = {
+        'backend': detector.backend.name,
+        'video': args.video,
+        'threads': torch.get_num_threads(),
+        'stages': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Backend {detector.backend.name} (requested {args.backend}), saved {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('backend') != detector.backend.name:
+            print(f"Warning: baseline was measured with backend {baseline.get('backend')}")
+        baseline = baseline['stages']
+        regressions = compare(results, baseline, args.threshold, args.metric)
+        for key, old, new in regressions:
+            print(f'REGRESSION {key}: {args.metric} {old:.2f} -> {new:.2f} ms (+{(new / old - 1) * 100:.0f}%)')
+        if regressions:
+            sys.exit(1)
+        print(f'No stage regressed more than {args.threshold * 100:.0f}% on {args.metric}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import collections
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, wait
+
+import cv2
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from capture import device_lock, is_capture_open
+
+# Найденная камера: номер устройства, разрешение и частота кадров
+CameraInfo = collections.namedtuple('CameraInfo', ['index', 'width', 'height', 'fps'])
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.brat_cameras.json')
+
+
+def list_devices():
+    """Видеоустройства без открытия (номер -> имя) или None, если перечисление недоступно.
+
+    На Windows нужен необязательный pygrabber (порядок DirectShow совпадает
+    с номерами cv2.CAP_DSHOW), на Linux используются /dev/video*.
+    """
+    if sys.platform == 'win32':
+        try:
+            from pygrabber.dshow_graph import FilterGraph
+            return dict(enumerate(FilterGraph().get_input_devices()))
+        except Exception:
+            return None
+    if sys.platform.startswith('linux'):
+        devices = {}
+        for path in glob.glob('/dev/video*'):
+            suffix = path[len('/dev/video'):]
+            if suffix.isdigit():
+                devices[int(suffix)] = path
+        return devices
+    return None
+
+
+def probe_camera(index, api=cv2.CAP_DSHOW):
+    """Открыть устройство и прочитать кадр, CameraInfo или None.
+
+    Устройство, которое сейчас открывает приложение, не проверяется: False.
+    """
+    lock = device_lock(index)
+    if not lock.acquire(blocking=False):
+        return False
+    try:
+        if is_capture_open(index):
+            return False
+        cap = cv2.VideoCapture(index, api)
+        try:
+            if not cap.isOpened():
+                return None
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            height, width = frame.shape[:2]
+            return CameraInfo(index, width, height, round(float(fps), 2))
+        finally:
+            cap.release()
+    finally:
+        lock.release()
+
+
+def _probe_async(index, api):
+    # Daemon-поток: зависшая проверка не задерживает выход из приложения
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(probe_camera(index, api))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f'camera-probe-{index}', daemon=True).start()
+    return future
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [CameraInfo(**item) for item in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+def save_cache(cameras, path=CACHE_PATH):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([camera._asdict() for camera in cameras], f, indent=2)
+    except OSError as e:
+        print('Не удалось сохранить список камер:', e)
+
+
+class CameraDiscovery(QObject):
+    """Поиск камер в фоне.
+
+    Список из кэша доступен сразу, затем номера устройств проверяются
+    параллельно, каждая проверка ограничена probe_timeout. Каждые
+    rescan_interval секунд список устройств перечисляется без их открытия
+    (list_devices); открываются только новые или изменившиеся номера.
+    Без перечисления устройства открываются только при запуске и по
+    rescan(). При изменении испускается cameras_changed(list[CameraInfo]).
+    Камеры, которые захватывает или открывает приложение, не проверяются.
+    """
+
+    cameras_changed = pyqtSignal(list)
+
+    def __init__(self, api=cv2.CAP_DSHOW, max_index=10, probe_timeout=3.0, rescan_interval=10.0,
+                 cache_path=CACHE_PATH, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.max_index = max_index
+        self.probe_timeout = probe_timeout
+        self.rescan_interval = rescan_interval
+        self.cache_path = cache_path
+
+        self._cameras = load_cache(cache_path)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._force = True  # Первый проход проверяет все номера
+        self._devices = None  # Последний результат list_devices
+        # Зависшая проверка не отменяется, номер пропускается до её завершения
+        self._hung = {}
+
+    def cameras(self):
+        """Последний известный список камер, без ожидания"""
+        with self._lock:
+            return list(self._cameras)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='camera-discovery', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.probe_timeout + 1.0)
+            self._thread = None
+
+    def rescan(self):
+        """Проверить все номера сейчас, не дожидаясь интервала"""
+        self._force = True
+        self._wake.set()
+
+    def scan(self, force=True):
+        """Один проход, возвращает найденные камеры или None, если ничего не изменилось"""
+        devices = list_devices()
+        if not force and (devices is None or devices == self._devices):
+            return None
+        previous, self._devices = self._devices, devices
+        known = {camera.index: camera for camera in self.cameras()}
+        indices = range(self.max_index) if devices is None else [i for i in sorted(devices) if i < self.max_index]
+        found = {}
+        futures = {}
+        for index in indices:
+            unchanged = (not force and index in known and previous is not None
+                         and previous.get(index) == devices.get(index))
+            if is_capture_open(index) or unchanged:
+                # Камера открыта в приложении или устройство не менялось - прежнее состояние
+                found[index] = known.get(index, CameraInfo(index, 0, 0, 0.0))
+            elif index in self._hung and not self._hung[index].done():
+                # Прошлая проверка ещё не вернулась, оставляем прежнее состояние
+                if index in known:
+                    found[index] = known[index]
+            else:
+                futures[_probe_async(index, self.api)] = index
+
+        done, not_done = wait(futures, timeout=self.probe_timeout)
+        for future in not_done:
+            self._hung[futures[future]] = future
+        for future in done:
+            index = futures[future]
+            self._hung.pop(index, None)
+            try:
+                camera = future.result()
+            except cv2.error:
+                camera = None
+            if camera is False:
+                # Устройство как раз открывает приложение
+                if index in known:
+                    found[index] = known[index]
+            elif camera is not None:
+                found[index] = camera
+        return [found[index] for index in sorted(found)]
+
+    def _run(self):
+        while self._running:
+            start = time.monotonic()
+            force, self._force = self._force, False
+            cameras = self.scan(force)
+            if cameras is not None:
+                self._publish(cameras, start)
+
+            self._wake.wait(self.rescan_interval)
+            self._wake.clear()
+
+    def _publish(self, cameras, start):
+        with self._lock:
+            changed = cameras != self._cameras
+            self._cameras = cameras
+        if changed and self._running:
+            print(f'Найдено камер: {len(cameras)} за {time.monotonic() - start:.2f} с')
+            save_cache(cameras, self.cache_path)
+            self.cameras_changed.emit(cameras)
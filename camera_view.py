@@ -1,34 +1,87 @@
-import os
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                             QPushButton, QLabel, QScrollArea, QSizePolicy, QFrame)
 from PyQt5.QtCore import Qt, QPoint, QRect, QSize, QTimer
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QMouseEvent, QResizeEvent, QImage
+from PyQt5.QtGui import QPainter, QColor, QMouseEvent, QResizeEvent, QImage
 import cv2
 import numpy as np
 
-import socket
-import threading
-import subprocess
+from capture import open_capture
+from camera_discovery import CameraDiscovery
+from event_bus import bus
+from frame_transport import FrameTransportServer
+from inference_server import WorkerPool
+from recorder import CameraRecorder
 
+# Оценки категорий Emotic кадра в шине событий, канал 'camera/<камера>/emotic'
+CAMERA_EVENT = [('label', 'U32'), ('score', np.float32)]
 
-def client_handler(connection):
-    while True:
-        data = connection.recv(1024)
-        if data:
-            print('Полученные данные:', data.decode('utf-8'), end='\n')
-            connection.send(data)
-        else:
-            break
-    connection.close()
 
-active_sockets={}
+class VideoSurface(QWidget):
+    """Область видео: кадр вписывается с сохранением пропорций в буфер,
+    который создаётся заново только при изменении размеров"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.background = QColor('#424242')
+        self._buffer = None
+        self._image = None
+        self._key = None  # (ширина и высота кадра, ширина и высота виджета)
+        self._offset = QPoint()
+
+    def is_exposed(self):
+        """Виджет виден: не скрыт, окно не свёрнуто и его не закрывают другие виджеты"""
+        return (self.isVisible() and not self.window().isMinimized()
+                and not self.visibleRegion().isEmpty())
+
+    def set_frame(self, frame):
+        """Показать кадр BGR, False если виджет не виден и кадр пропущен"""
+        if not self.is_exposed():
+            return False
+        frame_h, frame_w = frame.shape[:2]
+        key = (frame_w, frame_h, self.width(), self.height())
+        if key != self._key:
+            self._rebuild(key)
+        h, w = self._buffer.shape[:2]
+        interpolation = cv2.INTER_AREA if w < frame_w else cv2.INTER_LINEAR
+        # Единственное масштабирование, сразу в буфер, на который смотрит QImage
+        cv2.resize(frame, (w, h), dst=self._buffer, interpolation=interpolation)
+        self.update()
+        return True
+
+    def _rebuild(self, key):
+        frame_w, frame_h, width, height = key
+        scale = min(width / frame_w, height / frame_h)
+        w = max(1, int(frame_w * scale))
+        h = max(1, int(frame_h * scale))
+        self._buffer = np.empty((h, w, 3), dtype=np.uint8)
+        self._image = QImage(self._buffer.data, w, h, 3 * w, QImage.Format_BGR888)
+        self._offset = QPoint((width - w) // 2, (height - h) // 2)
+        self._key = key
+
+    def resizeEvent(self, event):
+        # Буфер пересоздаётся со следующим кадром, даже если размер вернулся к прежнему
+        self._image = None
+        self._key = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self._image is None:
+            painter.fillRect(self.rect(), self.background)
+        else:
+            if self._image.size() != self.size():
+                painter.fillRect(self.rect(), self.background)
+            painter.drawImage(self._offset, self._image)
+        painter.end()
 
 
 class DraggableCameraWidget(QWidget):
-    def __init__(self, camera_id, main_window, parent=None):
+    def __init__(self, camera_id, main_window, parent=None, transport=None):
         super().__init__(parent)
         self.mainwindow=main_window
         self.camera_id = camera_id
+        self.transport = transport
         self.setMinimumSize(320, 240)
         self.setMaximumSize(1920, 1080)
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
@@ -82,20 +135,39 @@ class DraggableCameraWidget(QWidget):
             }
         """)
         close_btn.clicked.connect(self.close)
-        
+
+        # Запись в фоне: свой поток и процесс кодирования, просмотр не теряет кадров
+        self.recorder = None
+        self.record_btn = QPushButton("●")
+        self.record_btn.setCheckable(True)
+        self.record_btn.setFixedSize(20, 20)
+        self.record_btn.setToolTip("Запись")
+        self.record_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #606060;
+                color: white;
+                border: none;
+                border-radius: 10px;
+            }
+            QPushButton:checked {
+                color: #ff4444;
+            }
+        """)
+        self.record_btn.toggled.connect(self.toggle_recording)
+
+        header_layout.addWidget(self.record_btn)
         header_layout.addWidget(close_btn)
         
-        # Метка для видео
-        self.video_label = QLabel()
-        self.video_label.setAlignment(Qt.AlignCenter)
-        self.video_label.setStyleSheet("border: none; background-color: #424242;")
-        self.video_label.setMinimumSize(320, 240)
+        # Область для видео
+        self.video_surface = VideoSurface()
+        self.video_surface.setMinimumSize(320, 240)
         
         layout.addWidget(header)
-        layout.addWidget(self.video_label)
+        layout.addWidget(self.video_surface)
         
-        # Инициализация камеры
-        self.cap = cv2.VideoCapture(camera_id, cv2.CAP_DSHOW)
+        # Инициализация камеры (захват в отдельном потоке)
+        self.cap = open_capture(camera_id, cv2.CAP_DSHOW)
+        self.last_seq = 0
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.timer.start(30)
@@ -116,42 +188,38 @@ class DraggableCameraWidget(QWidget):
                 self.is_fullscreen = False
 
     def update_frame(self):
-        if self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                widget_size = self.video_label.size()
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                print(frame_rgb.shape,frame_rgb.dtype,len(frame_rgb.tobytes()))
-                active_sockets[self.camera_id].send(frame_rgb.tobytes())
-                frame_rgb=np.frombuffer(active_sockets[self.camera_id].recv(230400 * 4),dtype=np.uint8).reshape((480,640,3))
-
-                frame_rgb = cv2.resize(frame_rgb, (widget_size.width(), widget_size.height()))
-                h, w, ch = frame_rgb.shape
-                bytes_per_line = ch * w
-                qt_image = QImage(frame_rgb.data, w, h, bytes_per_line, QImage.Format_BGR888)
-                
-                # Масштабируем изображение точно под размер виджета
-                
-                scaled_pixmap = QPixmap.fromImage(qt_image).scaled(
-                    widget_size.width(), 
-                    widget_size.height(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-                
-                # Создаем пустой pixmap размером с виджет
-                final_pixmap = QPixmap(widget_size)
-                final_pixmap.fill(Qt.transparent)
-                
-                # Рисуем scaled_pixmap по центру
-                painter = QPainter(final_pixmap)
-                x = (widget_size.width() - scaled_pixmap.width()) // 2
-                y = (widget_size.height() - scaled_pixmap.height()) // 2
-                painter.drawPixmap(x, y, scaled_pixmap)
-                painter.end()
-                
-                self.video_label.setPixmap(final_pixmap)
+        if self.recorder is not None and self.recorder.error:
+            # Кодировщик не поднялся после перезапусков - кнопка показывает причину
+            self.record_btn.setToolTip(f"Запись остановлена: {self.recorder.error}")
+            self.record_btn.setChecked(False)
+        if self.cap is not None and self.cap.isOpened():
+            # Берём самый свежий кадр, не дожидаясь нового
+            item = self.cap.latest(after_seq=self.last_seq, timeout=0)
+            if item is not None:
+                self.last_seq = item.seq
+                frame = item.frame
+
+                if self.transport is not None and self.transport.has_worker(self.camera_id):
+                    # Анализ идёт и для скрытого виджета: оценки нужны записи событий.
+                    # Кадр уходит обработчику без ожидания, результат придёт в show_frame
+                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    self.transport.submit_frame(self.camera_id, frame_rgb, item.timestamp)
+                elif self.video_surface.is_exposed():
+                    # Обработчик ещё не подключился - показываем кадр как есть;
+                    # невидимый виджет кадры не рисует
+                    self.show_frame(frame)
+
+    def show_frame(self, frame):
+        self.video_surface.set_frame(frame)
+
+    def toggle_recording(self, checked):
+        if checked and self.recorder is None:
+            self.record_btn.setToolTip("Запись")
+            self.recorder = CameraRecorder(self.camera_id, cv2.CAP_DSHOW)
+            self.recorder.start()
+        elif not checked and self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -187,41 +255,46 @@ class DraggableCameraWidget(QWidget):
 
     def closeEvent(self, event):
         self.timer.stop()
-        if self.cap.isOpened():
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+        # Окно камер закрывает и уже закрытые виджеты, освобождаем камеру один раз
+        if self.cap is not None:
             self.cap.release()
-        active_sockets[self.camera_id].close()
+            self.cap = None
+            if self.transport is not None:
+                self.transport.detach_camera(self.camera_id)
         super().closeEvent(event)
 
 class CameraViewWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, transport=None, host='localhost', port=8080, compression=None, bandwidth_budget=None):
         super().__init__()
         self.setWindowTitle('Просмотр камер')
         self.setStyleSheet('background-color: #333333;')
         self.setMinimumSize(1200, 800)
         
-        # Поиск доступных камер
-        self.available_cameras = self.find_cameras()
+        # Список камер из кэша показывается сразу, поиск идёт в фоне
+        self.discovery = CameraDiscovery()
+        self.available_cameras = self.discovery.cameras()
         
         # Список активных камер
         self.active_cameras = []
-        self.active_sockets={}
-        self.server = socket.socket(-1, -1)
-        self.server.bind(('localhost', 8080))
-        self.server.listen()
-        print('server started')
+
+        # Сервер для обработчиков работает в своём потоке, результаты приходят сигналом.
+        # Обычно сервер и пул обработчиков запускает главное окно при старте приложения
+        self.worker_pool = None
+        self.own_transport = transport is None
+        if self.own_transport:
+            transport = FrameTransportServer(host, port, compression=compression,
+                                             bandwidth_budget=bandwidth_budget)
+            transport.start()
+            self.worker_pool = WorkerPool('localhost' if host in ('', '0.0.0.0') else host, port)
+            self.worker_pool.start()
+        self.transport = transport
+        self.transport.result_ready.connect(self.on_result)
+        self.transport.scores_ready.connect(self.on_scores)
         self.setup_ui()
 
-    def find_cameras(self):
-        available_cameras = []
-        for i in range(10):
-            cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)
-            if cap.isOpened():
-                ret, _ = cap.read()
-                if ret:
-                    available_cameras.append(i)
-                cap.release()
-        return available_cameras
-        
     def setup_ui(self):
         # Создаем центральный виджет
         central_widget = QWidget()
@@ -301,7 +374,34 @@ class CameraViewWindow(QMainWindow):
         """)
         left_layout.addWidget(title_label)
         
-        # Кнопки камер
+        # Кнопки камер, список обновляется при подключении и отключении камер
+        self.camera_list_layout = QVBoxLayout()
+        self.camera_list_layout.setSpacing(10)
+        left_layout.addLayout(self.camera_list_layout)
+        self.update_camera_list(self.available_cameras)
+        
+        left_layout.addStretch()
+        
+        # Правая панель для отображения камер
+        self.camera_area = QWidget()
+        self.camera_area.setStyleSheet("background-color: #333333;")
+        
+        # Добавляем панели в основной layout
+        content_layout.addWidget(left_panel)
+        content_layout.addWidget(self.camera_area, stretch=1)
+        
+        main_layout.addWidget(content_widget)
+
+        self.discovery.cameras_changed.connect(self.update_camera_list)
+        self.discovery.start()
+
+    def update_camera_list(self, cameras):
+        self.available_cameras = cameras
+        while self.camera_list_layout.count():
+            item = self.camera_list_layout.takeAt(0)
+            if item.widget() is not None:
+                item.widget().deleteLater()
+
         camera_button_style = """
             QPushButton {
                 background-color: #333333;
@@ -317,34 +417,25 @@ class CameraViewWindow(QMainWindow):
             }
         """
         
-        if self.available_cameras:
-            for cam_id in self.available_cameras:
-                btn = QPushButton(f"Камера {cam_id}")
+        if cameras:
+            for camera in cameras:
+                text = f"Камера {camera.index}"
+                if camera.width:
+                    text += f" ({camera.width}x{camera.height}"
+                    text += f", {camera.fps:g} к/с)" if camera.fps else ")"
+                btn = QPushButton(text)
                 btn.setStyleSheet(camera_button_style)
-                btn.clicked.connect(lambda checked, cam_id=cam_id: self.add_camera(cam_id))
-                left_layout.addWidget(btn)
+                btn.clicked.connect(lambda checked, cam_id=camera.index: self.add_camera(cam_id))
+                self.camera_list_layout.addWidget(btn)
         else:
             no_cameras_label = QLabel("Камеры не найдены")
             no_cameras_label.setStyleSheet("color: white;")
-            left_layout.addWidget(no_cameras_label)
-        
-        left_layout.addStretch()
-        
-        # Правая панель для отображения камер
-        self.camera_area = QWidget()
-        self.camera_area.setStyleSheet("background-color: #333333;")
-        
-        # Добавляем панели в основной layout
-        content_layout.addWidget(left_panel)
-        content_layout.addWidget(self.camera_area, stretch=1)
-        
-        main_layout.addWidget(content_widget)
+            self.camera_list_layout.addWidget(no_cameras_label)
         
     def add_camera(self, camera_id):
-        os.system(os.path.abspath(os.path.dirname(__file__))+'\start.bat')
-        connection, address = self.server.accept()
-        active_sockets[camera_id] = connection
-        camera_widget = DraggableCameraWidget(camera_id, self.camera_area,self)
+        # Обработчики уже запущены и прогреты, камера подключается к наименее загруженному
+        self.transport.attach_camera(camera_id)
+        camera_widget = DraggableCameraWidget(camera_id, self.camera_area, self, transport=self.transport)
         camera_widget.move(50 + len(self.active_cameras) * 30, 50 + len(self.active_cameras) * 30)
         camera_widget.show()
         self.active_cameras.append(camera_widget)
@@ -353,4 +444,20 @@ class CameraViewWindow(QMainWindow):
         # Закрываем все активные камеры
         for camera in self.active_cameras:
             camera.close()
+        self.discovery.stop()
+        self.transport.result_ready.disconnect(self.on_result)
+        self.transport.scores_ready.disconnect(self.on_scores)
+        if self.own_transport:
+            self.worker_pool.stop()
+            self.transport.stop()
         super().closeEvent(event)
+
+    def on_result(self, camera_id, frame):
+        for camera in self.active_cameras:
+            if camera.camera_id == camera_id:
+                camera.show_frame(frame)
+
+    def on_scores(self, camera_id, timestamp, scores):
+        # Пишет только поток Qt; запись камеры читает канал и сохраняет события
+        channel = bus.channel(f'camera/{camera_id}/emotic', CAMERA_EVENT)
+        channel.publish_many(list(scores.items()), timestamp)
@@ -0,0 +1,193 @@
+import collections
+import threading
+import time
+
+import cv2
+
+# Кадр из буфера: номер, время захвата (time.monotonic) и изображение BGR
+CapturedFrame = collections.namedtuple('CapturedFrame', ['seq', 'timestamp', 'frame'])
+
+
+class FrameGrabber:
+    """Фоновый поток захвата с одного устройства в небольшой кольцевой буфер.
+
+    Потребители берут либо самый свежий кадр (latest), либо следующий
+    по порядку (next). Кадры из буфера общие для всех потребителей и
+    не должны изменяться, read() возвращает копию.
+    """
+
+    def __init__(self, source, api=None, buffer_size=4):
+        self.source = source
+        self.api = api
+        self.buffer_size = buffer_size
+        self.cap = cv2.VideoCapture(source) if api is None else cv2.VideoCapture(source, api)
+        # Читается до запуска потока захвата: потом cap занят в cap.read(); 0 - неизвестна
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0.0
+
+        self._buffer = [None] * buffer_size
+        self._seq = 0  # Номер последнего записанного кадра
+        self._read_seq = 0  # Наибольший номер, отданный потребителям
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._refs = 0
+
+        # Статистика
+        self.captured = 0
+        self.dropped = 0  # Кадры, перезаписанные до того, как их кто-то прочитал
+        self.failures = 0
+
+    def start(self):
+        if self._thread is not None or not self.cap.isOpened():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'capture-{self.source}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            # Устройство освобождает сам поток после выхода из цикла: если он ещё
+            # ждёт cap.read() (медленная сетевая камера), освобождать его здесь нельзя
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        else:
+            self.cap.release()
+
+    def isOpened(self):
+        return self._running and self.cap.isOpened()
+
+    def _run(self):
+        consecutive_failures = 0
+        while self._running:
+            ret, frame = self.cap.read()
+            timestamp = time.monotonic()
+            if not ret:
+                self.failures += 1
+                consecutive_failures += 1
+                if consecutive_failures > 100:
+                    # Устройство отключено или поток закончился
+                    break
+                time.sleep(0.01)
+                continue
+            consecutive_failures = 0
+
+            with self._condition:
+                self._seq += 1
+                index = self._seq % self.buffer_size
+                old = self._buffer[index]
+                if old is not None and old.seq > self._read_seq:
+                    self.dropped += 1
+                self._buffer[index] = CapturedFrame(self._seq, timestamp, frame)
+                self.captured += 1
+                self._condition.notify_all()
+
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        # Устройство открывается монопольно (DirectShow), освобождаем его сразу
+        self.cap.release()
+
+    def _wait(self, after_seq, timeout):
+        """Ждём кадр новее after_seq, возвращаем False по таймауту или остановке"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._seq <= after_seq:
+            if not self._running:
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._condition.wait(remaining)
+        return True
+
+    def latest(self, after_seq=0, timeout=None):
+        """Самый свежий кадр с номером больше after_seq или None"""
+        with self._condition:
+            if not self._wait(after_seq, timeout):
+                return None
+            item = self._buffer[self._seq % self.buffer_size]
+            self._read_seq = max(self._read_seq, item.seq)
+            return item
+
+    def next(self, after_seq=0, timeout=None):
+        """Самый старый кадр в буфере с номером больше after_seq или None"""
+        with self._condition:
+            if not self._wait(after_seq, timeout):
+                return None
+            oldest = max(after_seq + 1, self._seq - self.buffer_size + 1)
+            item = self._buffer[oldest % self.buffer_size]
+            self._read_seq = max(self._read_seq, item.seq)
+            return item
+
+    def read(self):
+        """Совместимо с cv2.VideoCapture.read(): копия самого свежего кадра"""
+        item = self.latest(timeout=1.0)
+        if item is None:
+            return False, None
+        return True, item.frame.copy()
+
+    def release(self):
+        """Совместимо с cv2.VideoCapture.release()"""
+        release_capture(self)
+
+    def stats(self):
+        return {'captured': self.captured, 'dropped': self.dropped, 'failures': self.failures}
+
+
+_grabbers = {}
+_grabbers_lock = threading.Lock()
+_device_locks = collections.defaultdict(threading.Lock)
+
+# Сколько open_capture ждёт проверку устройства (camera_discovery), прежде чем открывать
+DEVICE_WAIT = 5.0
+
+
+def device_lock(source):
+    """Блокировка открытия устройства: приложение и поиск камер не открывают его одновременно"""
+    with _grabbers_lock:
+        return _device_locks[source]
+
+
+def open_capture(source, api=None, buffer_size=4):
+    """Общий FrameGrabber для устройства, один поток захвата на устройство"""
+    lock = device_lock(source)
+    locked = lock.acquire(timeout=DEVICE_WAIT)
+    try:
+        return _open_capture(source, api, buffer_size)
+    finally:
+        if locked:
+            lock.release()
+
+
+def _open_capture(source, api, buffer_size):
+    with _grabbers_lock:
+        grabber = _grabbers.get(source)
+        if grabber is not None and not grabber.isOpened():
+            # Поток захвата завершился сам: устройство закрывается до повторного открытия
+            grabber.stop()
+        if grabber is None or not grabber.isOpened():
+            grabber = FrameGrabber(source, api, buffer_size)
+            grabber.start()
+            _grabbers[source] = grabber
+        grabber._refs += 1
+        return grabber
+
+
+def release_capture(grabber):
+    """Освободить устройство, поток останавливается после последнего потребителя"""
+    with _grabbers_lock:
+        grabber._refs -= 1
+        if grabber._refs > 0:
+            return
+        if _grabbers.get(grabber.source) is grabber:
+            del _grabbers[grabber.source]
+    grabber.stop()
+
+
+def is_capture_open(source):
+    """Устройство уже захватывается в этом процессе"""
+    with _grabbers_lock:
+        grabber = _grabbers.get(source)
+        return grabber is not None and grabber.isOpened()
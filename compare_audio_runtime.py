@@ -0,0 +1,108 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+import audio
+from audio_runtime import RUNTIMES, create_runtime
+
+
+def load_windows(wav_dir, samplerate, window, hop, max_windows):
+    """Cut every wav file in the folder into analysis windows like the live stream does"""
+    import librosa
+
+    window_samples, hop_samples = int(window * samplerate), int(hop * samplerate)
+    windows = []
+    for path in sorted(glob.glob(os.path.join(wav_dir, '*.wav'))):
+        samples, _ = librosa.load(path, sr=samplerate, mono=True)
+        if len(samples) < window_samples:
+            # Short clips are analysed whole
+            windows.append(samples.astype(np.float32))
+            continue
+        for start in range(0, len(samples) - window_samples + 1, hop_samples):
+            windows.append(samples[start:start + window_samples].astype(np.float32))
+    return windows[:max_windows] if max_windows else windows
+
+
+def run(runtime, windows, batch_size, warmup):
+    """Probabilities for all windows and per-window latency in ms"""
+    batches = [windows[i:i + batch_size] for i in range(0, len(windows), batch_size)]
+    for batch in batches[:warmup]:
+        audio.predict_scores(batch, runtime)
+
+    scores, latencies = [], []
+    for batch in batches:
+        start = time.perf_counter()
+        scores.append(audio.predict_scores(batch, runtime))
+        latencies.append((time.perf_counter() - start) * 1000 / len(batch))
+    return np.concatenate(scores), np.asarray(latencies)
+
+
+def drift_report(reference, scores, labels):
+    """Per-label probability drift against the eager reference"""
+    diff = np.abs(scores - reference)
+    per_label = {label: {'mean_abs': float(diff[:, i].mean()), 'max_abs': float(diff[:, i].max())}
+                 for i, label in enumerate(labels)}
+    top1 = float(np.mean(scores.argmax(1) == reference.argmax(1)))
+    return per_label, top1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare audio emotion runtimes against eager predict_emotion')
+    parser.add_argument('--wav-dir', required=True, help='folder with local .wav files')
+    parser.add_argument('--runtimes', default='int8,onnx', help=f'comma separated, any of {RUNTIMES}')
+    parser.add_argument('--window', type=float, default=audio.WINDOW_SECONDS)
+    parser.add_argument('--hop', type=float, default=audio.WINDOW_SECONDS, help='seconds between windows')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--max-windows', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=0, help='torch threads, 0 keeps the default')
+    parser.add_argument('--output', help='save the report as JSON')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # The reference is the eager fp32 model that predict_emotion uses by default
+    audio.AUDIO_RUNTIME = 'eager'
+    audio.load_model()
+    labels = [audio.config.id2label[i] for i in range(len(audio.config.id2label))]
+    windows = load_windows(args.wav_dir, audio.sampling_rate, args.window, args.hop, args.max_windows)
+    if not windows:
+        raise SystemExit(f'No .wav files in {args.wav_dir}')
+    print(f'{len(windows)} windows of {args.window:.1f} s, batch {args.batch_size}')
+
+    reference, reference_ms = run(audio.model_runtime, windows, args.batch_size, args.warmup)
+    report = {'windows': len(windows), 'batch_size': args.batch_size, 'threads': torch.get_num_threads(),
+              'runtimes': {'eager': {'p50_ms': float(np.percentile(reference_ms, 50)),
+                                     'p95_ms': float(np.percentile(reference_ms, 95))}}}
+    print(f"{'runtime':<10} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'top1':>6}  max drift")
+    print(f"{'eager':<10} {report['runtimes']['eager']['p50_ms']:8.1f} "
+          f"{report['runtimes']['eager']['p95_ms']:8.1f} {1.0:8.2f} {1.0:6.3f}")
+
+    for name in args.runtimes.split(','):
+        runtime = create_runtime(name, audio.model, audio.device, audio.model_name_or_path)
+        scores, latency_ms = run(runtime, windows, args.batch_size, args.warmup)
+        per_label, top1 = drift_report(reference, scores, labels)
+        p50, p95 = float(np.percentile(latency_ms, 50)), float(np.percentile(latency_ms, 95))
+        speedup = float(np.percentile(reference_ms, 50)) / p50 if p50 > 0 else 0.0
+        report['runtimes'][name] = {'p50_ms': p50, 'p95_ms': p95, 'speedup': speedup,
+                                    'top1_agreement': top1, 'drift': per_label}
+        worst = max(per_label.items(), key=lambda item: item[1]['max_abs'])
+        print(f'{name:<10} {p50:8.1f} {p95:8.1f} {speedup:8.2f} {top1:6.3f}  '
+              f"{worst[0]} {worst[1]['max_abs']:.4f}")
+        for label, drift in per_label.items():
+            print(f"    {label:<12} mean {drift['mean_abs']:.4f}  max {drift['max_abs']:.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
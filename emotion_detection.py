@@ -1,10 +1,13 @@
 import torch
 import torch.nn as nn
 import torchvision.models as models
-import torchvision.transforms as transforms
 import numpy as np
 import cv2
-from PIL import Image
+
+from person_detection import PersonDetector
+from preprocessing import FramePreprocessor
+from inference_backend import create_backend
+from capture import open_capture
 
 # Define the Emotic model architecture
 class Emotic(nn.Module):
@@ -32,35 +35,22 @@ class Emotic(nn.Module):
         return cat_out, cont_out
 
 class EmotionDetector:
-    def __init__(self):
+    def __init__(self, backend='auto', detect_width=640, full_scan_interval=10, max_people=8):
         # Initialize models
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        
-        # Load body model (ResNet)
-        self.body_model = torch.load('models/model_body1.pth', map_location=self.device)
-        self.body_model.to(self.device)
-        self.body_model.eval()
-
-        # Load context model (ResNet)
-        self.context_model = torch.load('models/model_context1.pth', map_location=self.device)
-        self.context_model.to(self.device)
-        self.context_model.eval()
-
-        # Load Emotic model
-        self.emotic_model = torch.load('models/model_emotic1.pth', map_location=self.device)
-        self.emotic_model.to(self.device)
-        self.emotic_model.eval()
-
-        # Load face detection model
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.body_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_fullbody.xml')
-
-        # Define image transforms
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+
+        # Body/context ResNets and Emotic head run through the chosen backend:
+        # 'eager' (pickled modules), 'torchscript', 'onnx' or 'int8' (see inference_backend.py);
+        # 'auto' uses the INT8 backbones on CPU whenever they have been produced
+        self.backend = create_backend(backend, self.device)
+        self.device = self.backend.device
+
+        # Load person detection (Haar cascades on a downscaled frame)
+        self.person_detector = PersonDetector(detect_width=detect_width,
+                                              full_scan_interval=full_scan_interval)
+
+        # Preprocessing into reusable input tensors
+        self.preprocessor = FramePreprocessor(max_people=max_people)
 
         # Emotion categories
         self.cat_emotions = ['Affection', 'Anger', 'Annoyance', 'Anticipation', 'Aversion',
@@ -71,64 +61,64 @@ class EmotionDetector:
                            'Surprise', 'Sympathy', 'Yearning']
 
     def preprocess_image(self, image):
-        """Convert OpenCV image to PIL and apply transforms"""
-        if isinstance(image, np.ndarray):
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            image = Image.fromarray(image)
-        return self.transform(image).unsqueeze(0)
+        """Convert OpenCV image to a normalized context tensor"""
+        return self.preprocessor.context_batch([image])
 
     def detect_person(self, frame):
-        """Detect person in frame"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Try to detect full body first
-        bodies = self.body_cascade.detectMultiScale(gray, 1.1, 4)
-        
-        if len(bodies) > 0:
-            return bodies[0]  # Return first detected body
-        
-        # If no body detected, try to detect face and expand region
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-        
-        if len(faces) > 0:
-            # Expand face region to approximate body region
-            x, y, w, h = faces[0]
-            body_h = int(h * 4)  # Approximate body height
-            body_w = int(w * 1.5)  # Approximate body width
-            body_x = max(0, x - int(w * 0.25))
-            body_y = min(frame.shape[0], y + h)  # Start from bottom of face
-            
-            return (body_x, body_y, body_w, body_h)
-            
-        return None
+        """Detect all people in frame"""
+        return self.person_detector.detect(frame)
+
+    def top_emotions(self, cat_prob):
+        """Get emotions above threshold sorted by probability"""
+        top_emotions = []
+        for i in range(len(self.cat_emotions)):
+            if cat_prob[i] > 0.5:  # Threshold for emotion detection
+                top_emotions.append((self.cat_emotions[i], float(cat_prob[i])))
+
+        top_emotions.sort(key=lambda x: x[1], reverse=True)
+        return top_emotions
+
+    def detect_emotions_frames(self, items):
+        """Detect emotions for person boxes of several frames with one batched pass"""
+        results = [[] for _ in items]
+        items = [(i, frame, boxes) for i, (frame, boxes) in enumerate(items) if len(boxes) > 0]
+        if not items:
+            return results
 
-    def detect_emotions(self, frame):
-        """Detect emotions in a video frame"""
         with torch.no_grad():
-            # Preprocess frame
-            body_tensor = self.preprocess_image(frame).to(self.device)
-            context_tensor = body_tensor  # Using same frame for context for simplicity
+            # Context is the whole frame and is shared by all people in it
+            context_tensor = self.preprocessor.context_batch([frame for _, frame, _ in items])
+            body_tensor = self.preprocessor.body_batch_frames([(frame, boxes) for _, frame, boxes in items])
 
-            # Extract features
-            body_features = self.body_model(body_tensor)
-            context_features = self.context_model(context_tensor)
+            # Extract features: one context pass per frame, one batched body pass
+            context_features = self.backend.context(context_tensor)
+            body_features = self.backend.body(body_tensor)
+            counts = torch.tensor([len(boxes) for _, _, boxes in items], device=context_features.device)
+            context_features = context_features.repeat_interleave(counts, dim=0)
+
+            # Get emotion predictions for the whole batch
+            cat_out, cont_out = self.backend.head(context_features, body_features)
 
-            # Get emotion predictions
-            cat_out, cont_out = self.emotic_model(context_features, body_features)
-            
             # Convert to probabilities
-            cat_prob = torch.sigmoid(cat_out).cpu().numpy()[0]
-            cont_vals = cont_out.cpu().numpy()[0]
+            cat_probs = torch.sigmoid(cat_out).cpu().numpy()
+            cont_vals = cont_out.cpu().numpy()
+
+        # Split the batch back per frame
+        offset = 0
+        for i, _, boxes in items:
+            results[i] = [(self.top_emotions(cat_probs[j]), cont_vals[j])
+                          for j in range(offset, offset + len(boxes))]
+            offset += len(boxes)
+        return results
 
-            # Get top emotions
-            top_emotions = []
-            for i in range(len(self.cat_emotions)):
-                if cat_prob[i] > 0.5:  # Threshold for emotion detection
-                    top_emotions.append((self.cat_emotions[i], float(cat_prob[i])))
-            
-            top_emotions.sort(key=lambda x: x[1], reverse=True)
+    def detect_emotions_batch(self, frame, boxes):
+        """Detect emotions for every person box in a frame with one batched pass"""
+        return self.detect_emotions_frames([(frame, boxes)])[0]
 
-            return top_emotions, cont_vals
+    def detect_emotions(self, frame):
+        """Detect emotions in a video frame"""
+        height, width = frame.shape[:2]
+        return self.detect_emotions_batch(frame, [(0, 0, width, height)])[0]
 
     def draw_results(self, frame, bbox, emotions, dimensions):
         """Draw bounding box and emotions"""
@@ -157,23 +147,28 @@ class EmotionDetector:
             text_y += 20
 
 def main():
-    # Initialize video capture
-    cap = cv2.VideoCapture(1)
+    # Initialize video capture (grabbed on a background thread)
+    cap = open_capture(1)
     detector = EmotionDetector()
+    last_seq = 0
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        # Always process the newest frame, older ones are dropped
+        item = cap.latest(after_seq=last_seq, timeout=1.0)
+        if item is None:
             break
+        last_seq = item.seq
+        frame = item.frame.copy()  # Results are drawn on the frame
 
-        # Detect person
-        bbox = detector.detect_person(frame)
-        
-        # Detect emotions
-        emotions, dimensions = detector.detect_emotions(frame)
+        # Detect all people
+        boxes = detector.detect_person(frame)
+
+        # Detect emotions for every person in one batch
+        results = detector.detect_emotions_batch(frame, boxes)
 
         # Draw results
-        detector.draw_results(frame, bbox, emotions, dimensions)
+        for bbox, (emotions, dimensions) in zip(boxes, results):
+            detector.draw_results(frame, bbox, emotions, dimensions)
 
         # Display frame
         cv2.imshow('Emotion Recognition', frame)
@@ -0,0 +1,222 @@
+import threading
+
+import numpy as np
+
+
+class Channel:
+    """Кольцевой буфер записей одного производителя (камера, микрофон, трек).
+
+    Записи имеют постоянную структуру (dtype numpy) и метку времени
+    time.monotonic. Массивы выделяются один раз. Писатель один, читатели
+    работают без блокировок по схеме seqlock: писатель сначала увеличивает
+    счётчик claimed (строки, которые он сейчас перезаписывает), затем
+    копирует записи и только потом увеличивает written. Читатель берёт
+    строки не старше claimed - capacity и после копирования проверяет, что
+    claimed не сдвинулся на них; иначе чтение повторяется. Метки времени в
+    буфере не убывают, поэтому поиск по времени - двоичный (searchsorted)
+    по двум отрезкам кольца.
+    """
+
+    RETRIES = 3
+
+    def __init__(self, name, dtype, capacity=1024):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self._records = np.zeros(capacity, dtype=self.dtype)
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self.claimed = 0  # Записи, которые писатель начал публиковать
+        self.written = 0  # Записи, опубликованные полностью; оба счётчика только растут
+        self.last_time = None
+
+        # Статистика
+        self.overruns = 0
+
+    def publish(self, record, timestamp):
+        """Одна запись (кортеж полей или строка массива dtype)"""
+        if self.last_time is not None and timestamp < self.last_time:
+            timestamp = self.last_time
+        index = self.written % self.capacity
+        self.claimed = self.written + 1
+        self._records[index] = record
+        self._times[index] = timestamp
+        self.last_time = timestamp
+        self.written = self.claimed
+
+    def publish_many(self, records, timestamp):
+        """Несколько записей с одной меткой времени (например, все лица кадра).
+
+        Счётчик written увеличивается один раз, читатели видят записи только все вместе.
+        """
+        records = np.asarray(records, dtype=self.dtype)[-self.capacity:]
+        if not len(records):
+            return
+        if self.last_time is not None and timestamp < self.last_time:
+            timestamp = self.last_time
+        slots = (self.written + np.arange(len(records))) % self.capacity
+        self.claimed = self.written + len(records)
+        self._records[slots] = records
+        self._times[slots] = timestamp
+        self.last_time = timestamp
+        self.written = self.claimed
+
+    def _snapshot(self, read):
+        # read(begin, written) по строкам [begin, written), которые писатель не трогает;
+        # если писатель начал перезаписывать их во время чтения - повтор
+        for _ in range(self.RETRIES):
+            written = self.written
+            begin = max(0, self.claimed - self.capacity)
+            result = read(begin, written)
+            if self.claimed - self.capacity <= begin:
+                return result
+            self.overruns += 1
+        return None
+
+    def latest(self):
+        """(время, запись) последней публикации или None"""
+        def read(begin, written):
+            if written <= begin:
+                return None
+            index = (written - 1) % self.capacity
+            return float(self._times[index]), self._records[index].copy()
+        return self._snapshot(read)
+
+    def _search(self, begin, end, timestamp, side):
+        # Номер записи в [begin, end), как np.searchsorted по упорядоченным меткам
+        start = begin % self.capacity
+        count = end - begin
+        first = min(count, self.capacity - start)
+        i = int(np.searchsorted(self._times[start:start + first], timestamp, side))
+        if i < first:
+            return begin + i
+        return begin + first + int(np.searchsorted(self._times[:count - first], timestamp, side))
+
+    def _copy(self, begin, end):
+        # Копии меток и записей [begin, end)
+        slots = np.arange(begin, end) % self.capacity
+        return self._times[slots], self._records[slots]
+
+    def _empty(self):
+        return np.zeros(0, dtype=np.float64), np.zeros(0, dtype=self.dtype)
+
+    def between(self, start, end):
+        """Метки и записи с временем в [start, end]"""
+        def read(begin, written):
+            lo = self._search(begin, written, start, 'left')
+            hi = self._search(begin, written, end, 'right')
+            return self._copy(lo, max(lo, hi))
+        result = self._snapshot(read)
+        return self._empty() if result is None else result
+
+    def at(self, timestamp):
+        """(время, записи) последней публикации не позже timestamp или None"""
+        def read(begin, written):
+            hi = self._search(begin, written, timestamp, 'right')
+            if hi == begin:
+                return None
+            moment = float(self._times[(hi - 1) % self.capacity])
+            lo = self._search(begin, hi, moment, 'left')
+            return moment, self._copy(lo, hi)[1]
+        return self._snapshot(read)
+
+    def since(self, position):
+        """(позиция, метки, записи) с номера position до последней записи.
+
+        Если часть записей уже перезаписана, чтение начинается с самой старой
+        доступной; новая позиция передаётся в следующий вызов.
+        """
+        def read(begin, written):
+            first = min(max(position, begin), written)
+            return (written,) + self._copy(first, written) + (first - position,)
+        result = self._snapshot(read)
+        if result is None:
+            return (position,) + self._empty()
+        end, times, records, lost = result
+        self.overruns += lost > 0
+        return end, times, records
+
+
+class Subscription:
+    """Новые записи каналов шины с общим префиксом имени, без блокировок.
+
+    Каждый poll() возвращает только записи, появившиеся после прошлого
+    вызова, поэтому подписчик не перечитывает всю историю. Каналы, которые
+    были до подписки, читаются с момента подписки, новые - целиком.
+    """
+
+    def __init__(self, bus, prefix=''):
+        self.bus = bus
+        self.prefix = prefix
+        self._positions = {name: bus.get(name).written for name in bus.names(prefix)}
+
+    def poll(self):
+        """Список (имя канала, метки, записи) для каналов с новыми записями"""
+        updates = []
+        for name in self.bus.names(self.prefix):
+            channel = self.bus.get(name)
+            position = self._positions.get(name, 0)
+            if channel.written == position:
+                continue
+            self._positions[name], times, records = channel.since(position)
+            if len(times):
+                updates.append((name, times, records))
+        return updates
+
+
+class EventBus:
+    """Каналы результатов моделей по именам ('audio/Микрофон', 'face/<окно>', ...).
+
+    Создание канала - под блокировкой, публикация и чтение - без неё.
+    Подписчики читают последнюю запись, диапазон времени, новые записи
+    через subscribe() или сводят каналы разных модальностей к одному
+    моменту через join().
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, name, dtype, capacity=None):
+        """Канал name, создаётся при первом обращении"""
+        channel = self._channels.get(name)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.get(name)
+                if channel is None:
+                    channel = Channel(name, dtype, capacity or self.capacity)
+                    self._channels[name] = channel
+        if channel.dtype != np.dtype(dtype):
+            raise ValueError(f'Канал {name} уже создан со структурой {channel.dtype}')
+        return channel
+
+    def get(self, name):
+        return self._channels.get(name)
+
+    def names(self, prefix=''):
+        return [name for name in list(self._channels) if name.startswith(prefix)]
+
+    def subscribe(self, prefix=''):
+        """Подписка на новые записи каналов, имена которых начинаются с prefix"""
+        return Subscription(self, prefix)
+
+    def join(self, names, timestamp, tolerance=0.5):
+        """Записи каналов на момент timestamp: имя -> (время, записи).
+
+        Каналы без публикаций за tolerance секунд до timestamp пропускаются.
+        """
+        result = {}
+        for name in names:
+            channel = self._channels.get(name)
+            found = channel.at(timestamp) if channel is not None else None
+            if found is not None and timestamp - found[0] <= tolerance:
+                result[name] = found
+        return result
+
+    def stats(self):
+        return {name: {'written': channel.written, 'overruns': channel.overruns}
+                for name, channel in list(self._channels.items())}
+
+
+# Общая шина процесса
+bus = EventBus()
@@ -1,10 +1,116 @@
 import sys
 import cv2
 from PyQt5 import QtCore, QtGui, QtWidgets
-from deepface import DeepFace
 from PyQt5.QtWidgets import QLabel, QVBoxLayout, QProgressBar, QWidget, QHBoxLayout
 from PyQt5.QtGui import QImage, QPixmap
-from threading import Thread
+import numpy as np
+import time
+from threading import Condition, Lock
+
+from capture import open_capture
+from event_bus import bus
+from face_tracking import FaceTracker
+from smoothing import get_smoother
+
+# Метки модели эмоций DeepFace в порядке её выходов
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+_emotion_model = None
+_model_lock = Lock()
+
+def load_model():
+    """Импорт DeepFace (TensorFlow) и загрузка модели эмоций, выполняется один раз"""
+    global _emotion_model
+    with _model_lock:
+        if _emotion_model is None:
+            from deepface import DeepFace
+            try:
+                built = DeepFace.build_model(task='facial_attribute', model_name='Emotion')
+            except TypeError:
+                # Старые версии deepface
+                built = DeepFace.build_model('Emotion')
+            # Новые версии возвращают обёртку, сама модель Keras - в .model
+            _emotion_model = getattr(built, 'model', built)
+        return _emotion_model
+
+def classify_faces(crops):
+    """Вероятности эмоций для батча лиц 48x48 в оттенках серого"""
+    return load_model().predict(crops, verbose=0)
+
+# Сколько раз в секунду обрабатывать кадр: сопровождение лиц дешёвое,
+# поиск лиц и модель эмоций запускаются реже (см. FaceTracker)
+ANALYSIS_RATE = 15.0
+
+# Сглаживание эмоций каждого лица по времени кадров, постоянная времени в секундах
+SMOOTHING_TAU = 0.5
+# Через сколько секунд без наблюдений трек удаляется из сглаживания
+SMOOTHING_MAX_AGE = 5.0
+
+# Запись канала 'face/<окно>' шины событий: одна строка на лицо кадра
+FACE_EVENT = [('track', np.int32), ('box', np.int32, 4), ('emotions', np.float32, len(EMOTION_LABELS))]
+
+class AnalysisWorker(QtCore.QObject):
+    """Постоянный поток анализа.
+
+    Кадры кладутся в ячейку submit(), новый кадр заменяет необработанный.
+    Поток берёт самый свежий кадр не чаще rate раз в секунду, вызывает
+    analyze(frame, timestamp) и отдаёт результат сигналом result_ready(object),
+    виджеты обновляются в потоке Qt.
+    """
+
+    result_ready = QtCore.pyqtSignal(object)
+
+    def __init__(self, analyze, rate=ANALYSIS_RATE):
+        super().__init__()
+        self.analyze = analyze
+        self.interval = 1.0 / rate if rate else 0.0
+        self._frame = None
+        self._condition = Condition()
+        self._running = True
+        self._thread = QtCore.QThread()
+        self.moveToThread(self._thread)
+        self._thread.started.connect(self.run)
+
+        # Статистика
+        self.analysed = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.quit()
+        self._thread.wait()
+
+    def submit(self, frame, timestamp):
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = (frame, timestamp)
+            self._condition.notify()
+
+    def run(self):
+        next_time = 0.0
+        while True:
+            # Ограничение частоты: ждём, не забирая кадр, чтобы взять самый свежий
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                with self._condition:
+                    self._condition.wait_for(lambda: not self._running, delay)
+            with self._condition:
+                self._condition.wait_for(lambda: self._frame is not None or not self._running)
+                if not self._running:
+                    return
+                (frame, timestamp), self._frame = self._frame, None
+
+            next_time = time.monotonic() + self.interval
+            result = self.analyze(frame, timestamp)
+            self.analysed += 1
+            if result is not None:
+                self.result_ready.emit(result)
 
 # Цветовая палитра
 colors = {
@@ -16,12 +122,19 @@ colors = {
 }
 
 class EmotionApp(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, analysis_rate=ANALYSIS_RATE):
         super().__init__()
 
         # Инициализация захвата видео и GUI элементов
-        self.video_capture = cv2.VideoCapture(1)
+        self.video_capture = open_capture(1)
+        self.last_seq = 0
         self.target_emotions = {emotion: 0 for emotion in ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']}
+        self.smoother = get_smoother('face', len(EMOTION_LABELS), tau=SMOOTHING_TAU)
+        self.primary_face = None  # Трек, который показывают полосы
+        # Сглаживатель общий для всех окон, номера треков у каждого окна свои
+        self.smoother_keys = set()
+        # У канала шины один писатель - поток анализа этого окна, номера треков тоже свои
+        self.events = bus.channel(f'face/{id(self)}', FACE_EVENT)
         
         # Таймер для обновления видеокадра
         self.timer = QtCore.QTimer()
@@ -72,52 +185,75 @@ class EmotionApp(QtWidgets.QWidget):
         self.setGeometry(100, 100, 900, 500)
         self.setStyleSheet(f"background-color: {colors['White']};")
         
-        # Переменные для потока анализа
-        self.analysis_thread = None
+        # Постоянный поток анализа, результаты приходят сигналом в поток интерфейса.
+        # Лица сопровождаются между кадрами, модель видит только изменившиеся лица
         self.current_frame = None
+        self.faces = []
+        self.tracker = FaceTracker(classify_faces, EMOTION_LABELS)
+        self.analysis = AnalysisWorker(self.analyze, analysis_rate)
+        self.analysis.result_ready.connect(self.on_emotions)
+        self.analysis.start()
 
     def update_frame(self):
-        ret, frame = self.video_capture.read()
-        if ret:
-            self.current_frame = frame.copy()  # Сохраняем текущий кадр
+        # Самый свежий кадр из потока захвата, без ожидания
+        item = self.video_capture.latest(after_seq=self.last_seq, timeout=0)
+        if item is not None:
+            self.last_seq = item.seq
+            frame = item.frame
+            self.current_frame = frame  # Кадры из буфера захвата не изменяются
             
-            # Запускаем анализ эмоций в отдельном потоке, если поток не активен
-            if self.analysis_thread is None or not self.analysis_thread.is_alive():
-                self.analysis_thread = Thread(target=self.analyze_emotions, args=(frame,))
-                self.analysis_thread.start()
+            # Кадр уходит на анализ без ожидания, поток анализа возьмёт самый свежий
+            self.analysis.submit(frame, item.timestamp)
 
-            # Отображаем видеокадр в QLabel без использования QPainter
-            self.analysis_thread.join()
-            
             rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            for face in self.faces:
+                x, y, w, h = face.box
+                emotion = max(face.emotions, key=face.emotions.get)
+                cv2.rectangle(rgb_image, (x, y), (x + w, y + h), (226, 26, 26), 2)
+                cv2.putText(rgb_image, f"{face.track_id}: {emotion}", (x, max(15, y - 8)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (226, 26, 26), 2)
             height, width, channel = rgb_image.shape
             step = channel * width
             q_image = QImage(rgb_image.data, width, height, step, QImage.Format_RGB888)
             self.video_label.setPixmap(QPixmap.fromImage(q_image))
+        self.update_bars()
+
+    def analyze(self, frame, timestamp):
+        # Поток анализа: эмоции всех лиц кадра уходят в сглаживание одним шагом
+        faces = self.tracker.process(frame)
+        if faces:
+            values = [[face.emotions[label] for label in EMOTION_LABELS] for face in faces]
+            keys = [(id(self), face.track_id) for face in faces]
+            self.smoother_keys.update(keys)
+            self.smoother.update(keys, values, [timestamp] * len(faces))
+            self.events.publish_many([(face.track_id, face.box, emotions) for face, emotions in zip(faces, values)],
+                                     timestamp)
+        self.smoother_keys.difference_update(self.smoother.prune(timestamp, SMOOTHING_MAX_AGE))
+        return faces
+
+    def on_emotions(self, faces):
+        self.faces = faces
+        if faces:
+            # Полосы показывают самое крупное лицо
+            self.primary_face = max(faces, key=lambda f: f.box[2] * f.box[3]).track_id
+
+    def update_bars(self):
+        # Значения на текущий момент, не зависят от частоты таймера
+        if self.primary_face is None:
+            return
+        values = self.smoother.read([(id(self), self.primary_face)], time.monotonic())[0]
+        for i, emotion in enumerate(self.target_emotions):
+            value = int(values[i])
+            self.emotion_labels[i].setText(f"{emotion}: {value}%")
+            self.emotion_bars[i].setValue(value)
 
-    def analyze_emotions(self, frame):
-        # Уменьшаем размер кадра для ускорения анализа
-        small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-
-        try:
-            # Анализируем эмоции на уменьшенном кадре
-            analysis = DeepFace.analyze(small_frame, actions=['emotion'])
-            self.target_emotions = analysis[0]['emotion']
-        except Exception as e:
-            print('Face not found', e)
-
-        # Обновляем текстовые метки и прогресс-бары с интерполяцией
-        try:
-            for i, (emotion, target_value) in enumerate(self.target_emotions.items()):
-                current_value = self.emotion_bars[i].value()
-                smoothed_value = int(current_value + 0.1 * (target_value - current_value))
-                self.emotion_labels[i].setText(f"{emotion}: {smoothed_value}%")
-                self.emotion_bars[i].setValue(smoothed_value)
-            
-        except:
-            pass
     def closeEvent(self, event):
         # Очищаем ресурсы при закрытии окна
+        self.timer.stop()
+        self.analysis.stop()
+        for key in self.smoother_keys:
+            self.smoother.remove(key)
+        self.smoother_keys.clear()
         self.video_capture.release()
         cv2.destroyAllWindows()
         event.accept()
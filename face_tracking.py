@@ -0,0 +1,151 @@
+import collections
+import itertools
+import time
+
+import cv2
+import numpy as np
+
+from person_detection import box_iou, merge_boxes
+
+# Лицо на кадре: номер трека, рамка (x, y, w, h) и эмоции (название -> проценты)
+FaceResult = collections.namedtuple('FaceResult', ['track_id', 'box', 'emotions'])
+
+
+class FaceTrack:
+    """Одно лицо между кадрами: рамка, шаблон для сопровождения и кэш результата"""
+
+    def __init__(self, track_id, box, template):
+        self.id = track_id
+        self.box = box
+        self.template = template
+        self.missed = 0
+        self.signature = None  # Уменьшенная копия лица на момент последнего анализа
+        self.emotions = None
+        self.analysed_at = 0.0
+
+
+class FaceTracker:
+    """Поиск лиц раз в detect_interval кадров и сопровождение между поисками.
+
+    Между поисками лицо ищется сопоставлением с шаблоном рядом с прежней
+    рамкой. В классификатор эмоций уходят только лица, у которых истёк
+    кэш (ttl секунд) или заметно изменилось изображение; все они
+    обрабатываются одним батчем classify(crops) -> (лица, метки), где crops -
+    массив (лица, crop_size, crop_size, 1) в оттенках серого от 0 до 1.
+    """
+
+    def __init__(self, classify, labels, detect_interval=5, ttl=1.0, change_threshold=6.0,
+                 max_missed=3, match_threshold=0.5, search_margin=0.5, min_face=40, crop_size=48):
+        self.classify = classify
+        self.labels = labels
+        self.detect_interval = detect_interval
+        self.ttl = ttl
+        self.change_threshold = change_threshold
+        self.max_missed = max_missed
+        self.match_threshold = match_threshold
+        self.search_margin = search_margin
+        self.min_face = min_face
+        self.crop_size = crop_size
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._frame_index = 0
+
+        # Статистика
+        self.detections = 0
+        self.classified = 0
+        self.cached = 0
+
+    def reset(self):
+        self.tracks = []
+        self._frame_index = 0
+
+    def process(self, frame):
+        """Обновить треки по кадру BGR и вернуть список FaceResult"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self._frame_index % self.detect_interval == 0 or not self.tracks:
+            self._detect(gray)
+        else:
+            self._follow(gray)
+        self._frame_index += 1
+        self._classify(gray)
+        return [FaceResult(track.id, track.box, track.emotions)
+                for track in self.tracks if track.emotions is not None and track.missed == 0]
+
+    def _crop(self, gray, box):
+        x, y, w, h = box
+        return gray[y:y + h, x:x + w]
+
+    def _detect(self, gray):
+        self.detections += 1
+        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                                   minSize=(self.min_face, self.min_face))
+        boxes = merge_boxes([tuple(int(v) for v in face) for face in faces])
+
+        # Найденные лица продолжают ближайшие треки, остальные дают новые
+        unmatched = list(self.tracks)
+        for box in boxes:
+            overlaps = box_iou(box, [track.box for track in unmatched])
+            if len(overlaps) and overlaps.max() > 0.3:
+                track = unmatched.pop(int(overlaps.argmax()))
+                track.box = box
+                track.template = self._crop(gray, box).copy()
+                track.missed = 0
+            else:
+                self.tracks.append(FaceTrack(next(self._ids), box, self._crop(gray, box).copy()))
+        for track in unmatched:
+            track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+    def _follow(self, gray):
+        height, width = gray.shape
+        for track in self.tracks:
+            x, y, w, h = track.box
+            mx, my = int(w * self.search_margin), int(h * self.search_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+            region = gray[y0:y1, x0:x1]
+            if region.shape[0] < h or region.shape[1] < w:
+                track.missed += 1
+                continue
+            scores = cv2.matchTemplate(region, track.template, cv2.TM_CCOEFF_NORMED)
+            _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+            if best < self.match_threshold:
+                track.missed += 1
+                continue
+            track.box = (x0 + bx, y0 + by, w, h)
+            track.template = self._crop(gray, track.box).copy()
+            track.missed = 0
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+    def _classify(self, gray):
+        now = time.monotonic()
+        stale, crops = [], []
+        for track in self.tracks:
+            if track.missed:
+                continue
+            face = cv2.resize(self._crop(gray, track.box), (self.crop_size, self.crop_size),
+                              interpolation=cv2.INTER_AREA)
+            signature = cv2.resize(face, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+            changed = (track.signature is None
+                       or np.mean(np.abs(signature - track.signature)) > self.change_threshold)
+            if track.emotions is not None and not changed and now - track.analysed_at < self.ttl:
+                self.cached += 1
+                continue
+            stale.append((track, signature))
+            crops.append(face)
+        if not crops:
+            return
+
+        batch = np.stack(crops).astype(np.float32)[..., None] / 255.0
+        scores = np.asarray(self.classify(batch))
+        self.classified += len(crops)
+        for (track, signature), track_scores in zip(stale, scores):
+            track.emotions = {label: float(score) * 100 for label, score in zip(self.labels, track_scores)}
+            track.signature = signature
+            track.analysed_at = now
+
+    def stats(self):
+        return {'tracks': len(self.tracks), 'detections': self.detections,
+                'classified': self.classified, 'cached': self.cached}
@@ -0,0 +1,163 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+CODEC_RAW = 0
+CODEC_JPEG = 1
+CODEC_PNG = 2  # Без потерь, для отладки
+
+CODECS = {'raw': CODEC_RAW, 'jpeg': CODEC_JPEG, 'png': CODEC_PNG}
+
+# Сжатый кадр: кодек, исходная форма и тип, байты
+EncodedFrame = collections.namedtuple('EncodedFrame', ['codec', 'shape', 'dtype', 'data'])
+
+
+def encode_frame(frame, codec, quality=80):
+    """Сжать кадр в EncodedFrame"""
+    if codec == CODEC_JPEG:
+        ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    elif codec == CODEC_PNG:
+        ok, data = cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    else:
+        raise ValueError(f'Неизвестный кодек {codec}')
+    if not ok:
+        raise ValueError('Не удалось сжать кадр')
+    return EncodedFrame(codec, frame.shape, frame.dtype, data)
+
+
+def decode_frame(codec, dtype, shape, payload):
+    """Кадр из данных сообщения (сырые байты или JPEG/PNG)"""
+    if codec == CODEC_RAW:
+        frame = np.frombuffer(payload, dtype=dtype).reshape(shape)
+        return frame[:, :, 0] if shape[2] == 1 else frame
+    frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if frame is None:
+        raise ValueError('Не удалось распаковать кадр')
+    return frame
+
+
+class QualityController:
+    """Подбирает качество JPEG, чтобы поток камеры укладывался в бюджет байт/с"""
+
+    def __init__(self, budget, quality=80, min_quality=30, max_quality=95, step=5,
+                 window=2.0, interval=0.25):
+        self.budget = budget
+        self.quality = quality
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.step = step
+        self.window = window
+        self.interval = interval
+        self._sizes = collections.deque()
+        self._last_change = 0.0
+
+    def rate(self, now):
+        """Байт/с за последнее окно"""
+        while self._sizes and self._sizes[0][0] < now - self.window:
+            self._sizes.popleft()
+        if not self._sizes:
+            return 0.0
+        span = max(now - self._sizes[0][0], self.interval)
+        return sum(size for _, size in self._sizes) / span
+
+    def update(self, size, now=None):
+        """Учесть размер очередного кадра и вернуть качество для следующего"""
+        now = time.monotonic() if now is None else now
+        self._sizes.append((now, size))
+        if now - self._last_change < self.interval:
+            return self.quality
+
+        rate = self.rate(now)
+        if rate > self.budget:
+            # Чем сильнее превышение, тем больше шаг вниз
+            overshoot = min(4, int(rate / self.budget))
+            self.quality = max(self.min_quality, self.quality - self.step * overshoot)
+            self._last_change = now
+        elif rate < self.budget * 0.8 and self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.step)
+            self._last_change = now
+        return self.quality
+
+
+class FrameEncoder:
+    """Поток сжатия кадров одной камеры.
+
+    Берёт самый свежий кадр, сжимает его и передаёт в
+    callback(camera_id, encoded, timestamp). Если задан бюджет в байт/с,
+    качество JPEG подстраивается под него.
+    """
+
+    def __init__(self, camera_id, codec, callback, budget=None, quality=80):
+        self.camera_id = camera_id
+        self.codec = codec
+        self.callback = callback
+        self.quality = quality
+        self.controller = QualityController(budget, quality) if budget and codec == CODEC_JPEG else None
+
+        self._pending = None
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'encoder-{camera_id}', daemon=True)
+        self._thread.start()
+
+        # Статистика
+        self.encoded = 0
+        self.dropped = 0
+        self.encode_ms = 0.0
+        self.ratio = 0.0
+        self.bytes_out = 0
+
+    def submit(self, frame, timestamp):
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (frame, timestamp)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._pending is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                frame, timestamp = self._pending
+                self._pending = None
+
+            start = time.perf_counter()
+            try:
+                encoded = encode_frame(frame, self.codec, self.quality)
+            except ValueError as e:
+                print(f'Камера {self.camera_id}:', e)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+
+            size = len(encoded.data)
+            # Скользящие средние, чтобы статистика не прыгала от кадра к кадру
+            self.encode_ms = elapsed if not self.encoded else self.encode_ms * 0.9 + elapsed * 0.1
+            ratio = frame.nbytes / max(size, 1)
+            self.ratio = ratio if not self.encoded else self.ratio * 0.9 + ratio * 0.1
+            self.encoded += 1
+            self.bytes_out += size
+            if self.controller is not None:
+                self.quality = self.controller.update(size)
+
+            self.callback(self.camera_id, encoded, timestamp)
+
+    def stats(self):
+        stats = {'codec': self.codec, 'quality': self.quality, 'encoded': self.encoded,
+                 'dropped': self.dropped, 'encode_ms': self.encode_ms, 'ratio': self.ratio,
+                 'bytes_out': self.bytes_out}
+        if self.controller is not None:
+            stats['rate'] = self.controller.rate(time.monotonic())
+            stats['budget'] = self.controller.budget
+        return stats
@@ -0,0 +1,496 @@
+import asyncio
+import collections
+import json
+import socket
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from shm_transport import SharedFrameRing, SLOT_COUNT, MAX_FRAME_BYTES, recv_exact, shm_name_prefix
+from frame_codec import CODEC_RAW, CODECS, EncodedFrame, FrameEncoder, encode_frame, decode_frame
+
+MAGIC = b'BRF1'
+# Заголовок сообщения: magic, тип, кодек, тип данных, (выравнивание), камера, слот,
+# номер кадра, высота, ширина, каналы, время захвата, длина данных после заголовка
+HEADER = struct.Struct('<4sBBBxiiQIIIdI')
+
+# Типы сообщений
+HELLO = 1       # обработчик -> камеры: возможности (features в поле slot)
+ATTACH = 2      # камеры -> обработчик: новая камера, в данных JSON с блоками разделяемой памяти
+DETACH = 3      # камеры -> обработчик: камера закрыта
+FRAME = 4       # кадр в данных сообщения
+RESULT = 5      # обработанный кадр в данных сообщения
+SHM_FRAME = 6   # кадр в слоте разделяемой памяти
+SHM_RESULT = 7  # обработанный кадр в слоте разделяемой памяти
+SCORES = 8      # обработчик -> камеры: оценки категорий кадра, в данных JSON {метка: оценка}
+
+FEATURE_SHM = 1
+
+DTYPES = {0: np.uint8, 1: np.uint16, 2: np.float32}
+DTYPE_CODES = {np.dtype(dtype): code for code, dtype in DTYPES.items()}
+
+# Обработчик без заголовков (posemodel) принимает и возвращает кадры такого размера
+LEGACY_FRAME_SHAPE = (480, 640, 3)
+
+Message = collections.namedtuple('Message', ['kind', 'camera_id', 'seq', 'timestamp', 'frame', 'payload'])
+
+
+def pack_header(kind, camera_id=0, seq=0, shape=(0, 0, 0), dtype=np.uint8, timestamp=0.0,
+                length=0, codec=CODEC_RAW, slot=0):
+    height, width, channels = shape if len(shape) == 3 else tuple(shape) + (1,)
+    return HEADER.pack(MAGIC, kind, codec, DTYPE_CODES[np.dtype(dtype)], camera_id, slot, seq,
+                       height, width, channels, timestamp, length)
+
+
+def unpack_header(data):
+    """(тип, кодек, dtype, камера, слот, номер, форма, время, длина)"""
+    magic, kind, codec, dtype, camera_id, slot, seq, height, width, channels, timestamp, length = \
+        HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ConnectionError('Повреждённый поток: неверный заголовок')
+    return kind, codec, DTYPES[dtype], camera_id, slot, seq, (height, width, channels), timestamp, length
+
+
+def frame_message(kind, camera_id, seq, frame, timestamp):
+    """Заголовок и данные кадра (или сжатого EncodedFrame) для отправки"""
+    if isinstance(frame, EncodedFrame):
+        payload = memoryview(frame.data).cast('B')
+        return pack_header(kind, camera_id, seq, frame.shape, frame.dtype, timestamp, len(payload),
+                           codec=frame.codec), payload
+    frame = np.ascontiguousarray(frame)
+    payload = memoryview(frame).cast('B')
+    return pack_header(kind, camera_id, seq, frame.shape, frame.dtype, timestamp, len(payload)), payload
+
+
+class CameraStream:
+    """Состояние одной камеры на соединении с обработчиком"""
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.connection = None
+        self.seq = 0
+        self.in_flight = 0
+        self.pending = None  # Последний кадр, ждущий отправки (frame, timestamp)
+        self.frames = None
+        self.results = None
+
+        # Статистика
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+
+    def close_rings(self):
+        for ring in (self.frames, self.results):
+            if ring is not None:
+                ring.close()
+        self.frames = self.results = None
+
+
+class WorkerConnection:
+    """Подключённый обработчик, может обслуживать несколько камер"""
+
+    def __init__(self, connection_id, reader, writer):
+        self.id = connection_id
+        self.reader = reader
+        self.writer = writer
+        self.legacy = False
+        self.features = 0
+        self.cameras = {}
+
+    def write_buffer_size(self):
+        return self.writer.transport.get_write_buffer_size()
+
+
+class FrameTransportServer(QObject):
+    """Сервер для обработчиков на asyncio в отдельном потоке.
+
+    Подключение обработчиков не блокирует интерфейс, кадры собираются по
+    заголовку с длиной, у каждой камеры не больше max_in_flight кадров в
+    обработке: пока обработчик занят, хранится только самый свежий кадр.
+    Результаты передаются в Qt через сигнал result_ready(camera_id, frame),
+    оценки категорий кадра - через scores_ready(camera_id, время захвата, {метка: оценка}).
+
+    compression='jpeg' (или 'png' для отладки) включает сжатие кадров для
+    обработчиков без разделяемой памяти, например на другой машине. Сжатие
+    идёт в отдельном потоке на каждую камеру, при заданном bandwidth_budget
+    (байт/с на камеру) качество JPEG подстраивается под него.
+    """
+
+    result_ready = pyqtSignal(int, object)
+    scores_ready = pyqtSignal(int, float, object)
+    workers_changed = pyqtSignal(int)
+
+    def __init__(self, host='localhost', port=8080, max_in_flight=1, high_water=8 * 1024 * 1024,
+                 use_shm=True, hello_timeout=0.5, compression=None, bandwidth_budget=None,
+                 jpeg_quality=80, parent=None):
+        super().__init__(parent)
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self.high_water = high_water
+        self.use_shm = use_shm
+        self.hello_timeout = hello_timeout
+        self.codec = CODECS[compression] if compression else CODEC_RAW
+        self.bandwidth_budget = bandwidth_budget
+        self.jpeg_quality = jpeg_quality
+
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._connections = {}
+        self._streams = {}
+        self._waiting = []  # Камеры без обработчика
+        self._encoders = {}  # camera_id -> FrameEncoder
+        self._next_connection_id = 0
+
+    # Методы для потока Qt
+
+    def start(self):
+        """Запустить цикл asyncio, ошибки привязки порта пробрасываются сюда"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._handle_connection, self.host, self.port))
+            except OSError as e:
+                errors.append(e)
+                started.set()
+                return
+            print('server started')
+            started.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='frame-transport', daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+
+    def stop(self):
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        try:
+            future.result(timeout=2.0)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=2.0)
+            self._loop = None
+
+    def attach_camera(self, camera_id):
+        self._loop.call_soon_threadsafe(self._attach, camera_id)
+
+    def detach_camera(self, camera_id):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._detach, camera_id)
+
+    def submit_frame(self, camera_id, frame, timestamp=None):
+        """Отправить кадр обработчику, не блокируясь"""
+        timestamp = time.time() if timestamp is None else timestamp
+        encoder = self._encoders.get(camera_id)
+        if encoder is not None:
+            encoder.submit(frame, timestamp)
+        else:
+            self._loop.call_soon_threadsafe(self._submit, camera_id, frame, timestamp)
+
+    def has_worker(self, camera_id):
+        stream = self._streams.get(camera_id)
+        return stream is not None and stream.connection is not None
+
+    def stats(self):
+        """Статистика по камерам, для сжатых потоков - время сжатия и степень сжатия"""
+        stats = {}
+        for camera_id, stream in list(self._streams.items()):
+            stats[camera_id] = {'sent': stream.sent, 'received': stream.received, 'dropped': stream.dropped,
+                                'bytes_sent': stream.bytes_sent, 'in_flight': stream.in_flight}
+            encoder = self._encoders.get(camera_id)
+            if encoder is not None:
+                stats[camera_id]['encoder'] = encoder.stats()
+        return stats
+
+    # Всё ниже выполняется в цикле asyncio
+
+    async def _shutdown(self):
+        self._server.close()
+        for connection in list(self._connections.values()):
+            connection.writer.close()
+        for stream in self._streams.values():
+            stream.close_rings()
+        stopping = [self._stop_encoder(camera_id) for camera_id in list(self._encoders)]
+        await asyncio.gather(*[future for future in stopping if future is not None])
+
+    async def _handle_connection(self, reader, writer):
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = WorkerConnection(self._next_connection_id, reader, writer)
+        self._next_connection_id += 1
+
+        # Обработчик с поддержкой заголовков сразу присылает HELLO
+        try:
+            data = await asyncio.wait_for(reader.readexactly(HEADER.size), self.hello_timeout)
+            kind, _, _, _, features, _, _, _, _ = unpack_header(data)
+            connection.features = features if kind == HELLO else 0
+        except asyncio.TimeoutError:
+            connection.legacy = True
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        self._connections[connection.id] = connection
+        self.workers_changed.emit(len(self._connections))
+        for camera_id in list(self._waiting):
+            self._attach(camera_id)
+
+        try:
+            if connection.legacy:
+                await self._read_legacy(connection)
+            else:
+                await self._read_framed(connection)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            print('Обработчик отключился:', e)
+        finally:
+            self._drop_connection(connection)
+
+    async def _read_framed(self, connection):
+        while True:
+            header = await connection.reader.readexactly(HEADER.size)
+            kind, codec, dtype, camera_id, slot, seq, shape, timestamp, length = unpack_header(header)
+            payload = await connection.reader.readexactly(length) if length else b''
+            stream = connection.cameras.get(camera_id)
+            if stream is None:
+                continue
+            if kind == SCORES:
+                self.scores_ready.emit(camera_id, timestamp, json.loads(bytes(payload)))
+            elif kind == RESULT:
+                self._on_result(stream, decode_frame(codec, dtype, shape, payload), seq)
+            elif kind == SHM_RESULT and stream.results is not None:
+                # Слот будет перезаписан, в поток Qt уходит копия
+                self._on_result(stream, stream.results.slot(slot, shape, dtype).copy(), seq)
+
+    async def _read_legacy(self, connection):
+        size = int(np.prod(LEGACY_FRAME_SHAPE))
+        while True:
+            data = await connection.reader.readexactly(size)
+            for stream in list(connection.cameras.values()):
+                self._on_result(stream, np.frombuffer(data, dtype=np.uint8).reshape(LEGACY_FRAME_SHAPE))
+
+    def _drop_connection(self, connection):
+        self._connections.pop(connection.id, None)
+        connection.writer.close()
+        for stream in list(connection.cameras.values()):
+            stream.connection = None
+            stream.in_flight = 0
+            stream.close_rings()
+            self._stop_encoder(stream.camera_id)
+            if stream.camera_id in self._streams:
+                self._waiting.append(stream.camera_id)
+        connection.cameras.clear()
+        self.workers_changed.emit(len(self._connections))
+        # Камеры переходят к оставшимся обработчикам
+        for camera_id in list(self._waiting):
+            self._attach(camera_id)
+
+    def _choose_connection(self):
+        candidates = [c for c in self._connections.values() if not (c.legacy and c.cameras)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda c: len(c.cameras))
+
+    def _attach(self, camera_id):
+        stream = self._streams.get(camera_id)
+        if stream is None:
+            stream = self._streams[camera_id] = CameraStream(camera_id)
+        if stream.connection is not None:
+            return
+        connection = self._choose_connection()
+        if connection is None:
+            if camera_id not in self._waiting:
+                self._waiting.append(camera_id)
+            return
+        if camera_id in self._waiting:
+            self._waiting.remove(camera_id)
+
+        stream.connection = connection
+        connection.cameras[camera_id] = stream
+        if connection.legacy:
+            return
+
+        info = {}
+        if self.use_shm and connection.features & FEATURE_SHM:
+            prefix = f'{shm_name_prefix(camera_id)}_{connection.id}'
+            try:
+                stream.frames = SharedFrameRing(f'{prefix}_f', SLOT_COUNT, MAX_FRAME_BYTES)
+                stream.results = SharedFrameRing(f'{prefix}_r', SLOT_COUNT, MAX_FRAME_BYTES)
+                info = {'frames': stream.frames.name, 'results': stream.results.name,
+                        'slots': SLOT_COUNT, 'slot_bytes': MAX_FRAME_BYTES}
+            except OSError as e:
+                print('Разделяемая память недоступна, кадры идут через сокет:', e)
+                stream.close_rings()
+        payload = json.dumps(info).encode()
+        connection.writer.write(pack_header(ATTACH, camera_id, length=len(payload)) + payload)
+
+        if stream.frames is None and self.codec != CODEC_RAW:
+            self._encoders[camera_id] = FrameEncoder(
+                camera_id, self.codec, self._on_encoded, self.bandwidth_budget, self.jpeg_quality)
+
+    def _on_encoded(self, camera_id, encoded, timestamp):
+        # Вызывается из потока сжатия
+        try:
+            self._loop.call_soon_threadsafe(self._submit, camera_id, encoded, timestamp)
+        except (AttributeError, RuntimeError):
+            pass  # Сервер уже остановлен
+
+    def _stop_encoder(self, camera_id):
+        # stop() ждёт поток сжатия, цикл asyncio при этом обслуживает остальные камеры
+        encoder = self._encoders.pop(camera_id, None)
+        if encoder is not None:
+            return self._loop.run_in_executor(None, encoder.stop)
+        return None
+
+    def _detach(self, camera_id):
+        stream = self._streams.pop(camera_id, None)
+        if camera_id in self._waiting:
+            self._waiting.remove(camera_id)
+        self._stop_encoder(camera_id)
+        if stream is None or stream.connection is None:
+            return
+        connection = stream.connection
+        connection.cameras.pop(camera_id, None)
+        if not connection.legacy:
+            connection.writer.write(pack_header(DETACH, camera_id))
+        stream.close_rings()
+
+    def _submit(self, camera_id, frame, timestamp):
+        stream = self._streams.get(camera_id)
+        if stream is None or stream.connection is None:
+            return
+        if isinstance(frame, EncodedFrame) and stream.connection.legacy:
+            # Сжатый кадр остался от прежнего обработчика, старый протокол его не поймёт
+            return
+        busy = (stream.in_flight >= self.max_in_flight
+                or stream.connection.write_buffer_size() > self.high_water)
+        if busy:
+            # Обработчик не успевает: оставляем только самый свежий кадр
+            if stream.pending is not None:
+                stream.dropped += 1
+            stream.pending = (frame, timestamp)
+            return
+        self._send(stream, frame, timestamp)
+
+    def _send(self, stream, frame, timestamp):
+        connection = stream.connection
+        stream.seq += 1
+        if isinstance(frame, EncodedFrame) or (stream.frames is None and not connection.legacy):
+            header, payload = frame_message(FRAME, stream.camera_id, stream.seq, frame, timestamp)
+            connection.writer.writelines([header, payload])
+            stream.bytes_sent += len(header) + len(payload)
+        elif connection.legacy:
+            if frame.shape != LEGACY_FRAME_SHAPE:
+                frame = cv2.resize(frame, (LEGACY_FRAME_SHAPE[1], LEGACY_FRAME_SHAPE[0]))
+            data = np.ascontiguousarray(frame).tobytes()
+            connection.writer.write(data)
+            stream.bytes_sent += len(data)
+        else:
+            slot = stream.seq % stream.frames.slot_count
+            np.copyto(stream.frames.slot(slot, frame.shape, frame.dtype), frame)
+            connection.writer.write(pack_header(SHM_FRAME, stream.camera_id, stream.seq, frame.shape,
+                                                frame.dtype, timestamp, slot=slot))
+            stream.bytes_sent += HEADER.size
+        stream.in_flight += 1
+        stream.sent += 1
+
+    def _on_result(self, stream, frame, seq=None):
+        if seq is None:
+            stream.in_flight = max(0, stream.in_flight - 1)
+        else:
+            # Обработчик отвечает только на самый свежий кадр, более ранние уже не придут
+            stream.in_flight = max(0, stream.seq - seq)
+        stream.received += 1
+        self.result_ready.emit(stream.camera_id, frame)
+        if stream.pending is not None and stream.connection is not None:
+            frame, timestamp = stream.pending
+            stream.pending = None
+            self._send(stream, frame, timestamp)
+
+
+class WorkerClient:
+    """Сторона обработчика: блокирующий клиент протокола с заголовками.
+
+    receive() возвращает сообщения ATTACH, DETACH и FRAME (кадры из
+    разделяемой памяти и сжатые кадры приходят тоже как FRAME, уже
+    распакованными). send_result() можно вызывать из другого потока,
+    result_codec позволяет сжимать результаты для удалённой камеры.
+    Оценки категорий кадра уходят вместе с результатом сообщением SCORES.
+    """
+
+    def __init__(self, host='localhost', port=8080, use_shm=True, result_codec=CODEC_RAW, quality=80):
+        self.result_codec = result_codec
+        self.quality = quality
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send_lock = threading.Lock()
+        self.rings = {}  # camera_id -> (кадры, результаты)
+        self.slots = {}  # camera_id -> (номер, слот) последнего кадра из разделяемой памяти
+        self._send(pack_header(HELLO, slot=FEATURE_SHM if use_shm else 0))
+
+    def _send(self, *parts):
+        with self._send_lock:
+            for part in parts:
+                self.sock.sendall(part)
+
+    def receive(self):
+        while True:
+            kind, codec, dtype, camera_id, slot, seq, shape, timestamp, length = \
+                unpack_header(recv_exact(self.sock, HEADER.size))
+            payload = recv_exact(self.sock, length) if length else b''
+
+            if kind == ATTACH:
+                info = json.loads(bytes(payload) or b'{}')
+                if info:
+                    self.rings[camera_id] = (
+                        SharedFrameRing(info['frames'], info['slots'], info['slot_bytes'], create=False),
+                        SharedFrameRing(info['results'], info['slots'], info['slot_bytes'], create=False))
+                return Message(ATTACH, camera_id, 0, 0.0, None, info)
+            if kind == DETACH:
+                self.slots.pop(camera_id, None)
+                for ring in self.rings.pop(camera_id, ()):
+                    ring.close()
+                return Message(DETACH, camera_id, 0, 0.0, None, None)
+            if kind == FRAME:
+                return Message(FRAME, camera_id, seq, timestamp, decode_frame(codec, dtype, shape, payload), None)
+            if kind == SHM_FRAME and camera_id in self.rings:
+                self.slots[camera_id] = (seq, slot)
+                frame = self.rings[camera_id][0].slot(slot, shape, dtype)
+                return Message(FRAME, camera_id, seq, timestamp, frame, None)
+
+    def send_result(self, camera_id, seq, frame, timestamp=0.0, scores=None):
+        parts = []
+        if scores:
+            data = json.dumps(scores).encode()
+            parts += [pack_header(SCORES, camera_id, seq, timestamp=timestamp, length=len(data)), data]
+        last_seq, slot = self.slots.get(camera_id, (None, None))
+        rings = self.rings.get(camera_id)
+        if last_seq == seq and rings is not None:
+            np.copyto(rings[1].slot(slot, frame.shape, frame.dtype), frame)
+            parts.append(pack_header(SHM_RESULT, camera_id, seq, frame.shape, frame.dtype, timestamp, slot=slot))
+        else:
+            if self.result_codec != CODEC_RAW:
+                frame = encode_frame(frame, self.result_codec, self.quality)
+            parts += frame_message(RESULT, camera_id, seq, frame, timestamp)
+        self._send(*parts)
+
+    def close(self):
+        self.sock.close()
+        for rings in self.rings.values():
+            for ring in rings:
+                ring.close()
+        self.rings.clear()
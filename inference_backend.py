@@ -0,0 +1,261 @@
+import argparse
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+MODEL_DIR = 'models'
+BACKENDS = ('auto', 'eager', 'torchscript', 'onnx', 'int8')
+
+# Pickled eager models
+BODY_PTH = 'model_body1.pth'
+CONTEXT_PTH = 'model_context1.pth'
+EMOTIC_PTH = 'model_emotic1.pth'
+
+# Exported graphs, backend -> (body, context, head)
+EXPORTED_FILES = {
+    'torchscript': ('model_body1.ts', 'model_context1.ts', 'model_head1.ts'),
+    'onnx': ('model_body1.onnx', 'model_context1.onnx', 'model_head1.onnx'),
+}
+
+# Static INT8 backbones produced by quantize_models.py, (body, context)
+INT8_FILES = ('model_body1_int8.ts', 'model_context1_int8.ts')
+
+# Input sizes used for tracing/export, see preprocessing.py
+BODY_INPUT = (1, 3, 128, 128)
+CONTEXT_INPUT = (1, 3, 224, 224)
+
+
+class FusedEmoticHead(nn.Module):
+    """Inference-only Emotic head.
+
+    bn1 is folded into fc1, dropout is dropped and fc_cat/fc_cont are
+    merged into a single matmul. Outputs match Emotic in eval mode.
+    """
+
+    def __init__(self, emotic):
+        super(FusedEmoticHead, self).__init__()
+        self.num_context_features = emotic.num_context_features
+        self.num_body_features = emotic.num_body_features
+        self.num_cat = emotic.fc_cat.out_features
+
+        with torch.no_grad():
+            bn = emotic.bn1
+            scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+            self.fc1 = nn.Linear(emotic.fc1.in_features, emotic.fc1.out_features)
+            self.fc1.weight.copy_(emotic.fc1.weight * scale[:, None])
+            self.fc1.bias.copy_((emotic.fc1.bias - bn.running_mean) * scale + bn.bias)
+
+            self.fc_out = nn.Linear(emotic.fc_cat.in_features,
+                                    emotic.fc_cat.out_features + emotic.fc_cont.out_features)
+            self.fc_out.weight.copy_(torch.cat((emotic.fc_cat.weight, emotic.fc_cont.weight)))
+            self.fc_out.bias.copy_(torch.cat((emotic.fc_cat.bias, emotic.fc_cont.bias)))
+        self.eval()
+
+    def forward(self, x_context, x_body):
+        context_features = x_context.reshape(-1, self.num_context_features)
+        body_features = x_body.reshape(-1, self.num_body_features)
+        fuse_out = torch.relu(self.fc1(torch.cat((context_features, body_features), 1)))
+        out = self.fc_out(fuse_out)
+        return out[:, :self.num_cat], out[:, self.num_cat:]
+
+
+def load_eager_models(device, model_dir=MODEL_DIR):
+    """Load pickled body, context and Emotic modules in eval mode"""
+    models = []
+    for name in (BODY_PTH, CONTEXT_PTH, EMOTIC_PTH):
+        model = torch.load(os.path.join(model_dir, name), map_location=device)
+        model.to(device)
+        model.eval()
+        models.append(model)
+    return models
+
+
+class EagerBackend:
+    """Run the pickled PyTorch modules as they are"""
+
+    name = 'eager'
+
+    def __init__(self, device, model_dir=MODEL_DIR):
+        self.device = device
+        self.body_model, self.context_model, self.emotic_model = load_eager_models(device, model_dir)
+
+    def body(self, tensor):
+        return self.body_model(tensor.to(self.device))
+
+    def context(self, tensor):
+        return self.context_model(tensor.to(self.device))
+
+    def head(self, context_features, body_features):
+        return self.emotic_model(context_features, body_features)
+
+
+class TorchScriptBackend:
+    """Run traced and frozen TorchScript graphs"""
+
+    name = 'torchscript'
+
+    def __init__(self, device, model_dir=MODEL_DIR):
+        self.device = device
+        body_file, context_file, head_file = EXPORTED_FILES['torchscript']
+        self.body_model = torch.jit.load(os.path.join(model_dir, body_file), map_location=device)
+        self.context_model = torch.jit.load(os.path.join(model_dir, context_file), map_location=device)
+        self.head_model = torch.jit.load(os.path.join(model_dir, head_file), map_location=device)
+
+    def body(self, tensor):
+        return self.body_model(tensor.to(self.device))
+
+    def context(self, tensor):
+        return self.context_model(tensor.to(self.device))
+
+    def head(self, context_features, body_features):
+        return self.head_model(context_features, body_features)
+
+
+class OnnxBackend:
+    """Run exported graphs with ONNX Runtime on CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, device, model_dir=MODEL_DIR, num_threads=0):
+        import onnxruntime as ort
+
+        self.device = torch.device('cpu')
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads  # 0 lets ONNX Runtime choose
+
+        body_file, context_file, head_file = EXPORTED_FILES['onnx']
+        self.body_session, self.context_session, self.head_session = [
+            ort.InferenceSession(os.path.join(model_dir, name), options, providers=['CPUExecutionProvider'])
+            for name in (body_file, context_file, head_file)
+        ]
+
+    def run(self, session, *tensors):
+        inputs = {arg.name: np.ascontiguousarray(tensor.cpu().numpy())
+                  for arg, tensor in zip(session.get_inputs(), tensors)}
+        return [torch.from_numpy(out) for out in session.run(None, inputs)]
+
+    def body(self, tensor):
+        return self.run(self.body_session, tensor)[0]
+
+    def context(self, tensor):
+        return self.run(self.context_session, tensor)[0]
+
+    def head(self, context_features, body_features):
+        cat_out, cont_out = self.run(self.head_session, context_features, body_features)
+        return cat_out, cont_out
+
+
+class Int8Backend:
+    """Run statically quantized INT8 backbones with the fused float head on CPU"""
+
+    name = 'int8'
+
+    def __init__(self, device, model_dir=MODEL_DIR):
+        # Quantized kernels are CPU only
+        self.device = torch.device('cpu')
+        body_file, context_file = INT8_FILES
+        self.body_model = torch.jit.load(os.path.join(model_dir, body_file), map_location=self.device)
+        self.context_model = torch.jit.load(os.path.join(model_dir, context_file), map_location=self.device)
+
+        head_file = os.path.join(model_dir, EXPORTED_FILES['torchscript'][2])
+        if os.path.exists(head_file):
+            self.head_model = torch.jit.load(head_file, map_location=self.device)
+        else:
+            emotic_model = torch.load(os.path.join(model_dir, EMOTIC_PTH), map_location=self.device)
+            self.head_model = FusedEmoticHead(emotic_model.eval())
+
+    def body(self, tensor):
+        return self.body_model(tensor.to(self.device))
+
+    def context(self, tensor):
+        return self.context_model(tensor.to(self.device))
+
+    def head(self, context_features, body_features):
+        return self.head_model(context_features, body_features)
+
+
+def int8_available(model_dir=MODEL_DIR):
+    """Quantized backbones from quantize_models.py are present in the model directory"""
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in INT8_FILES)
+
+
+def resolve_backend(name, device, model_dir=MODEL_DIR):
+    """'auto' picks INT8 on CPU when the quantized files exist, eager otherwise"""
+    if name != 'auto':
+        return name
+    if device.type == 'cpu' and int8_available(model_dir):
+        return 'int8'
+    return 'eager'
+
+
+def create_backend(name, device, model_dir=MODEL_DIR):
+    """Create inference backend by name, any explicit name overrides 'auto'"""
+    name = resolve_backend(name, device, model_dir)
+    if name == 'eager':
+        return EagerBackend(device, model_dir)
+    if name == 'torchscript':
+        return TorchScriptBackend(device, model_dir)
+    if name == 'onnx':
+        return OnnxBackend(device, model_dir)
+    if name == 'int8':
+        return Int8Backend(device, model_dir)
+    raise ValueError(f"Unknown inference backend '{name}', expected one of {BACKENDS}")
+
+
+def export_torchscript(body_model, context_model, head, model_dir=MODEL_DIR):
+    """Trace, freeze and save the three models as TorchScript"""
+    body_file, context_file, head_file = EXPORTED_FILES['torchscript']
+    with torch.no_grad():
+        body_input, context_input = torch.rand(BODY_INPUT), torch.rand(CONTEXT_INPUT)
+        body_features, context_features = body_model(body_input), context_model(context_input)
+        for model, example, name in ((body_model, (body_input,), body_file),
+                                     (context_model, (context_input,), context_file),
+                                     (head, (context_features, body_features), head_file)):
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+            traced.save(os.path.join(model_dir, name))
+            print(f'Saved {name}')
+
+
+def export_onnx(body_model, context_model, head, model_dir=MODEL_DIR, opset=13):
+    """Export the three models to ONNX with a dynamic batch axis"""
+    body_file, context_file, head_file = EXPORTED_FILES['onnx']
+    with torch.no_grad():
+        body_input, context_input = torch.rand(BODY_INPUT), torch.rand(CONTEXT_INPUT)
+        body_features, context_features = body_model(body_input), context_model(context_input)
+        for model, example, name in ((body_model, body_input, body_file),
+                                     (context_model, context_input, context_file)):
+            torch.onnx.export(model, example, os.path.join(model_dir, name), opset_version=opset,
+                              input_names=['input'], output_names=['features'],
+                              dynamic_axes={'input': {0: 'batch'}, 'features': {0: 'batch'}})
+            print(f'Saved {name}')
+        torch.onnx.export(head, (context_features, body_features), os.path.join(model_dir, head_file),
+                          opset_version=opset,
+                          input_names=['context_features', 'body_features'], output_names=['cat', 'cont'],
+                          dynamic_axes={name: {0: 'batch'} for name in
+                                        ('context_features', 'body_features', 'cat', 'cont')})
+        print(f'Saved {head_file}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export Emotic models for the torchscript/onnx backends')
+    parser.add_argument('--format', choices=('torchscript', 'onnx', 'all'), default='all')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    args = parser.parse_args()
+
+    # Export is done on CPU, the graphs are meant for CPU-only servers
+    body_model, context_model, emotic_model = load_eager_models(torch.device('cpu'), args.model_dir)
+    head = FusedEmoticHead(emotic_model)
+
+    if args.format in ('torchscript', 'all'):
+        export_torchscript(body_model, context_model, head, args.model_dir)
+    if args.format in ('onnx', 'all'):
+        export_onnx(body_model, context_model, head, args.model_dir)
+
+
+if __name__ == '__main__':
+    # Pickled Emotic was saved from a notebook and is looked up in __main__
+    from emotion_detection import Emotic
+    main()
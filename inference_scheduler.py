@@ -0,0 +1,177 @@
+import collections
+import threading
+import time
+
+from person_detection import PersonDetector
+
+
+class CameraSlot:
+    """Latest frame submitted by one camera, newer frames overwrite older ones"""
+
+    def __init__(self, camera_id, callback, person_detector):
+        self.camera_id = camera_id
+        self.callback = callback
+        self.person_detector = person_detector
+        self.frame = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self.submitted_at = 0.0
+        self.pending = False
+
+        # Statistics
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+
+
+class InferenceScheduler:
+    """Dynamic batching of frames from many cameras into one EmotionDetector.
+
+    Every camera has a single latest-frame-wins slot. The worker thread
+    builds a batch once `max_batch` cameras have a pending frame or the
+    oldest pending frame has waited `max_latency` seconds, picks cameras
+    round-robin so a busy camera cannot starve the others, runs one
+    batched pass and hands results to the camera's callback:
+
+        callback(camera_id, seq, timestamp, boxes, results)
+
+    Callbacks are called from the scheduler thread.
+    """
+
+    def __init__(self, detector, max_batch=8, max_latency=0.04):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+
+        self._slots = {}
+        self._order = collections.deque()  # Round-robin order of camera ids
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # Statistics
+        self.batches = 0
+        self.batched_frames = 0
+        self.failures = 0
+
+    def register(self, camera_id, callback):
+        """Add a camera, results for it are passed to callback"""
+        detector = self.detector.person_detector
+        person_detector = PersonDetector(detect_width=detector.detect_width,
+                                         full_scan_interval=detector.full_scan_interval)
+        with self._condition:
+            self._slots[camera_id] = CameraSlot(camera_id, callback, person_detector)
+            self._order.append(camera_id)
+
+    def unregister(self, camera_id):
+        """Remove a camera, its pending frame is discarded"""
+        with self._condition:
+            if self._slots.pop(camera_id, None) is not None:
+                self._order.remove(camera_id)
+
+    def submit(self, camera_id, frame, seq=None, timestamp=None):
+        """Put a frame into the camera slot, replacing a frame not yet processed"""
+        with self._condition:
+            slot = self._slots.get(camera_id)
+            if slot is None:
+                raise KeyError(f'Camera {camera_id} is not registered')
+            if slot.pending:
+                slot.dropped += 1
+            slot.frame = frame
+            slot.seq = slot.seq + 1 if seq is None else seq
+            slot.timestamp = time.monotonic() if timestamp is None else timestamp
+            if not slot.pending:
+                slot.submitted_at = time.monotonic()
+            slot.pending = True
+            slot.submitted += 1
+            self._condition.notify()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """Per-camera counters and average batch size"""
+        with self._condition:
+            cameras = {camera_id: {'submitted': slot.submitted, 'dropped': slot.dropped,
+                                   'processed': slot.processed}
+                       for camera_id, slot in self._slots.items()}
+        average = self.batched_frames / self.batches if self.batches else 0.0
+        return {'cameras': cameras, 'batches': self.batches, 'average_batch': average,
+                'failures': self.failures}
+
+    def pending_age(self):
+        """Seconds the oldest pending frame has been waiting, 0 when idle"""
+        with self._condition:
+            pending = [slot.submitted_at for slot in self._slots.values() if slot.pending]
+        return time.monotonic() - min(pending) if pending else 0.0
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _next_batch(self):
+        """Wait for a full batch or the latency deadline, then take frames round-robin"""
+        with self._condition:
+            while True:
+                if not self._running:
+                    return []
+                pending = [slot for slot in self._slots.values() if slot.pending]
+                if not pending:
+                    self._condition.wait()
+                    continue
+                deadline = min(slot.submitted_at for slot in pending) + self.max_latency
+                remaining = deadline - time.monotonic()
+                if len(pending) >= self.max_batch or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = []
+            served = 0
+            for camera_id in self._order:
+                slot = self._slots[camera_id]
+                served += 1
+                if not slot.pending:
+                    continue
+                batch.append((slot, slot.frame, slot.seq, slot.timestamp))
+                slot.frame = None
+                slot.pending = False
+                if len(batch) >= self.max_batch:
+                    break
+            # Next batch starts after the last camera served in this one
+            self._order.rotate(-served)
+            return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                items = [(frame, slot.person_detector.detect(frame)) for slot, frame, _, _ in batch]
+                results = self.detector.detect_emotions_frames(items)
+            except Exception as e:
+                # A bad frame or an out-of-memory error loses this batch, not the scheduler
+                self.failures += 1
+                print(f'Inference batch of {len(batch)} frames failed:', e)
+                continue
+            self.batches += 1
+            self.batched_frames += len(batch)
+
+            for (slot, _, seq, timestamp), (_, boxes), frame_results in zip(batch, items, results):
+                slot.processed += 1
+                try:
+                    slot.callback(slot.camera_id, seq, timestamp, boxes, frame_results)
+                except Exception as e:
+                    print(f'Result callback of camera {slot.camera_id} failed:', e)
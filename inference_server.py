@@ -0,0 +1,297 @@
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_transport import WorkerClient, ATTACH, DETACH, FRAME
+from inference_scheduler import InferenceScheduler
+
+HEARTBEAT_INTERVAL = 1.0
+RECONNECT_INTERVAL = 1.0
+
+
+class EmotionWorker:
+    """One warm EmotionDetector serving every camera attached to its connection.
+
+    Frames from all cameras go through a shared InferenceScheduler, results
+    are drawn on the frame and sent back to the camera server together with
+    the detected Emotic categories. The worker
+    reconnects when the server goes away and keeps the model loaded.
+    """
+
+    def __init__(self, detector, host='localhost', port=8080, use_shm=True, max_batch=8,
+                 max_latency=0.04, stall_timeout=5.0):
+        self.detector = detector
+        self.host = host
+        self.port = port
+        self.use_shm = use_shm
+        self.stall_timeout = stall_timeout
+        self.scheduler = InferenceScheduler(detector, max_batch, max_latency)
+
+        self.client = None
+        self._frames = {}  # camera_id -> {seq: frame} waiting for results
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.scheduler.start()
+        self._thread = threading.Thread(target=self._serve_forever, name='emotion-worker', daemon=True)
+        self._thread.start()
+
+    def healthy(self):
+        """Serving thread and scheduler are running and no frame is stuck"""
+        return (self._thread is not None and self._thread.is_alive() and self.scheduler.is_alive()
+                and self.scheduler.pending_age() < self.stall_timeout)
+
+    def _serve_forever(self):
+        while True:
+            try:
+                self.client = WorkerClient(self.host, self.port, self.use_shm)
+            except OSError:
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            try:
+                self._serve(self.client)
+            except (ConnectionError, OSError) as e:
+                print('Connection to the camera server lost:', e)
+            finally:
+                self._reset()
+
+    def _serve(self, client):
+        while True:
+            message = client.receive()
+            if message.kind == ATTACH:
+                with self._lock:
+                    self._frames[message.camera_id] = {}
+                self.scheduler.register(message.camera_id, self._on_result)
+            elif message.kind == DETACH:
+                self.scheduler.unregister(message.camera_id)
+                with self._lock:
+                    self._frames.pop(message.camera_id, None)
+            elif message.kind == FRAME:
+                # Cameras send RGB; the conversion also copies the frame out of the shared slot
+                frame = cv2.cvtColor(message.frame, cv2.COLOR_RGB2BGR)
+                with self._lock:
+                    frames = self._frames.get(message.camera_id)
+                    if frames is None:
+                        continue
+                    frames[message.seq] = frame
+                self.scheduler.submit(message.camera_id, frame, message.seq, message.timestamp)
+
+    def _reset(self):
+        with self._lock:
+            camera_ids = list(self._frames)
+            self._frames.clear()
+        for camera_id in camera_ids:
+            self.scheduler.unregister(camera_id)
+        client, self.client = self.client, None
+        if client is not None:
+            client.close()
+
+    def _on_result(self, camera_id, seq, timestamp, boxes, results):
+        with self._lock:
+            frames = self._frames.get(camera_id)
+            if frames is None:
+                return
+            frame = frames.pop(seq, None)
+            # Older frames were replaced in the scheduler and will never get results
+            for old_seq in [s for s in frames if s < seq]:
+                del frames[old_seq]
+        if frame is None:
+            return
+
+        # Per-frame category scores (the strongest person wins) for the camera's event log
+        scores = {}
+        for bbox, (emotions, dimensions) in zip(boxes, results):
+            self.detector.draw_results(frame, bbox, emotions, dimensions)
+            for label, score in emotions:
+                scores[label] = max(score, scores.get(label, 0.0))
+
+        client = self.client
+        if client is None:
+            return
+        try:
+            client.send_result(camera_id, seq, frame, timestamp, scores)
+        except OSError as e:
+            print(f'Failed to send result of camera {camera_id}:', e)
+
+
+def warm_up(detector, shape=(480, 640, 3)):
+    """Run one dummy frame so lazy initialization happens before the first camera"""
+    frame = np.zeros(shape, dtype=np.uint8)
+    height, width = shape[:2]
+    detector.detect_emotions_frames([(frame, [(0, 0, width, height)])])
+
+
+def run_worker(host, port, options, heartbeat):
+    """Worker process entry point, reports health through the shared heartbeat value"""
+    # Pickled Emotic was saved from a notebook and is looked up in __main__
+    from emotion_detection import Emotic, EmotionDetector
+    sys.modules['__main__'].Emotic = Emotic
+
+    detector = EmotionDetector(backend=options['backend'])
+    warm_up(detector)
+    worker = EmotionWorker(detector, host, port, options['use_shm'], options['max_batch'],
+                           options['max_latency'], options['stall_timeout'])
+    worker.start()
+
+    parent = multiprocessing.parent_process()
+    while parent is None or parent.is_alive():
+        if worker.healthy():
+            heartbeat.value = time.time()
+        time.sleep(HEARTBEAT_INTERVAL)
+
+
+class WorkerProcess:
+    """A pool slot: the current process, its heartbeat and restart bookkeeping"""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.heartbeat = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.failures = 0  # Consecutive short-lived runs, used for backoff
+        self.next_start = 0.0
+
+
+class WorkerPool:
+    """Keeps `size` warm inference worker processes connected to the camera server.
+
+    Workers load the model once at start and serve any number of cameras.
+    A monitor thread restarts workers that exit, never become ready within
+    `start_timeout` or stop sending heartbeats for `heartbeat_timeout`
+    seconds. Workers that keep crashing are restarted with exponential backoff.
+    """
+
+    def __init__(self, host='localhost', port=8080, size=1, backend='auto', use_shm=True,
+                 max_batch=8, max_latency=0.04, stall_timeout=5.0, start_timeout=180.0,
+                 heartbeat_timeout=10.0, check_interval=1.0):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.options = {'backend': backend, 'use_shm': use_shm, 'max_batch': max_batch,
+                        'max_latency': max_latency, 'stall_timeout': stall_timeout}
+        self.start_timeout = start_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.check_interval = check_interval
+
+        # CUDA does not survive fork, workers always start from a fresh interpreter
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [WorkerProcess(i) for i in range(size)]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        for worker in self._workers:
+            self._spawn(worker)
+        self._thread = threading.Thread(target=self._monitor, name='worker-pool', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for worker in self._workers:
+            self._terminate(worker)
+
+    def stats(self):
+        now = time.time()
+        stats = []
+        for worker in self._workers:
+            process = worker.process
+            beat = worker.heartbeat.value if worker.heartbeat is not None else 0.0
+            stats.append({'index': worker.index,
+                          'pid': process.pid if process is not None else None,
+                          'alive': process is not None and process.is_alive(),
+                          'ready': beat > 0,
+                          'heartbeat_age': now - beat if beat > 0 else None,
+                          'restarts': worker.restarts})
+        return stats
+
+    def _spawn(self, worker):
+        worker.heartbeat = self._context.Value('d', 0.0)
+        worker.process = self._context.Process(
+            target=run_worker, args=(self.host, self.port, self.options, worker.heartbeat),
+            name=f'inference-worker-{worker.index}', daemon=True)
+        worker.process.start()
+        worker.started_at = time.time()
+
+    def _terminate(self, worker):
+        process = worker.process
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+        process.join(timeout=5.0)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        worker.process = None
+
+    def _check(self, worker):
+        """Reason to restart the worker or None when it is healthy"""
+        now = time.time()
+        if not worker.process.is_alive():
+            return f'exited with code {worker.process.exitcode}'
+        beat = worker.heartbeat.value
+        if beat == 0.0:
+            if now - worker.started_at > self.start_timeout:
+                return f'not ready after {self.start_timeout:.0f} s'
+        elif now - beat > self.heartbeat_timeout:
+            return f'no heartbeat for {now - beat:.0f} s'
+        return None
+
+    def _monitor(self):
+        while not self._stop.wait(self.check_interval):
+            for worker in self._workers:
+                if worker.process is None:
+                    if time.time() >= worker.next_start:
+                        self._spawn(worker)
+                    continue
+                reason = self._check(worker)
+                if reason is None:
+                    continue
+
+                print(f'Inference worker {worker.index} {reason}, restarting')
+                uptime = time.time() - worker.started_at
+                self._terminate(worker)
+                worker.restarts += 1
+                worker.failures = worker.failures + 1 if uptime < self.start_timeout else 0
+                worker.next_start = time.time() + min(60.0, 2.0 ** worker.failures - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pool of warm emotion recognition workers for the camera server')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes, each serves many cameras')
+    parser.add_argument('--backend', default='auto',
+                        help='auto (int8 on CPU when quantized models exist), eager, torchscript, onnx or int8')
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-latency', type=float, default=0.04)
+    parser.add_argument('--no-shm', action='store_true', help='Always send frames through the socket')
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.host, args.port, args.workers, args.backend, not args.no_shm,
+                      args.max_batch, args.max_latency)
+    pool.start()
+    try:
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()
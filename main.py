@@ -1,4 +1,13 @@
+import argparse
+import importlib
 import sys
+
+from startup import profile, Preloader, STARTUP_BUDGET
+# Замер импортов включается до импорта PyQt и остальных модулей. Процессы
+# обработчиков и записи (spawn) импортируют main.py как __mp_main__ - там замер не нужен
+if __name__ == '__main__':
+    profile.trace_imports()
+
 from ssl import socket_error
 
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton,
@@ -7,9 +16,28 @@ from PyQt5.QtCore import Qt, QSize
 from PyQt5.QtGui import QFont, QIcon, QPainter, QPixmap
 import os
 
-from audio import Windows
-from camera_view import CameraViewWindow
-from face import EmotionApp
+# Окна аудио, камер и распознавания лиц (torch, transformers, deepface)
+# импортируются при первом открытии или в фоне после показа главного окна
+from frame_transport import FrameTransportServer
+from inference_server import WorkerPool
+
+# Обработчики видео запускаются вместе с приложением и держат модель в памяти
+INFERENCE_HOST = 'localhost'
+INFERENCE_PORT = 8080
+INFERENCE_WORKERS = 1  # Каждый процесс обслуживает несколько камер
+INFERENCE_BACKEND = 'auto'  # 'eager' отключает автоматический выбор INT8-моделей
+# Для обработчиков на другой машине: адрес '0.0.0.0', сжатие 'jpeg' и бюджет байт/с на камеру
+INFERENCE_COMPRESSION = None
+INFERENCE_BANDWIDTH = None
+
+
+def preload_tasks():
+    """Что загружается в фоне после показа окна"""
+    return [
+        ('camera_view', lambda: importlib.import_module('camera_view')),
+        ('audio: модель', lambda: importlib.import_module('audio').load_model()),
+        ('face: модель', lambda: importlib.import_module('face').load_model()),
+    ]
 
 
 
@@ -302,18 +330,35 @@ class MainWindow(QMainWindow):
         
         # Set central widget
         self.setCentralWidget(main_widget)
+
+        # Сервер кадров и прогретые обработчики, камеры подключаются к ним без ожидания
+        self.transport = FrameTransportServer(INFERENCE_HOST, INFERENCE_PORT, compression=INFERENCE_COMPRESSION,
+                                              bandwidth_budget=INFERENCE_BANDWIDTH)
+        self.transport.start()
+        # Локальные обработчики подключаются к этой машине, даже если сервер слушает все адреса
+        worker_host = 'localhost' if INFERENCE_HOST in ('', '0.0.0.0') else INFERENCE_HOST
+        self.worker_pool = WorkerPool(worker_host, INFERENCE_PORT, INFERENCE_WORKERS, INFERENCE_BACKEND)
+        self.worker_pool.start()
+
+    def closeEvent(self, event):
+        self.worker_pool.stop()
+        self.transport.stop()
+        super().closeEvent(event)
         
     def on_view_click(self):
+        from face import EmotionApp
         self.class_emotion = EmotionApp()
         self.class_emotion.show()
         
     def on_cameras_click(self):
-        self.camera_window = CameraViewWindow()
+        from camera_view import CameraViewWindow
+        self.camera_window = CameraViewWindow(self.transport)
         self.camera_window.show()
         
     def on_records_click(self):
-        self.audio_window = Windows()
-        self.audio_window.show()
+        from playback import RecordingsWindow
+        self.records_window = RecordingsWindow()
+        self.records_window.show()
         
     def on_video_settings_click(self):
         print("Настройки видео clicked")
@@ -322,10 +367,65 @@ class MainWindow(QMainWindow):
         print("Настройки аудио clicked")
         
     def on_feature_click(self, title):
+        if title == 'Воспроизведение':
+            from playback import PlaybackWindow
+            self.playback_window = PlaybackWindow()
+            self.playback_window.show()
+            return
+        if title == 'Аудио':
+            # Анализ аудио раньше открывался кнопкой «Записи»
+            from audio import Windows
+            self.audio_window = Windows()
+            self.audio_window.show()
+            return
         print(f"{title} clicked")
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Система видеонаблюдения')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Вывести времена импорта модулей и загрузки моделей')
+    parser.add_argument('--startup-budget', type=float, default=None,
+                        help='Проверить, что окно появляется быстрее заданного числа секунд, и выйти')
+    parser.add_argument('--no-preload', action='store_true',
+                        help='Загружать модели только при открытии окон')
+    parser.add_argument('--inference-host', default=INFERENCE_HOST,
+                        help="Адрес сервера кадров, '0.0.0.0' для обработчиков на других машинах")
+    parser.add_argument('--inference-port', type=int, default=INFERENCE_PORT)
+    parser.add_argument('--inference-workers', type=int, default=INFERENCE_WORKERS,
+                        help='Число локальных процессов-обработчиков')
+    parser.add_argument('--compression', choices=('jpeg', 'png'), default=INFERENCE_COMPRESSION,
+                        help='Сжатие кадров для обработчиков без разделяемой памяти')
+    parser.add_argument('--bandwidth-budget', type=int, default=INFERENCE_BANDWIDTH,
+                        help='Байт/с на камеру, под него подстраивается качество JPEG')
+    # Остальные аргументы достаются Qt
+    return parser.parse_known_args(argv)
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    args, qt_args = parse_args(sys.argv[1:])
+    INFERENCE_HOST, INFERENCE_PORT, INFERENCE_WORKERS = args.inference_host, args.inference_port, args.inference_workers
+    INFERENCE_COMPRESSION, INFERENCE_BANDWIDTH = args.compression, args.bandwidth_budget
+    app = QApplication(sys.argv[:1] + qt_args)
+    with profile.measure('главное окно'):
+        window = MainWindow()
     window.show()
+    app.processEvents()
+    elapsed = profile.mark('окно показано')
+    profile.stop_tracing()
+
+    if args.startup_budget is not None:
+        # Режим проверки: отчёт, код возврата 1 при превышении бюджета
+        elapsed, ok = profile.check_budget('окно показано', args.startup_budget)
+        print(profile.report())
+        print(f'Окно показано через {elapsed:.2f} с, бюджет {args.startup_budget:.2f} с:',
+              'в пределах' if ok else 'превышен')
+        window.close()
+        sys.exit(0 if ok else 1)
+
+    if elapsed > STARTUP_BUDGET:
+        print(f'Запуск занял {elapsed:.2f} с при бюджете {STARTUP_BUDGET:.2f} с')
+    if not args.no_preload:
+        on_done = (lambda: print(profile.report())) if args.profile_startup else None
+        Preloader(profile, preload_tasks(), on_done).start()
+    elif args.profile_startup:
+        print(profile.report())
     sys.exit(app.exec_())
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+
+def box_iou(box, boxes):
+    """IoU between one (x, y, w, h) box and an array of boxes"""
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=np.float32)
+    boxes = np.asarray(boxes, dtype=np.float32)
+    x0 = np.maximum(box[0], boxes[:, 0])
+    y0 = np.maximum(box[1], boxes[:, 1])
+    x1 = np.minimum(box[0] + box[2], boxes[:, 0] + boxes[:, 2])
+    y1 = np.minimum(box[1] + box[3], boxes[:, 1] + boxes[:, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    union = box[2] * box[3] + boxes[:, 2] * boxes[:, 3] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def merge_boxes(boxes, iou_threshold=0.3):
+    """Drop boxes that overlap a larger box already kept"""
+    boxes = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)
+    kept = []
+    for box in boxes:
+        if len(kept) == 0 or box_iou(box, kept).max() < iou_threshold:
+            kept.append(box)
+    return kept
+
+
+class PersonDetector:
+    """Multi-person Haar detector working on a downscaled grayscale frame.
+
+    A full-frame scan is done every `full_scan_interval` frames (or when
+    nobody is tracked); in between only the areas around the previous
+    boxes are searched.
+    """
+
+    def __init__(self, detect_width=640, full_scan_interval=10, search_margin=0.5,
+                 scale_factor=1.1, min_neighbors=4):
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.body_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_fullbody.xml')
+
+        self.detect_width = detect_width
+        self.full_scan_interval = full_scan_interval
+        self.search_margin = search_margin
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+        self.frame_index = 0
+        self.previous_boxes = []  # Boxes in downscaled coordinates
+
+    def reset(self):
+        """Forget tracked boxes and force a full scan on next frame"""
+        self.frame_index = 0
+        self.previous_boxes = []
+
+    def downscale(self, frame):
+        """Convert frame to grayscale and shrink it to detect_width"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, self.detect_width / float(gray.shape[1]))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def scan(self, gray):
+        """Run both cascades on a grayscale image"""
+        boxes = [tuple(b) for b in self.body_cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)]
+
+        # Faces are expanded to approximate body region
+        for x, y, w, h in self.face_cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors):
+            body_h = int(h * 4)  # Approximate body height
+            body_w = int(w * 1.5)  # Approximate body width
+            body_x = max(0, x - int(w * 0.25))
+            body_y = min(gray.shape[0], y + h)  # Start from bottom of face
+            boxes.append((body_x, body_y, body_w, body_h))
+
+        return boxes
+
+    def scan_regions(self, gray):
+        """Search only the neighbourhood of previously found boxes"""
+        height, width = gray.shape[:2]
+        boxes = []
+        for x, y, w, h in self.previous_boxes:
+            mx, my = int(w * self.search_margin), int(h * self.search_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+            if x1 - x0 < 24 or y1 - y0 < 24:
+                continue
+            for bx, by, bw, bh in self.scan(gray[y0:y1, x0:x1]):
+                boxes.append((bx + x0, by + y0, bw, bh))
+        return boxes
+
+    def detect(self, frame):
+        """Detect all people in frame, boxes are in full resolution"""
+        gray, scale = self.downscale(frame)
+
+        full_scan = not self.previous_boxes or self.frame_index % self.full_scan_interval == 0
+        boxes = self.scan(gray) if full_scan else self.scan_regions(gray)
+        self.previous_boxes = merge_boxes(boxes)
+        self.frame_index += 1
+
+        # Map boxes back to full resolution
+        return [tuple(int(round(v / scale)) for v in box) for box in self.previous_boxes]
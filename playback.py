@@ -0,0 +1,531 @@
+import collections
+import csv
+import glob
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import (QComboBox, QDoubleSpinBox, QHBoxLayout, QLabel, QListWidget, QListWidgetItem,
+                             QMainWindow, QPushButton, QSlider, QVBoxLayout, QWidget)
+
+from recorder import EVENTS_FILE, EXTENSIONS, RECORDINGS_DIR, SEGMENT_INFO
+
+
+def read_index(path, frames):
+    """Время первых frames кадров из индекса сегмента; повреждённые строки пропускаются"""
+    times = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            try:
+                times.append(float(row[1]))
+            except (IndexError, ValueError):
+                continue  # Заголовок или недописанная строка
+    return np.array(times[:frames], dtype=np.float64)
+
+
+class Segment:
+    """Закрытый сегмент записи по его описанию: время каждого кадра и опорные кадры"""
+
+    def __init__(self, info_path):
+        with open(info_path) as f:
+            info = json.load(f)
+        base = info_path[:-len(SEGMENT_INFO)]
+        self.video_path = os.path.join(os.path.dirname(info_path), info['video'])
+        self.times = read_index(base + '.csv', int(info['frames']))
+        # None - интервал неизвестен, переход всегда через позиционирование декодера
+        self.keyframe_interval = info.get('keyframe_interval')
+
+    def frame_at(self, timestamp):
+        """Последний кадр не позже timestamp"""
+        return max(0, int(np.searchsorted(self.times, timestamp, 'right')) - 1)
+
+    def keyframe_before(self, frame):
+        if not self.keyframe_interval:
+            return frame
+        return frame - frame % self.keyframe_interval
+
+
+class EventIndex:
+    """События камеры (метка, оценка) по времени для быстрого перехода.
+
+    Для каждой метки хранится отсортированный массив времени, следующее
+    событие находится двоичным поиском, порог проверяется только на хвосте.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.labels = {}
+        self._mtime = None
+        self.reload()
+
+    def reload(self):
+        """Перечитать файл, если он изменился (запись ещё идёт)"""
+        if not os.path.exists(self.path):
+            return
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        events = collections.defaultdict(list)
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    events[row['label']].append((float(row['time']), float(row['score'])))
+                except (KeyError, TypeError, ValueError):
+                    continue  # Недописанная последняя строка
+        self.labels = {}
+        for label, items in events.items():
+            items = np.array(sorted(items), dtype=np.float64)
+            self.labels[label] = (items[:, 0], items[:, 1])
+
+    def next_event(self, after, label, threshold=0.0):
+        """(время, оценка) первого события label с оценкой >= threshold позже after или None"""
+        times, scores = self.labels.get(label, ((), ()))
+        start = int(np.searchsorted(times, after, 'right'))
+        hits = np.flatnonzero(np.asarray(scores[start:]) >= threshold)
+        if not len(hits):
+            return None
+        i = start + int(hits[0])
+        return float(times[i]), float(scores[i])
+
+    def previous_event(self, before, label, threshold=0.0):
+        """(время, оценка) последнего такого события раньше before или None"""
+        times, scores = self.labels.get(label, ((), ()))
+        end = int(np.searchsorted(times, before, 'left'))
+        hits = np.flatnonzero(np.asarray(scores[:end]) >= threshold)
+        if not len(hits):
+            return None
+        i = int(hits[-1])
+        return float(times[i]), float(scores[i])
+
+
+class Recording:
+    """Все сегменты камеры по времени и её события"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = []
+        # Сегмент без описания ещё пишется (или запись прервалась) и не читается
+        for info_path in sorted(glob.glob(os.path.join(directory, '*' + SEGMENT_INFO))):
+            try:
+                segment = Segment(info_path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f'Сегмент {info_path} пропущен:', e)
+                continue
+            if len(segment.times) and os.path.exists(segment.video_path):
+                self.segments.append(segment)
+        self.starts = np.array([segment.times[0] for segment in self.segments], dtype=np.float64)
+        self.events = EventIndex(os.path.join(directory, EVENTS_FILE))
+
+    @property
+    def start(self):
+        return float(self.starts[0]) if self.segments else 0.0
+
+    @property
+    def end(self):
+        return float(self.segments[-1].times[-1]) if self.segments else 0.0
+
+    def locate(self, timestamp):
+        """(номер сегмента, номер кадра) для момента timestamp"""
+        i = max(0, int(np.searchsorted(self.starts, timestamp, 'right')) - 1)
+        return i, self.segments[i].frame_at(timestamp)
+
+    def time_of(self, segment, frame):
+        return float(self.segments[segment].times[frame])
+
+    def next_time(self, segment, frame):
+        """Время кадра после (segment, frame) или None, если он последний"""
+        if frame + 1 < len(self.segments[segment].times):
+            return self.time_of(segment, frame + 1)
+        if segment + 1 < len(self.segments):
+            return self.time_of(segment + 1, 0)
+        return None
+
+
+class FrameCache:
+    """Небольшой LRU-кэш декодированных кадров по (сегмент, кадр)"""
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._frames = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._frames
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if key in self._frames:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.capacity:
+                self._frames.popitem(last=False)
+
+
+class Player:
+    """Декодирование записи в фоновом потоке с упреждением.
+
+    request() задаёт нужный кадр; поток декодирует его и prefetch
+    следующих кадров в FrameCache. Для перехода он ставит позицию на
+    ближайший предшествующий опорный кадр и пропускает кадры grab() без
+    преобразования, а вперёд в пределах GOP просто продолжает чтение.
+    Новый запрос прерывает упреждение старого после текущего кадра.
+    Нечитаемые кадры не кэшируются, а запоминаются в failed, чтобы не
+    декодировать их снова.
+    """
+
+    def __init__(self, recording, cache_size=64, prefetch=16):
+        self.recording = recording
+        self.prefetch = prefetch
+        self.cache = FrameCache(cache_size)
+
+        self._target = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._capture = None
+        self._capture_segment = None
+        self._position = None  # Номер кадра, который вернёт следующий read(), None - неизвестен
+        self.failed = set()  # (сегмент, кадр), которые не удалось декодировать
+
+        # Статистика
+        self.decoded = 0
+        self.skipped = 0
+        self.seeks = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='playback-decoder', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def request(self, segment, frame):
+        with self._condition:
+            self._target = (segment, frame)
+            self._condition.notify()
+
+    def get(self, segment, frame):
+        """Кадр из кэша или None; в любом случае поток декодирует его и следующие"""
+        self.request(segment, frame)
+        key = (segment, frame)
+        if key in self.cache:
+            self.hits += 1
+            return self.cache.get(key)
+        self.misses += 1
+        return None
+
+    def is_failed(self, segment, frame):
+        return (segment, frame) in self.failed
+
+    def _next_missing(self, target):
+        segment, frame = target
+        end = min(len(self.recording.segments[segment].times), frame + self.prefetch + 1)
+        for i in range(frame, end):
+            if (segment, i) not in self.cache and (segment, i) not in self.failed:
+                return i
+        return None
+
+    def _open(self, segment):
+        if self._capture is not None:
+            self._capture.release()
+        self._capture = cv2.VideoCapture(self.recording.segments[segment].video_path)
+        self._capture_segment = segment
+        self._position = 0
+
+    def _decode(self, segment, frame):
+        if self._capture_segment != segment:
+            self._open(segment)
+        if self._position != frame:
+            keyframe = self.recording.segments[segment].keyframe_before(frame)
+            # Вперёд в пределах GOP дешевле читать дальше, чем переходить
+            if self._position is None or not keyframe <= self._position < frame:
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+                self._position = keyframe
+                self.seeks += 1
+            while self._position < frame:
+                self._capture.grab()
+                self._position += 1
+                self.skipped += 1
+        ok, image = self._capture.read()
+        if not ok:
+            # Позиция декодера после ошибки неизвестна, следующий кадр - через переход
+            self._position = None
+            self.failed.add((segment, frame))
+            return
+        self._position = frame + 1
+        self.decoded += 1
+        self.cache.put((segment, frame), image)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (self._target is None or self._next_missing(self._target) is None):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                segment = self._target[0]
+                frame = self._next_missing(self._target)
+            try:
+                self._decode(segment, frame)
+            except Exception as e:
+                print('Ошибка декодирования записи:', e)
+                self._position = None
+                self.failed.add((segment, frame))
+
+    def stats(self):
+        return {'decoded': self.decoded, 'skipped': self.skipped, 'seeks': self.seeks,
+                'hits': self.hits, 'misses': self.misses, 'failed': len(self.failed)}
+
+
+def recording_summary(directory):
+    """(сегментов, байт, время последнего сегмента) записей камеры без чтения индексов"""
+    videos = [path for ext in set(EXTENSIONS.values()) for path in glob.glob(os.path.join(directory, '*' + ext))]
+    if not videos:
+        return 0, 0, None
+    return len(videos), sum(os.path.getsize(path) for path in videos), max(map(os.path.getmtime, videos))
+
+
+class RecordingsWindow(QMainWindow):
+    """Список записей камер; двойной щелчок открывает воспроизведение"""
+
+    def __init__(self, directory=RECORDINGS_DIR):
+        super().__init__()
+        self.setWindowTitle('Записи')
+        self.setGeometry(100, 100, 600, 400)
+        self.setStyleSheet("background-color: #333333; color: white;")
+        self.directory = directory
+        self.playback_window = None
+
+        central = QWidget()
+        layout = QVBoxLayout(central)
+        self.list = QListWidget()
+        self.list.setStyleSheet("background-color: #424242;")
+        self.list.itemDoubleClicked.connect(self.open_playback)
+        layout.addWidget(self.list, 1)
+
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton('Обновить')
+        refresh_btn.clicked.connect(self.refresh)
+        play_btn = QPushButton('Воспроизвести')
+        play_btn.clicked.connect(lambda: self.open_playback(self.list.currentItem()))
+        buttons.addWidget(refresh_btn)
+        buttons.addStretch()
+        buttons.addWidget(play_btn)
+        layout.addLayout(buttons)
+        self.setCentralWidget(central)
+        self.refresh()
+
+    def refresh(self):
+        self.list.clear()
+        for path in sorted(glob.glob(os.path.join(self.directory, 'camera_*'))):
+            count, size, modified = recording_summary(path)
+            text = f'{os.path.basename(path)}: сегментов {count}, {size / 2 ** 20:.1f} МБ'
+            if modified is not None:
+                text += ', последний ' + time.strftime('%d.%m.%Y %H:%M:%S', time.localtime(modified))
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, path)
+            self.list.addItem(item)
+        if not self.list.count():
+            self.list.addItem('Записей нет: запись включается кнопкой ● на окне камеры')
+
+    def open_playback(self, item):
+        path = item.data(Qt.UserRole) if item is not None else None
+        if path:
+            self.playback_window = PlaybackWindow(self.directory, camera=path)
+            self.playback_window.show()
+
+
+class PlaybackWindow(QMainWindow):
+    """Воспроизведение записей камер с переходом к событиям"""
+
+    def __init__(self, directory=RECORDINGS_DIR, camera=None):
+        super().__init__()
+        self.setWindowTitle('Воспроизведение')
+        self.setGeometry(100, 100, 900, 600)
+        self.setStyleSheet("background-color: #333333; color: white;")
+        self.directory = directory
+        self.recording = None
+        self.player = None
+        self.position = 0.0
+        self.playing = False
+        self.shown = None  # (сегмент, кадр) на экране
+        self.last_tick = time.monotonic()
+
+        central = QWidget()
+        layout = QVBoxLayout(central)
+
+        top = QHBoxLayout()
+        self.camera_selector = QComboBox()
+        for path in sorted(glob.glob(os.path.join(directory, 'camera_*'))):
+            self.camera_selector.addItem(os.path.basename(path), path)
+        if camera is not None:
+            self.camera_selector.setCurrentIndex(max(0, self.camera_selector.findData(camera)))
+        self.camera_selector.currentIndexChanged.connect(self.open_camera)
+        top.addWidget(QLabel('Камера:'))
+        top.addWidget(self.camera_selector)
+        top.addStretch()
+        layout.addLayout(top)
+
+        self.video_label = QLabel()
+        self.video_label.setMinimumSize(640, 400)
+        self.video_label.setAlignment(Qt.AlignCenter)
+        self.video_label.setStyleSheet("background-color: #424242;")
+        layout.addWidget(self.video_label, 1)
+
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setRange(0, 1000)
+        self.slider.sliderMoved.connect(self.on_slider)
+        layout.addWidget(self.slider)
+
+        controls = QHBoxLayout()
+        self.play_btn = QPushButton('▶')
+        self.play_btn.clicked.connect(self.toggle_play)
+        controls.addWidget(self.play_btn)
+
+        # Переход к событию: метка и порог оценки
+        self.label_selector = QComboBox()
+        self.label_selector.setEditable(True)
+        self.threshold = QDoubleSpinBox()
+        self.threshold.setRange(0.0, 1.0)
+        self.threshold.setSingleStep(0.05)
+        self.threshold.setValue(0.7)
+        previous_btn = QPushButton('◀ Событие')
+        previous_btn.clicked.connect(lambda: self.jump_to_event(forward=False))
+        next_btn = QPushButton('Событие ▶')
+        next_btn.clicked.connect(lambda: self.jump_to_event(forward=True))
+        controls.addWidget(QLabel('Событие:'))
+        controls.addWidget(self.label_selector)
+        controls.addWidget(QLabel('Порог:'))
+        controls.addWidget(self.threshold)
+        controls.addWidget(previous_btn)
+        controls.addWidget(next_btn)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        self.status = QLabel()
+        layout.addWidget(self.status)
+        self.setCentralWidget(central)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.update_frame)
+        self.timer.start(30)
+        self.open_camera()
+
+    def open_camera(self):
+        if self.player is not None:
+            self.player.stop()
+            self.player = None
+        path = self.camera_selector.currentData()
+        self.recording = Recording(path) if path else None
+        if self.recording is None or not self.recording.segments:
+            self.status.setText('Записей нет')
+            return
+        self.player = Player(self.recording)
+        self.player.start()
+        self.shown = None
+        self.position = self.recording.start
+        current = self.label_selector.currentText()
+        self.label_selector.clear()
+        self.label_selector.addItems(sorted(self.recording.events.labels))
+        if current:
+            self.label_selector.setEditText(current)
+        self.status.setText(f'Сегментов: {len(self.recording.segments)}')
+
+    def toggle_play(self):
+        self.playing = not self.playing
+        self.play_btn.setText('❚❚' if self.playing else '▶')
+
+    def on_slider(self, value):
+        if self.player is not None:
+            recording = self.recording
+            self.position = recording.start + (recording.end - recording.start) * value / 1000
+
+    def jump_to_event(self, forward=True):
+        if self.player is None:
+            return
+        events = self.recording.events
+        events.reload()
+        label, threshold = self.label_selector.currentText(), self.threshold.value()
+        if forward:
+            event = events.next_event(self.position, label, threshold)
+        else:
+            event = events.previous_event(self.position, label, threshold)
+        if event is None:
+            self.status.setText(f'Событий {label} с оценкой от {threshold:.2f} больше нет')
+            return
+        self.position = event[0]
+        moment = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime(event[0]))
+        self.status.setText(f'{label} {event[1]:.2f} в {moment}')
+
+    def update_frame(self):
+        now = time.monotonic()
+        elapsed, self.last_tick = now - self.last_tick, now
+        if self.player is None:
+            return
+        recording = self.recording
+        if self.playing:
+            self.position += elapsed
+            if self.position >= recording.end:
+                self.position = recording.end
+                self.toggle_play()
+        if not self.slider.isSliderDown() and recording.end > recording.start:
+            self.slider.setValue(int(1000 * (self.position - recording.start) / (recording.end - recording.start)))
+
+        key = recording.locate(self.position)
+        if key == self.shown:
+            return
+        frame = self.player.get(*key)
+        if frame is None:
+            if self.player.is_failed(*key):
+                self.skip_broken(key)
+            return  # Кадр ещё декодируется, остаётся предыдущий
+        self.shown = key
+        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        height, width, channel = rgb_image.shape
+        q_image = QImage(rgb_image.data, width, height, channel * width, QImage.Format_RGB888)
+        self.video_label.setPixmap(QPixmap.fromImage(q_image).scaled(
+            self.video_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def skip_broken(self, key):
+        # Нечитаемый кадр: переход к следующему, на экране остаётся предыдущий
+        segment, frame = key
+        next_time = self.recording.next_time(segment, frame)
+        if next_time is None:
+            self.status.setText('Последние кадры записи не читаются')
+            if self.playing:
+                self.toggle_play()
+            return
+        self.status.setText(f'Кадр {frame} сегмента {segment + 1} не читается, пропущен')
+        self.position = max(self.position, next_time)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        if self.player is not None:
+            self.player.stop()
+        super().closeEvent(event)
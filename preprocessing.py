@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import torch
+
+# Normalization of the preprocessed Emotic arrays (notebooks/Colab_train_emotic.ipynb)
+CONTEXT_MEAN = [0.4690646, 0.4407227, 0.40508908]
+CONTEXT_STD = [0.2514227, 0.24312855, 0.24266963]
+BODY_MEAN = [0.43832874, 0.3964344, 0.3706214]
+BODY_STD = [0.24784276, 0.23621225, 0.2323653]
+
+# Input sizes the backbones were trained at
+CONTEXT_SIZE = 224  # Places365 ResNet-18
+BODY_SIZE = 128
+
+
+def crop_box(frame, bbox):
+    """Cut (x, y, w, h) box out of frame without copying, clipped to frame borders"""
+    x, y, w, h = [int(v) for v in bbox]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame.shape[1], x + w), min(frame.shape[0], y + h)
+    if x1 <= x0 or y1 <= y0:
+        # Box is outside of the frame, fall back to the whole frame
+        return frame
+    return frame[y0:y1, x0:x1]
+
+
+def normalize_lut(mean, std):
+    """Table mapping a uint8 value to its normalized float, one row per RGB channel"""
+    values = np.arange(256, dtype=np.float32) / 255.0
+    return np.stack([(values - m) / s for m, s in zip(mean, std)]).astype(np.float32)
+
+
+class InputBuffer:
+    """Reusable NCHW float32 batch filled in place from BGR uint8 images"""
+
+    def __init__(self, size, mean, std, capacity=1):
+        self.size = size
+        self.lut = normalize_lut(mean, std)
+        self.resized = np.empty((size, size, 3), dtype=np.uint8)
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """(Re)allocate the batch tensor, numpy view shares its memory"""
+        self.tensor = torch.empty((capacity, 3, self.size, self.size), dtype=torch.float32)
+        self.array = self.tensor.numpy()
+
+    def write(self, index, image):
+        """Resize image and write it normalized into batch slot `index`"""
+        shrink = image.shape[0] > self.size or image.shape[1] > self.size
+        cv2.resize(image, (self.size, self.size), dst=self.resized,
+                   interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+
+        # BGR -> RGB, HWC -> CHW and uint8 -> normalized float in one lookup per channel
+        for c in range(3):
+            np.take(self.lut[c], self.resized[:, :, 2 - c], out=self.array[index, c], mode='clip')
+
+    def fill(self, images):
+        """Write images into the buffer and return the filled part of the batch"""
+        if len(images) > self.tensor.shape[0]:
+            self.allocate(len(images))
+        for i, image in enumerate(images):
+            self.write(i, image)
+        return self.tensor[:len(images)]
+
+
+class FramePreprocessor:
+    """Preprocessing of frames and person boxes for the Emotic backbones.
+
+    Returned tensors are views into reusable buffers and are only valid
+    until the next call of the same method.
+    """
+
+    def __init__(self, max_people=8):
+        self.context = InputBuffer(CONTEXT_SIZE, CONTEXT_MEAN, CONTEXT_STD, capacity=1)
+        self.body = InputBuffer(BODY_SIZE, BODY_MEAN, BODY_STD, capacity=max_people)
+
+    def context_batch(self, frames):
+        """Context tensor (N, 3, 224, 224) for whole frames"""
+        return self.context.fill(frames)
+
+    def body_batch(self, frame, boxes):
+        """Body tensor (N, 3, 128, 128) for person boxes of one frame"""
+        return self.body.fill([crop_box(frame, bbox) for bbox in boxes])
+
+    def body_batch_frames(self, items):
+        """Body tensor for person boxes of several (frame, boxes) pairs, in order"""
+        return self.body.fill([crop_box(frame, bbox) for frame, boxes in items for bbox in boxes])
@@ -0,0 +1,152 @@
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+import torch
+from sklearn.metrics import average_precision_score
+
+from inference_backend import (MODEL_DIR, INT8_FILES, BODY_INPUT, CONTEXT_INPUT,
+                               FusedEmoticHead, load_eager_models)
+from preprocessing import CONTEXT_MEAN, CONTEXT_STD, BODY_MEAN, BODY_STD
+
+CATEGORIES = ['Affection', 'Anger', 'Annoyance', 'Anticipation', 'Aversion', 'Confidence', 'Disapproval',
+              'Disconnection', 'Disquietment', 'Doubt/Confusion', 'Embarrassment', 'Engagement', 'Esteem',
+              'Excitement', 'Fatigue', 'Fear', 'Happiness', 'Pain', 'Peace', 'Pleasure', 'Sadness',
+              'Sensitivity', 'Suffering', 'Surprise', 'Sympathy', 'Yearning']
+
+
+def load_split(data_dir, split, num_samples, seed=0):
+    """Load a random sample of preprocessed Emotic arrays (context, body, cat labels)"""
+    context = np.load(os.path.join(data_dir, f'{split}_context_arr.npy'), mmap_mode='r')
+    body = np.load(os.path.join(data_dir, f'{split}_body_arr.npy'), mmap_mode='r')
+    cat_file = os.path.join(data_dir, f'{split}_cat_arr.npy')
+    cat = np.load(cat_file, mmap_mode='r') if os.path.exists(cat_file) else None
+
+    indices = np.arange(len(context))
+    if num_samples and num_samples < len(indices):
+        indices = np.sort(np.random.RandomState(seed).choice(indices, num_samples, replace=False))
+    return context[indices], body[indices], (cat[indices] if cat is not None else None)
+
+
+def to_tensor(images, mean, std):
+    """RGB uint8 NHWC arrays to normalized NCHW tensor, as Emotic_PreDataset does"""
+    tensor = torch.from_numpy(np.ascontiguousarray(images)).permute(0, 3, 1, 2).float().div_(255.0)
+    mean = torch.tensor(mean).view(1, 3, 1, 1)
+    std = torch.tensor(std).view(1, 3, 1, 1)
+    return (tensor - mean) / std
+
+
+def batches(array, batch_size):
+    for i in range(0, len(array), batch_size):
+        yield array[i:i + batch_size]
+
+
+def quantize_backbone(model, calibration_images, mean, std, input_shape, batch_size):
+    """Static post-training INT8 quantization of a ResNet backbone"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(copy.deepcopy(model).eval(), qconfig_mapping, (torch.rand(input_shape),))
+    with torch.no_grad():
+        for images in batches(calibration_images, batch_size):
+            prepared(to_tensor(images, mean, std))
+    return convert_fx(prepared)
+
+
+def predict(body_model, context_model, head, context_images, body_images, batch_size):
+    """Categorical predictions for a whole split"""
+    preds = []
+    with torch.no_grad():
+        for context, body in zip(batches(context_images, batch_size), batches(body_images, batch_size)):
+            cat_out, _ = head(context_model(to_tensor(context, CONTEXT_MEAN, CONTEXT_STD)),
+                              body_model(to_tensor(body, BODY_MEAN, BODY_STD)))
+            preds.append(cat_out.numpy())
+    return np.concatenate(preds)
+
+
+def average_precision(preds, labels):
+    """Average precision per category"""
+    ap = np.zeros(len(CATEGORIES), dtype=np.float32)
+    for i in range(len(CATEGORIES)):
+        ap[i] = average_precision_score(labels[:, i], preds[:, i])
+    return ap
+
+
+def latency_ms(model, input_shape, iterations):
+    """Median latency of a batch-1 forward pass"""
+    example = torch.rand(input_shape)
+    times = []
+    with torch.no_grad():
+        for _ in range(5):
+            model(example)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(example)
+            times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Static INT8 quantization of the Emotic ResNet backbones')
+    parser.add_argument('--data-dir', required=True, help='folder with preprocessed *_context_arr.npy / *_body_arr.npy')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--calib-split', default='train')
+    parser.add_argument('--calib-samples', type=int, default=512)
+    parser.add_argument('--eval-split', default='test')
+    parser.add_argument('--eval-samples', type=int, default=0, help='0 evaluates the whole split')
+    parser.add_argument('--batch-size', type=int, default=26)
+    parser.add_argument('--iterations', type=int, default=50, help='timed iterations for latency')
+    parser.add_argument('--threads', type=int, default=0, help='torch threads, 0 keeps the default')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    device = torch.device('cpu')
+    body_model, context_model, emotic_model = load_eager_models(device, args.model_dir)
+    head = FusedEmoticHead(emotic_model)
+
+    # Calibration
+    print(f'Calibrating on {args.calib_samples} samples of {args.calib_split}...')
+    calib_context, calib_body, _ = load_split(args.data_dir, args.calib_split, args.calib_samples)
+    body_int8 = quantize_backbone(body_model, calib_body, BODY_MEAN, BODY_STD, BODY_INPUT, args.batch_size)
+    context_int8 = quantize_backbone(context_model, calib_context, CONTEXT_MEAN, CONTEXT_STD,
+                                     CONTEXT_INPUT, args.batch_size)
+
+    # Save as TorchScript so the detector does not need the FX graph code
+    body_file, context_file = INT8_FILES
+    with torch.no_grad():
+        torch.jit.save(torch.jit.trace(body_int8, torch.rand(BODY_INPUT)), os.path.join(args.model_dir, body_file))
+        torch.jit.save(torch.jit.trace(context_int8, torch.rand(CONTEXT_INPUT)),
+                       os.path.join(args.model_dir, context_file))
+    print(f'Saved {body_file}, {context_file}')
+
+    # Accuracy
+    eval_context, eval_body, eval_cat = load_split(args.data_dir, args.eval_split, args.eval_samples)
+    if eval_cat is None:
+        print(f'No {args.eval_split}_cat_arr.npy, skipping mAP')
+    else:
+        ap_float = average_precision(predict(body_model, context_model, head, eval_context, eval_body,
+                                             args.batch_size), eval_cat)
+        ap_int8 = average_precision(predict(body_int8, context_int8, head, eval_context, eval_body,
+                                            args.batch_size), eval_cat)
+        print(f'\n{"Category":<18}{"fp32 AP":>10}{"int8 AP":>10}{"diff":>10}')
+        for name, a, b in zip(CATEGORIES, ap_float, ap_int8):
+            print(f'{name:<18}{a:>10.4f}{b:>10.4f}{b - a:>+10.4f}')
+        print(f'{"mAP":<18}{ap_float.mean():>10.4f}{ap_int8.mean():>10.4f}{ap_int8.mean() - ap_float.mean():>+10.4f}')
+
+    # Latency
+    print(f'\n{"Backbone":<18}{"fp32 ms":>10}{"int8 ms":>10}{"speedup":>10}')
+    for name, fp32, int8, shape in (('body', body_model, body_int8, BODY_INPUT),
+                                    ('context', context_model, context_int8, CONTEXT_INPUT)):
+        t_fp32, t_int8 = latency_ms(fp32, shape, args.iterations), latency_ms(int8, shape, args.iterations)
+        print(f'{name:<18}{t_fp32:>10.2f}{t_int8:>10.2f}{t_fp32 / t_int8:>9.2f}x')
+
+
+if __name__ == '__main__':
+    # Pickled Emotic was saved from a notebook and is looked up in __main__
+    from emotion_detection import Emotic
+    main()
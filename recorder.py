@@ -0,0 +1,307 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from capture import open_capture
+from event_bus import bus
+from shm_transport import SharedFrameRing
+
+RECORDINGS_DIR = 'recordings'
+SEGMENT_SECONDS = 60.0
+FOURCC = 'mp4v'
+# Контейнер для кодека
+EXTENSIONS = {'mp4v': '.mp4', 'MJPG': '.avi'}
+# Интервал опорных кадров cv2.VideoWriter с бэкендом FFMPEG: для mp4v OpenCV
+# задаёт GOP 12, в MJPG каждый кадр опорный. У других бэкендов он неизвестен
+KEYFRAME_INTERVALS = {'mp4v': 12, 'MJPG': 1}
+# Описание закрытого сегмента рядом с видео; пока его нет, сегмент пишется
+SEGMENT_INFO = '.json'
+# Индекс событий камеры: время (time.time), метка, оценка
+EVENTS_FILE = 'events.csv'
+DROP_POLICIES = ('newest', 'decimate')
+# Оценки из шины становятся событиями только при появлении метки (её не было
+# EVENT_GAP секунд) и при росте оценки не меньше чем на EVENT_STEP в том же эпизоде
+EVENT_GAP = 2.0
+EVENT_STEP = 0.1
+# Перезапуски упавшего кодировщика за одну запись, после них запись останавливается
+ENCODER_RESTARTS = 3
+
+
+def segment_paths(directory, started, fourcc=FOURCC):
+    """Видео, индекс и описание сегмента, имя - время начала"""
+    name = time.strftime('%Y%m%d_%H%M%S', time.localtime(started)) + f'_{int(started * 1000) % 1000:03d}'
+    base = os.path.join(directory, name)
+    return base + EXTENSIONS.get(fourcc, '.avi'), base + '.csv', base + SEGMENT_INFO
+
+
+def open_writer(video_path, fourcc, fps, size):
+    """(cv2.VideoWriter, интервал опорных кадров или None, если он неизвестен)"""
+    code = cv2.VideoWriter_fourcc(*fourcc)
+    # Интервал опорных кадров известен только для FFMPEG, он пробуется первым
+    writer = cv2.VideoWriter(video_path, cv2.CAP_FFMPEG, code, fps, size)
+    if not writer.isOpened():
+        writer = cv2.VideoWriter(video_path, code, fps, size)
+    if not writer.isOpened():
+        raise IOError(f'Не удалось открыть {video_path} для записи кодеком {fourcc}')
+    if writer.getBackendName() == 'FFMPEG':
+        return writer, KEYFRAME_INTERVALS.get(fourcc)
+    return writer, None
+
+
+def close_segment(writer, index, info_path, info):
+    """Закрыть сегмент; описание появляется последним и целиком"""
+    writer.release()
+    index.close()
+    with open(info_path + '.tmp', 'w') as f:
+        json.dump(info, f)
+    os.replace(info_path + '.tmp', info_path)
+
+
+def encode_segments(ring_name, slot_count, slot_bytes, jobs, free, directory, fps, segment_seconds,
+                    fourcc, written, segments):
+    """Процесс кодирования: кадры из слотов разделяемой памяти в сегменты cv2.VideoWriter.
+
+    Рядом с каждым сегментом построчно пишется индекс <сегмент>.csv: номер
+    кадра в сегменте и время захвата (time.time). После закрытия сегмента
+    появляется <сегмент>.json с числом кадров и интервалом опорных кадров.
+    Слот возвращается в free сразу после записи кадра.
+    """
+    ring = SharedFrameRing(ring_name, slot_count, slot_bytes, create=False)
+    writer = index = info = info_path = None
+    started = shape = None
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            slot, frame_shape, timestamp = job
+            frame = ring.slot(slot, frame_shape)
+            if writer is None or timestamp - started >= segment_seconds or frame_shape != shape:
+                if writer is not None:
+                    close_segment(writer, index, info_path, info)
+                    writer = None
+                started, shape = timestamp, frame_shape
+                video_path, index_path, info_path = segment_paths(directory, timestamp, fourcc)
+                writer, keyframe_interval = open_writer(video_path, fourcc, fps, (frame_shape[1], frame_shape[0]))
+                info = {'video': os.path.basename(video_path), 'frames': 0, 'fourcc': fourcc, 'fps': fps,
+                        'keyframe_interval': keyframe_interval}
+                # Построчная запись: индекс на диске не отстаёт от записанных кадров
+                index = open(index_path, 'w', buffering=1)
+                index.write('frame,time\n')
+                segments.value += 1
+            writer.write(frame)
+            free.put(slot)
+            index.write(f'{info["frames"]},{timestamp:.6f}\n')
+            info['frames'] += 1
+            written.value += 1
+    finally:
+        if writer is not None:
+            close_segment(writer, index, info_path, info)
+        ring.close()
+
+
+class CameraRecorder:
+    """Запись одной камеры в фоне, не отнимая кадров у просмотра.
+
+    Свой поток берёт по порядку все кадры из общего буфера захвата (next)
+    и копирует их в свободный слот разделяемой памяти; кодирует отдельный
+    процесс. Очередь ограничена числом слотов queue_size. Если кодировщик
+    не успевает, действует drop_policy:
+      'newest'   - новый кадр пропускается, пока не освободится слот;
+      'decimate' - когда занято больше половины слотов, пишется каждый
+                   второй кадр, при полной очереди кадр пропускается.
+    Время каждого записанного кадра есть в индексе сегмента, поэтому
+    пропуски видны при воспроизведении. Упавший кодировщик перезапускается
+    до ENCODER_RESTARTS раз, затем запись останавливается и причина
+    остаётся в error. События (эмоции, тревоги) для
+    поиска при воспроизведении добавляются через log_event(); оценки
+    моделей из каналов шины 'camera/<камера>/...' записываются сами, но
+    только начало эпизода метки и новые максимумы, а не каждый кадр.
+    """
+
+    def __init__(self, camera_id, api=None, directory=RECORDINGS_DIR, fps=None,
+                 segment_seconds=SEGMENT_SECONDS, fourcc=FOURCC, queue_size=8, drop_policy='decimate'):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f'Неизвестная политика пропуска кадров {drop_policy}')
+        self.camera_id = camera_id
+        self.api = api
+        self.directory = os.path.join(directory, f'camera_{camera_id}')
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.fourcc = fourcc
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+
+        self._context = multiprocessing.get_context('spawn')
+        self._capture = None
+        self._ring = None
+        self._jobs = None
+        self._free = None
+        self._process = None
+        self._free_slots = []
+        self._thread = None
+        self._running = False
+        self._events = None
+        self._events_lock = threading.Lock()
+        self._subscription = None
+        self._episodes = {}  # метка -> (время последней оценки, записанная оценка)
+        self._written = self._context.Value('q', 0)
+        self._segments = self._context.Value('q', 0)
+
+        # Статистика
+        self.submitted = 0
+        self.dropped = 0
+        self.missed = 0  # Кадры, вытесненные из буфера захвата до того, как их взял поток записи
+        self.restarts = 0
+        self.error = None
+
+    @property
+    def recording(self):
+        return self._running
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, EVENTS_FILE)
+        is_new = not os.path.exists(path)
+        self._events = open(path, 'a', buffering=1)
+        if is_new:
+            self._events.write('time,label,score\n')
+        self._capture = open_capture(self.camera_id, self.api)
+        self._subscription = bus.subscribe(f'camera/{self.camera_id}/')
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f'recorder-{self.camera_id}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._process is not None:
+            # Кодировщик дописывает очередь и закрывает сегмент
+            self._jobs.put(None)
+            self._process.join(timeout=10.0)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+        with self._events_lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
+
+    def log_event(self, label, score, timestamp=None):
+        """Событие записи, например ('Anger', 0.82); можно вызывать из любого потока"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._events_lock:
+            if self._events is not None:
+                self._events.write(f'{timestamp:.6f},{label},{score:.4f}\n')
+
+    def _log_bus_events(self):
+        # Записи шины (метка, оценка) с временем time.monotonic, по строке на метку кадра
+        offset = time.time() - time.monotonic()
+        for name, times, records in self._subscription.poll():
+            for timestamp, record in zip(times, records):
+                label, score = str(record['label']), float(record['score'])
+                last_seen, logged = self._episodes.get(label, (None, None))
+                if last_seen is None or timestamp - last_seen > EVENT_GAP:
+                    logged = None  # Новый эпизод
+                if logged is None or score >= logged + EVENT_STEP:
+                    self.log_event(label, score, timestamp + offset)
+                    logged = score
+                self._episodes[label] = (timestamp, logged)
+
+    def _start_encoder(self, frame):
+        # Слоты по размеру кадра камеры, процесс запускается с первым кадром
+        fps = self.fps or self._capture.fps or 25.0
+        self._ring = SharedFrameRing(slot_count=self.queue_size, slot_bytes=frame.nbytes)
+        self._jobs = self._context.Queue()
+        self._free = self._context.Queue()
+        for slot in range(self.queue_size):
+            self._free.put(slot)
+        self._process = self._context.Process(
+            target=encode_segments,
+            args=(self._ring.name, self.queue_size, frame.nbytes, self._jobs, self._free, self.directory,
+                  fps, self.segment_seconds, self.fourcc, self._written, self._segments),
+            name=f'recorder-encoder-{self.camera_id}', daemon=True)
+        self._process.start()
+        self._free_slots = []
+
+    def _restart_encoder(self, frame):
+        # Слоты, занятые упавшим процессом, не вернутся - буфер создаётся заново
+        exitcode = self._process.exitcode
+        self._process = None
+        self._ring.close()
+        self._ring = None
+        self.restarts += 1
+        if self.restarts > ENCODER_RESTARTS:
+            self.error = f'Кодировщик камеры {self.camera_id} завершился с кодом {exitcode}'
+            print(self.error)
+            return False
+        print(f'Кодировщик камеры {self.camera_id} завершился с кодом {exitcode}, перезапуск')
+        self._start_encoder(frame)
+        return True
+
+    def _take_slot(self, seq):
+        # Возвращённые кодировщиком слоты забираются без ожидания
+        while True:
+            try:
+                self._free_slots.append(self._free.get_nowait())
+            except queue.Empty:
+                break
+        if self.drop_policy == 'decimate' and len(self._free_slots) < self.queue_size // 2:
+            if seq % 2:
+                return None
+        return self._free_slots.pop() if self._free_slots else None
+
+    def _run(self):
+        last_seq = 0
+        while self._running:
+            self._log_bus_events()
+            item = self._capture.next(after_seq=last_seq, timeout=0.5)
+            if item is None:
+                continue
+            if last_seq:
+                self.missed += item.seq - last_seq - 1
+            last_seq = item.seq
+            frame = item.frame
+
+            if self._process is None:
+                self._start_encoder(frame)
+            elif not self._process.is_alive() and not self._restart_encoder(frame):
+                self._running = False
+                break
+            if frame.nbytes > self._ring.slot_bytes:
+                # Разрешение камеры выросло, такой кадр не помещается в слот
+                self.dropped += 1
+                continue
+            slot = self._take_slot(item.seq)
+            if slot is None:
+                self.dropped += 1
+                continue
+            self._ring.slot(slot, frame.shape)[:] = frame
+            # Метка захвата в часах time.time, общих для процессов и файлов
+            timestamp = time.time() - (time.monotonic() - item.timestamp)
+            self._jobs.put((slot, frame.shape, timestamp))
+            self.submitted += 1
+        # Оценки, опубликованные до остановки
+        self._log_bus_events()
+
+    def stats(self):
+        return {'submitted': self.submitted, 'written': self._written.value, 'dropped': self.dropped,
+                'missed': self.missed, 'segments': self._segments.value, 'restarts': self.restarts,
+                'error': self.error, 'encoder_alive': self._process is not None and self._process.is_alive()}
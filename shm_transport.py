@@ -0,0 +1,65 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Наибольший кадр, который помещается в слот разделяемой памяти
+MAX_FRAME_BYTES = 1920 * 1080 * 3
+SLOT_COUNT = 2
+
+
+def recv_exact(connection, size):
+    """Прочитать ровно size байт, recv может вернуть меньше"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = connection.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError('Соединение закрыто')
+        received += count
+    return buffer
+
+
+class SharedFrameRing:
+    """Набор слотов для кадров в одном блоке разделяемой памяти"""
+
+    def __init__(self, name=None, slot_count=SLOT_COUNT, slot_bytes=MAX_FRAME_BYTES, create=True):
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        self.owner = create
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=slot_count * slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self._untrack()
+        self.name = self.shm.name
+
+    def _untrack(self):
+        # До Python 3.13 подключившийся процесс удаляет чужой блок при выходе
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+    def slot(self, index, shape, dtype=np.uint8):
+        """Массив поверх слота index без копирования"""
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if size > self.slot_bytes:
+            raise ValueError(f'Кадр {shape} не помещается в слот {self.slot_bytes} байт')
+        offset = (index % self.slot_count) * self.slot_bytes
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def shm_name_prefix(camera_id):
+    """Имя блоков разделяемой памяти для камеры этого процесса"""
+    return f'brat_{os.getpid()}_{camera_id}'
@@ -0,0 +1,148 @@
+import math
+import threading
+
+import numpy as np
+
+
+class EmotionSmoother:
+    """Сглаживание эмоций многих треков одной модальности с состоянием в массивах numpy.
+
+    Все треки обновляются одним векторным шагом, время берётся из меток
+    времени источников (time.monotonic), а не из таймера интерфейса, поэтому
+    результат не зависит от частоты обновления экрана.
+
+    mode='ema' - непрерывный фильтр первого порядка с постоянной времени
+    tau: между наблюдениями read() плавно ведёт значение к последнему
+    наблюдению. mode='one_euro' - фильтр One Euro (min_cutoff, beta,
+    d_cutoff): сильнее сглаживает медленные изменения и меньше запаздывает
+    на быстрых, значение меняется только в моменты наблюдений.
+    """
+
+    def __init__(self, size, mode='ema', tau=0.8, min_cutoff=1.0, beta=0.05, d_cutoff=1.0, capacity=64):
+        if mode not in ('ema', 'one_euro'):
+            raise ValueError(f'Неизвестный режим сглаживания {mode}')
+        self.size = size
+        self.mode = mode
+        self.tau = tau
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+        self._rows = {}  # Ключ трека -> строка массивов
+        self._free = list(range(capacity - 1, -1, -1))
+        self._value = np.zeros((capacity, size), dtype=np.float32)  # Сглаженное значение на момент _time
+        self._target = np.zeros((capacity, size), dtype=np.float32)  # Последнее наблюдение
+        self._deriv = np.zeros((capacity, size), dtype=np.float32)  # Скорость изменения для One Euro
+        self._time = np.zeros(capacity, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def _row(self, key):
+        row = self._rows.get(key)
+        if row is not None:
+            return row, False
+        if not self._free:
+            self._grow()
+        row = self._rows[key] = self._free.pop()
+        return row, True
+
+    def _grow(self):
+        capacity = len(self._time)
+        grow = max(capacity, 1)
+        self._value = np.concatenate([self._value, np.zeros((grow, self.size), np.float32)])
+        self._target = np.concatenate([self._target, np.zeros((grow, self.size), np.float32)])
+        self._deriv = np.concatenate([self._deriv, np.zeros((grow, self.size), np.float32)])
+        self._time = np.concatenate([self._time, np.zeros(grow, np.float64)])
+        self._free.extend(range(capacity + grow - 1, capacity - 1, -1))
+
+    def update(self, keys, values, timestamps):
+        """Наблюдения values (треки, метки) с метками времени источников"""
+        values = np.asarray(values, dtype=np.float32).reshape(len(keys), self.size)
+        timestamps = np.asarray(timestamps, dtype=np.float64).reshape(len(keys))
+        with self._lock:
+            rows, new = zip(*(self._row(key) for key in keys)) if keys else ((), ())
+            rows = np.fromiter(rows, dtype=np.intp, count=len(keys))
+            new = np.fromiter(new, dtype=bool, count=len(keys))
+
+            # Новые треки начинают с первого наблюдения
+            if new.any():
+                fresh = rows[new]
+                self._value[fresh] = values[new]
+                self._target[fresh] = values[new]
+                self._deriv[fresh] = 0.0
+                self._time[fresh] = timestamps[new]
+            old = ~new
+            if not old.any():
+                return
+            rows, values, timestamps = rows[old], values[old], timestamps[old]
+            # Наблюдения не по порядку не двигают время назад
+            dt = np.maximum(timestamps - self._time[rows], 0.0)[:, None]
+
+            if self.mode == 'ema':
+                # Довести значение до момента наблюдения, затем сменить цель
+                keep = np.exp(-dt / self.tau)
+                target = self._target[rows]
+                self._value[rows] = target + (self._value[rows] - target) * keep
+                self._target[rows] = values
+            else:
+                dt = np.maximum(dt, 1e-3)
+                value = self._value[rows]
+                alpha_d = 1.0 / (1.0 + 1.0 / (2 * math.pi * self.d_cutoff * dt))
+                deriv = self._deriv[rows] + alpha_d * ((values - value) / dt - self._deriv[rows])
+                cutoff = self.min_cutoff + self.beta * np.abs(deriv)
+                alpha = 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * dt))
+                self._value[rows] = value + alpha * (values - value)
+                self._deriv[rows] = deriv
+                self._target[rows] = values
+            self._time[rows] = np.maximum(self._time[rows], timestamps)
+
+    def read(self, keys, now=None):
+        """Сглаженные значения (треки, метки); для неизвестных треков - нули"""
+        result = np.zeros((len(keys), self.size), dtype=np.float32)
+        with self._lock:
+            known = [(i, self._rows[key]) for i, key in enumerate(keys) if key in self._rows]
+            if not known:
+                return result
+            index, rows = (np.array(part) for part in zip(*known))
+            if self.mode == 'ema' and now is not None:
+                dt = np.maximum(now - self._time[rows], 0.0)[:, None]
+                target = self._target[rows]
+                result[index] = target + (self._value[rows] - target) * np.exp(-dt / self.tau)
+            else:
+                result[index] = self._value[rows]
+        return result
+
+    def remove(self, key):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._free.append(row)
+
+    def prune(self, now, max_age):
+        """Удалить треки без наблюдений дольше max_age секунд"""
+        with self._lock:
+            stale = [key for key, row in self._rows.items() if now - self._time[row] > max_age]
+            for key in stale:
+                self._free.append(self._rows.pop(key))
+        return stale
+
+
+_smoothers = {}  # Модальность -> (сглаживатель, параметры)
+_smoothers_lock = threading.Lock()
+
+
+def get_smoother(modality, size, **options):
+    """Общий сглаживатель модальности ('audio', 'face', ...) для всех окон.
+
+    Повторный вызов с другими параметрами - ошибка, а не молча чужой сглаживатель.
+    """
+    settings = dict(options, size=size)
+    with _smoothers_lock:
+        if modality in _smoothers:
+            smoother, existing = _smoothers[modality]
+            if existing != settings:
+                raise ValueError(f'Сглаживатель {modality} уже создан с параметрами {existing}, '
+                                 f'запрошены {settings}')
+            return smoother
+        smoother = EmotionSmoother(size, **options)
+        _smoothers[modality] = (smoother, settings)
+        return smoother
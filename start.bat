@@ -1 +1 @@
-start pythonw.exe posemodel\yolo_inference.pyw
\ No newline at end of file
+start pythonw.exe "%~dp0inference_server.py" --workers 1
\ No newline at end of file
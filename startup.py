@@ -0,0 +1,118 @@
+import builtins
+import contextlib
+import sys
+import threading
+import time
+
+PROCESS_START = time.perf_counter()
+
+# Секунд от запуска до показа главного окна
+STARTUP_BUDGET = 3.0
+
+
+class StartupProfile:
+    """Времена импорта модулей, загрузки моделей и событий запуска"""
+
+    def __init__(self, start=PROCESS_START):
+        self.start = start
+        self.imports = {}  # Пакет -> секунды первого импорта, вместе с вложенными
+        self.stages = {}  # Этап (например, загрузка модели) -> секунды
+        self.marks = {}  # Событие -> секунды от запуска
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    def trace_imports(self):
+        """Замерять первый импорт каждого пакета, пока не вызван stop_tracing()"""
+        if self._original_import is not None:
+            return
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            top = name.partition('.')[0]
+            if level or top in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            # Время вложенных импортов относится к пакету, который их вызвал
+            depth = getattr(self._local, 'depth', 0)
+            self._local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._local.depth = depth
+                if depth == 0:
+                    with self._lock:
+                        self.imports[top] = self.imports.get(top, 0.0) + time.perf_counter() - started
+
+        builtins.__import__ = timed_import
+
+    def stop_tracing(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = time.perf_counter() - started
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter() - self.start
+        return self.marks[name]
+
+    def check_budget(self, mark, budget=STARTUP_BUDGET):
+        """(секунды до события, уложились ли в бюджет)"""
+        elapsed = self.marks[mark]
+        return elapsed, elapsed <= budget
+
+    def report(self):
+        lines = ['Импорт модулей:']
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: -item[1])
+            stages = sorted(self.stages.items(), key=lambda item: -item[1])
+        lines += [f'  {name:<24} {seconds * 1000:8.1f} мс' for name, seconds in imports]
+        if stages:
+            lines.append('Загрузка моделей и модулей:')
+            lines += [f'  {name:<24} {seconds * 1000:8.1f} мс' for name, seconds in stages]
+        lines.append('События:')
+        lines += [f'  {name:<24} {seconds * 1000:8.1f} мс от запуска'
+                  for name, seconds in sorted(self.marks.items(), key=lambda item: item[1])]
+        return '\n'.join(lines)
+
+
+class Preloader:
+    """Фоновая загрузка тяжёлых модулей и моделей после показа окна.
+
+    tasks - список (название, функция). Окно, открытое раньше окончания
+    загрузки, просто дождётся её на общей блокировке модели.
+    """
+
+    def __init__(self, profile, tasks, on_done=None):
+        self.profile = profile
+        self.tasks = tasks
+        self.on_done = on_done
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='preloader', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name, task in self.tasks:
+            try:
+                with self.profile.measure(name):
+                    task()
+            except Exception as e:
+                print(f'Предзагрузка "{name}" не удалась:', e)
+        self.profile.mark('предзагрузка завершена')
+        if self.on_done is not None:
+            self.on_done()
+
+
+# Общий профиль процесса, main.py включает замер импортов до импорта PyQt
+profile = StartupProfile()
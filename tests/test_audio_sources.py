@@ -0,0 +1,30 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from audio_sources import AudioSource, MultiSourceAudio
+from event_bus import EventBus
+
+
+def make_audio():
+    bus = EventBus(capacity=16)
+    source = AudioSource('mic', labels=2)
+    audio = MultiSourceAudio([source], lambda windows: np.zeros((len(windows), 2)), [0.0, 1.0], bus=bus)
+    return audio, source, bus.get('audio/mic')
+
+
+def test_batch_result_is_published():
+    audio, source, channel = make_audio()
+    audio._apply_batch([(source, None, 1.0)], np.array([[0.8, 0.2]], dtype=np.float32))
+    assert source.published == 1.0
+    assert np.allclose(channel.latest()[1]['emotions'], [0.8, 0.2])
+
+
+def test_late_batch_result_does_not_overwrite_newer_value():
+    audio, source, channel = make_audio()
+    with audio._publish_lock:
+        audio._publish([source], np.array([[0.1, 0.9]], dtype=np.float32), [2.0])
+    audio._apply_batch([(source, None, 1.5)], np.array([[0.9, 0.1]], dtype=np.float32))
+    assert source.stale == 1 and source.analysed == 1
+    assert channel.written == 1
+    assert channel.latest()[0] == 2.0
@@ -0,0 +1,49 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from audio_stream import RingBuffer
+
+
+def samples(start, count, channels=1):
+    return np.arange(start, start + count, dtype=np.float32).repeat(channels).reshape(count, channels)
+
+
+def test_read_returns_written_samples():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 5))
+    assert ring.written == 5
+    assert np.array_equal(ring.read(5, 3), samples(2, 3))
+
+
+def test_read_across_wraparound():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 6))
+    ring.write(samples(6, 5))
+    assert ring.written == 11
+    assert np.array_equal(ring.read(11, 8), samples(3, 8))
+    assert np.array_equal(ring.read(9, 4), samples(5, 4))
+
+
+def test_write_larger_than_capacity_keeps_newest():
+    ring = RingBuffer(4)
+    ring.write(samples(0, 10))
+    assert ring.written == 10
+    assert np.array_equal(ring.read(10, 4), samples(6, 4))
+
+
+def test_overwritten_and_future_ranges_are_rejected():
+    ring = RingBuffer(8)
+    ring.write(samples(0, 12))
+    assert ring.read(12, 9) is None  # Начало окна уже перезаписано
+    assert ring.read(13, 2) is None  # Конец окна ещё не записан
+    assert ring.overruns == 2
+
+
+def test_read_into_preallocated_buffer_with_channels():
+    ring = RingBuffer(6, channels=2)
+    ring.write(samples(0, 4, channels=2))
+    ring.write(samples(4, 4, channels=2))
+    out = np.empty((5, 2), dtype=np.float32)
+    assert ring.read(8, 5, out) is out
+    assert np.array_equal(out, samples(3, 5, channels=2))
@@ -0,0 +1,139 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from event_bus import Channel, EventBus
+
+VALUE = [('value', np.int32)]
+
+
+def filled(capacity, count, start=0.0):
+    channel = Channel('test', VALUE, capacity)
+    for i in range(count):
+        channel.publish((i,), start + i)
+    return channel
+
+
+def test_wraparound_keeps_newest_records():
+    channel = filled(4, 10)
+    times, records = channel.between(0.0, 100.0)
+    assert list(records['value']) == [6, 7, 8, 9]
+    assert list(times) == [6.0, 7.0, 8.0, 9.0]
+    assert channel.latest()[0] == 9.0
+
+
+def test_search_across_ring_split():
+    # Записи 3..7 лежат в слотах 3, 4, 0, 1, 2
+    channel = filled(5, 8)
+    for timestamp in np.arange(2.5, 8.0, 0.5):
+        for side in ('left', 'right'):
+            expected = 3 + int(np.searchsorted(np.arange(3.0, 8.0), timestamp, side))
+            assert channel._search(3, 8, timestamp, side) == expected
+    times, records = channel.between(4.0, 6.0)
+    assert list(records['value']) == [4, 5, 6]
+
+
+def test_timestamps_never_go_back():
+    channel = Channel('test', VALUE, 4)
+    channel.publish((1,), 5.0)
+    channel.publish((2,), 3.0)
+    assert channel.latest()[0] == 5.0
+
+
+def test_at_returns_whole_batch():
+    channel = Channel('test', VALUE, 8)
+    channel.publish((0,), 1.0)
+    channel.publish_many([(1,), (2,), (3,)], 2.0)
+    moment, records = channel.at(2.5)
+    assert moment == 2.0
+    assert list(records['value']) == [1, 2, 3]
+    assert channel.at(0.5) is None
+
+
+def test_publish_many_larger_than_ring():
+    channel = Channel('test', VALUE, 3)
+    channel.publish_many([(i,) for i in range(5)], 1.0)
+    assert channel.written == 3
+    assert list(channel.between(0.0, 2.0)[1]['value']) == [2, 3, 4]
+
+
+def test_overrun_during_read_is_retried():
+    channel = filled(4, 4)
+    copy = channel._copy
+    writes = iter([10])
+
+    def racing_copy(begin, end):
+        # Писатель перезаписывает самую старую строку посреди чтения
+        result = copy(begin, end)
+        for value in writes:
+            channel.publish((value,), 10.0)
+        return result
+
+    channel._copy = racing_copy
+    times, records = channel.between(0.0, 100.0)
+    assert channel.overruns == 1
+    assert list(records['value']) == [1, 2, 3, 10]
+
+
+def test_persistent_overrun_returns_empty():
+    channel = filled(4, 4)
+    copy = channel._copy
+
+    def racing_copy(begin, end):
+        result = copy(begin, end)
+        channel.publish((99,), 99.0)
+        return result
+
+    channel._copy = racing_copy
+    times, records = channel.between(0.0, 100.0)
+    assert len(times) == 0 and records.dtype == channel.dtype
+    assert channel.overruns == Channel.RETRIES
+
+
+def test_reader_ignores_rows_being_written():
+    channel = filled(4, 4)
+    # Писатель объявил две новые записи, но ещё не закончил
+    channel.claimed = channel.written + 2
+    times, records = channel.between(0.0, 100.0)
+    assert list(records['value']) == [2, 3]
+
+
+def test_since_reports_lost_records():
+    channel = filled(4, 3)
+    position, times, records = channel.since(0)
+    assert position == 3 and list(records['value']) == [0, 1, 2]
+    for i in range(3, 9):
+        channel.publish((i,), float(i))
+    position, times, records = channel.since(position)
+    assert position == 9 and list(records['value']) == [5, 6, 7, 8]
+    assert channel.overruns == 1
+
+
+def test_subscription_reads_only_new_records():
+    bus = EventBus(capacity=8)
+    old = bus.channel('camera/0', VALUE)
+    old.publish((1,), 1.0)
+    subscription = bus.subscribe('camera/')
+    assert subscription.poll() == []
+    old.publish((2,), 2.0)
+    new = bus.channel('camera/1', VALUE)
+    new.publish((3,), 3.0)
+    bus.channel('audio/mic', VALUE).publish((4,), 4.0)
+    updates = {name: list(records['value']) for name, times, records in subscription.poll()}
+    assert updates == {'camera/0': [2], 'camera/1': [3]}
+    assert subscription.poll() == []
+
+
+def test_join_skips_stale_channels():
+    bus = EventBus(capacity=8)
+    bus.channel('face', VALUE).publish((1,), 10.0)
+    bus.channel('audio/mic', VALUE).publish((2,), 9.0)
+    joined = bus.join(['face', 'audio/mic', 'missing'], 10.2, tolerance=0.5)
+    assert list(joined) == ['face']
+
+
+def test_channel_dtype_mismatch():
+    bus = EventBus()
+    bus.channel('face', VALUE)
+    with pytest.raises(ValueError):
+        bus.channel('face', [('value', np.float32)])
@@ -0,0 +1,75 @@
+import json
+import socket
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+pytest.importorskip('PyQt5')
+
+from frame_codec import CODEC_JPEG, EncodedFrame
+from frame_transport import (FRAME, HELLO, HEADER, RESULT, SCORES, SHM_FRAME, WorkerClient, frame_message,
+                             pack_header, unpack_header)
+from shm_transport import recv_exact
+
+
+def test_header_round_trip():
+    header = pack_header(SHM_FRAME, camera_id=3, seq=42, shape=(480, 640, 3), dtype=np.uint8,
+                         timestamp=12.5, length=0, slot=1)
+    assert len(header) == HEADER.size
+    kind, codec, dtype, camera_id, slot, seq, shape, timestamp, length = unpack_header(header)
+    assert (kind, camera_id, slot, seq, shape, timestamp, length) == (SHM_FRAME, 3, 1, 42, (480, 640, 3), 12.5, 0)
+    assert dtype is np.uint8
+
+
+def test_header_rejects_bad_magic():
+    header = bytearray(pack_header(FRAME))
+    header[:4] = b'XXXX'
+    with pytest.raises(ConnectionError):
+        unpack_header(bytes(header))
+
+
+def test_two_dimensional_frame_has_one_channel():
+    frame = np.zeros((4, 6), dtype=np.float32)
+    header, payload = frame_message(FRAME, 1, 7, frame, 0.0)
+    _, _, dtype, _, _, _, shape, _, length = unpack_header(header)
+    assert shape == (4, 6, 1)
+    assert dtype is np.float32
+    assert length == len(payload) == frame.nbytes
+
+
+def test_raw_payload_matches_frame():
+    frame = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)[:, ::-1]  # не непрерывный
+    header, payload = frame_message(RESULT, 2, 1, frame, 1.0)
+    length = unpack_header(header)[-1]
+    restored = np.frombuffer(bytes(payload), dtype=np.uint8).reshape(frame.shape)
+    assert length == frame.nbytes
+    assert np.array_equal(restored, frame)
+
+
+def test_encoded_frame_carries_codec_and_original_shape():
+    encoded = EncodedFrame(CODEC_JPEG, (480, 640, 3), np.dtype(np.uint8), b'\xff\xd8jpeg')
+    header, payload = frame_message(RESULT, 5, 9, encoded, 2.0)
+    _, codec, _, camera_id, _, seq, shape, _, length = unpack_header(header)
+    assert (codec, camera_id, seq, shape) == (CODEC_JPEG, 5, 9, (480, 640, 3))
+    assert bytes(payload) == encoded.data and length == len(encoded.data)
+
+
+def test_scores_are_sent_before_result():
+    server = socket.create_server(('localhost', 0))
+    client = WorkerClient('localhost', server.getsockname()[1], use_shm=False)
+    connection, _ = server.accept()
+    try:
+        assert unpack_header(recv_exact(connection, HEADER.size))[0] == HELLO
+        frame = np.zeros((2, 3, 3), dtype=np.uint8)
+        client.send_result(4, 7, frame, 1.5, {'Anger': 0.75})
+
+        kind, _, _, camera_id, _, seq, _, timestamp, length = unpack_header(recv_exact(connection, HEADER.size))
+        assert (kind, camera_id, seq, timestamp) == (SCORES, 4, 7, 1.5)
+        assert json.loads(bytes(recv_exact(connection, length))) == {'Anger': 0.75}
+        kind, _, _, _, _, seq, shape, _, length = unpack_header(recv_exact(connection, HEADER.size))
+        assert (kind, seq, shape, length) == (RESULT, 7, (2, 3, 3), frame.nbytes)
+    finally:
+        client.close()
+        connection.close()
+        server.close()
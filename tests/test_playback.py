@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+pytest.importorskip('PyQt5')
+
+from playback import Player, Recording, Segment, read_index
+
+
+def write_segment(directory, name, times, frames=None, keyframe_interval=12):
+    (directory / f'{name}.mp4').write_bytes(b'')
+    (directory / f'{name}.csv').write_text('frame,time\n' + ''.join(f'{i},{t}\n' for i, t in enumerate(times)))
+    if frames is not None:
+        info = {'video': f'{name}.mp4', 'frames': frames, 'fourcc': 'mp4v', 'fps': 25.0,
+                'keyframe_interval': keyframe_interval}
+        (directory / f'{name}.json').write_text(json.dumps(info))
+
+
+def test_read_index_skips_torn_lines(tmp_path):
+    path = tmp_path / 'index.csv'
+    path.write_text('frame,time\n0,1.0\n1,2.0\n2,3.5\n3')
+    assert list(read_index(str(path), 10)) == [1.0, 2.0, 3.5]
+    path.write_text('frame,time\n0,1.0\n1,\n2')
+    assert list(read_index(str(path), 10)) == [1.0]
+
+
+def test_read_index_stops_at_closed_frame_count(tmp_path):
+    path = tmp_path / 'index.csv'
+    path.write_text('frame,time\n0,1.0\n1,2.0\n2,3.0\n')
+    assert list(read_index(str(path), 2)) == [1.0, 2.0]
+
+
+def test_recording_skips_open_and_broken_segments(tmp_path):
+    write_segment(tmp_path, 'a', [1.0, 2.0], frames=2)
+    write_segment(tmp_path, 'b', [3.0, 4.0])  # Ещё пишется: описания нет
+    write_segment(tmp_path, 'c', [5.0], frames=1)
+    (tmp_path / 'c.json').write_text('{"video": "c.mp4", "fra')
+    recording = Recording(str(tmp_path))
+    assert [segment.video_path for segment in recording.segments] == [str(tmp_path / 'a.mp4')]
+    assert recording.locate(1.5) == (0, 0)
+
+
+def test_keyframes_from_segment_info(tmp_path):
+    write_segment(tmp_path, 'a', [1.0], frames=1, keyframe_interval=12)
+    write_segment(tmp_path, 'b', [1.0], frames=1, keyframe_interval=None)
+    assert Segment(str(tmp_path / 'a.json')).keyframe_before(30) == 24
+    # Интервал неизвестен - переход прямо к кадру
+    assert Segment(str(tmp_path / 'b.json')).keyframe_before(30) == 30
+
+
+def test_next_time_crosses_segments(tmp_path):
+    write_segment(tmp_path, 'a', [1.0, 2.0], frames=2)
+    write_segment(tmp_path, 'b', [5.0], frames=1)
+    recording = Recording(str(tmp_path))
+    assert recording.next_time(0, 0) == 2.0
+    assert recording.next_time(0, 1) == 5.0
+    assert recording.next_time(1, 0) is None
+
+
+class BrokenCapture:
+    def set(self, prop, value):
+        return True
+
+    def grab(self):
+        return True
+
+    def read(self):
+        return False, None
+
+    def release(self):
+        pass
+
+
+def test_failed_decode_is_not_cached(tmp_path):
+    write_segment(tmp_path, 'a', [1.0, 2.0, 3.0], frames=3)
+    player = Player(Recording(str(tmp_path)))
+    player._capture, player._capture_segment, player._position = BrokenCapture(), 0, 0
+    player._decode(0, 0)
+    assert (0, 0) not in player.cache
+    assert player.is_failed(0, 0)
+    # Поток декодирования переходит к следующему кадру, а не повторяет нечитаемый
+    assert player._next_missing((0, 0)) == 1
@@ -0,0 +1,39 @@
+import io
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from event_bus import EventBus
+from recorder import EVENT_GAP, CameraRecorder
+
+CAMERA_EVENT = [('label', 'U32'), ('score', np.float32)]
+
+
+def logged_events(publications):
+    bus = EventBus(capacity=64)
+    recorder = CameraRecorder(0)
+    recorder._events = io.StringIO()
+    recorder._subscription = bus.subscribe('camera/0/')
+    channel = bus.channel('camera/0/emotic', CAMERA_EVENT)
+    for timestamp, scores in publications:
+        channel.publish_many(list(scores.items()), timestamp)
+    recorder._log_bus_events()
+    return [(label, float(score)) for _, label, score in
+            (line.split(',') for line in recorder._events.getvalue().splitlines())]
+
+
+def test_steady_label_is_logged_once():
+    assert logged_events([(t * 0.1, {'Anger': 0.6}) for t in range(50)]) == [('Anger', 0.6)]
+
+
+def test_rising_score_is_logged_again():
+    events = logged_events([(0.0, {'Anger': 0.6}), (0.1, {'Anger': 0.65}), (0.2, {'Anger': 0.75})])
+    assert events == [('Anger', 0.6), ('Anger', 0.75)]
+
+
+def test_label_returning_after_gap_is_new_event():
+    events = logged_events([(0.0, {'Fear': 0.7, 'Pain': 0.6}), (0.5, {'Fear': 0.7}),
+                            (0.5 + EVENT_GAP + 0.1, {'Fear': 0.6, 'Pain': 0.6})])
+    assert events == [('Fear', 0.7), ('Pain', 0.6), ('Fear', 0.6), ('Pain', 0.6)]
@@ -0,0 +1,82 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from smoothing import EmotionSmoother, get_smoother
+
+
+def test_first_observation_is_taken_as_is():
+    smoother = EmotionSmoother(3)
+    smoother.update(['a'], [[0.2, 0.3, 0.5]], [10.0])
+    assert np.allclose(smoother.read(['a']), [[0.2, 0.3, 0.5]])
+
+
+def test_unknown_keys_read_as_zeros():
+    smoother = EmotionSmoother(2)
+    smoother.update(['a'], [[1.0, 1.0]], [0.0])
+    assert np.allclose(smoother.read(['b', 'a']), [[0.0, 0.0], [1.0, 1.0]])
+
+
+def test_ema_follows_time_not_read_rate():
+    smoother = EmotionSmoother(1, tau=0.5)
+    smoother.update(['a'], [[0.0]], [0.0])
+    smoother.update(['a'], [[1.0]], [1.0])
+    expected = 1.0 - math.exp(-1.0)
+    # Частые и редкие чтения дают одно и то же значение в один момент
+    for now in np.linspace(1.0, 1.5, 50):
+        smoother.read(['a'], now)
+    assert smoother.read(['a'], 1.5)[0, 0] == pytest.approx(expected, rel=1e-5)
+
+
+def test_ema_batch_update_matches_single_updates():
+    batch, single = EmotionSmoother(2, tau=0.3), EmotionSmoother(2, tau=0.3)
+    values = np.array([[0.1, 0.9], [0.7, 0.3]], dtype=np.float32)
+    for smoother in (batch, single):
+        smoother.update(['a', 'b'], np.zeros((2, 2)), [0.0, 0.0])
+    batch.update(['a', 'b'], values, [0.2, 0.4])
+    single.update(['a'], values[:1], [0.2])
+    single.update(['b'], values[1:], [0.4])
+    assert np.allclose(batch.read(['a', 'b'], 1.0), single.read(['a', 'b'], 1.0))
+
+
+def test_out_of_order_observation_does_not_move_time_back():
+    smoother = EmotionSmoother(1, tau=1.0)
+    smoother.update(['a'], [[0.0]], [5.0])
+    smoother.update(['a'], [[1.0]], [4.0])
+    assert smoother.read(['a'], 5.0)[0, 0] == pytest.approx(0.0)
+
+
+def test_one_euro_moves_toward_observation():
+    smoother = EmotionSmoother(1, mode='one_euro')
+    smoother.update(['a'], [[0.0]], [0.0])
+    smoother.update(['a'], [[1.0]], [0.1])
+    value = smoother.read(['a'])[0, 0]
+    assert 0.0 < value < 1.0
+
+
+def test_capacity_grows_and_rows_are_reused():
+    smoother = EmotionSmoother(1, capacity=2)
+    keys = [f'k{i}' for i in range(5)]
+    smoother.update(keys, np.arange(5, dtype=np.float32)[:, None], [0.0] * 5)
+    assert np.allclose(smoother.read(keys)[:, 0], np.arange(5))
+    smoother.remove('k0')
+    smoother.update(['new'], [[9.0]], [0.0])
+    assert np.allclose(smoother.read(['new', 'k4'])[:, 0], [9.0, 4.0])
+
+
+def test_prune_drops_stale_tracks():
+    smoother = EmotionSmoother(1)
+    smoother.update(['old', 'fresh'], [[1.0], [2.0]], [0.0, 9.0])
+    assert smoother.prune(10.0, 5.0) == ['old']
+    assert np.allclose(smoother.read(['old', 'fresh'])[:, 0], [0.0, 2.0])
+
+
+def test_get_smoother_is_shared_and_rejects_other_options():
+    smoother = get_smoother('test-shared', 3, tau=0.4)
+    assert get_smoother('test-shared', 3, tau=0.4) is smoother
+    with pytest.raises(ValueError):
+        get_smoother('test-shared', 3, tau=0.9)
+    with pytest.raises(ValueError):
+        get_smoother('test-shared', 4, tau=0.4)
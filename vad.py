@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def frame_features(samples, samplerate, frame_ms=30):
+    """Энергия (дБ относительно полной шкалы) и доля переходов через ноль по кадрам"""
+    frame = max(1, int(samplerate * frame_ms / 1000))
+    count = len(samples) // frame
+    if count == 0:
+        return np.empty(0, np.float32), np.empty(0, np.float32)
+    frames = np.asarray(samples[:count * frame], dtype=np.float32).reshape(count, frame)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame - 1 if frame > 1 else 1)
+    return energy_db, zcr
+
+
+class EnergyVAD:
+    """Дешёвое определение речи по энергии и переходам через ноль.
+
+    Кадр считается речью, если его энергия выше уровня шума на margin_db
+    и выше min_db, а доля переходов через ноль меньше max_zcr (шипение
+    и широкополосный шум дают много переходов). Окно пропускается к модели,
+    если речь занимает не меньше min_voiced его кадров. После речи ещё
+    hangover окон считаются речью, чтобы не обрывать фразы. Уровень шума
+    подстраивается по окнам без речи.
+    """
+
+    def __init__(self, samplerate=16000, frame_ms=30, margin_db=10.0, min_db=-55.0, max_zcr=0.35,
+                 min_voiced=0.2, hangover=1, noise_adapt=0.05):
+        self.samplerate = samplerate
+        self.frame_ms = frame_ms
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.max_zcr = max_zcr
+        self.min_voiced = min_voiced
+        self.hangover = hangover
+        self.noise_adapt = noise_adapt
+        self.noise_db = None
+        self._hangover_left = 0
+
+        # Статистика
+        self.windows = 0
+        self.skipped = 0
+
+    @property
+    def skipped_fraction(self):
+        return self.skipped / self.windows if self.windows else 0.0
+
+    def is_speech(self, samples):
+        """True, если окно нужно отправить в модель"""
+        energy_db, zcr = frame_features(samples, self.samplerate, self.frame_ms)
+        self.windows += 1
+        if len(energy_db) == 0:
+            self.skipped += 1
+            return False
+
+        # Уровень шума по самым тихим кадрам окна
+        quiet_db = float(np.percentile(energy_db, 10))
+        if self.noise_db is None:
+            self.noise_db = quiet_db
+        threshold = max(self.noise_db + self.margin_db, self.min_db)
+        voiced = (energy_db > threshold) & (zcr < self.max_zcr)
+        speech = np.count_nonzero(voiced) >= self.min_voiced * len(voiced)
+
+        if speech:
+            self._hangover_left = self.hangover
+            # Тихие кадры между словами всё равно немного уточняют уровень шума
+            self.noise_db = min(self.noise_db, quiet_db)
+            return True
+        self.noise_db += self.noise_adapt * (quiet_db - self.noise_db)
+        if self._hangover_left > 0:
+            self._hangover_left -= 1
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {'windows': self.windows, 'skipped': self.skipped,
+                'skipped_fraction': self.skipped_fraction, 'noise_db': self.noise_db}
+
+
+def hold_or_decay(state, target, silent_for, hold=2.0, half_life=3.0, dt=None):
+    """Состояние эмоций во время тишины.
+
+    Первые hold секунд тишины состояние не меняется, затем экспоненциально
+    приближается к target с периодом полураспада half_life. dt - время с
+    прошлого обновления (по умолчанию весь интервал после hold).
+    """
+    decay_time = silent_for - hold
+    if decay_time <= 0:
+        return state
+    dt = decay_time if dt is None else min(dt, decay_time)
+    keep = 0.5 ** (dt / half_life)
+    return target + (state - target) * keep